@@ -0,0 +1,199 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Sequence
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import BaseTool, StructuredTool
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.graph.state import CompiledStateGraph
+from langgraph.prebuilt import create_react_agent
+
+from blob_store import OUTPUT_LIMIT, load_blob, spill_tool_output
+from prompt_cache import (
+    bind_cached_tools,
+    cached_system_prompt,
+    prefix_hash,
+    track_prefix,
+)
+
+AGENT_CACHE_SIZE = 16
+SESSION_TOOLS_KEY = "session_tools"
+
+_lock = threading.Lock()
+_agents: "OrderedDict[str, CompiledStateGraph]" = OrderedDict()
+_stats = {"hits": 0, "misses": 0}
+
+
+def _stable_hash(value: Any) -> str:
+    payload = json.dumps(value, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def tool_schema(tool: BaseTool) -> Dict[str, Any]:
+    """
+    Returns the part of a tool definition that is sent to the model.
+
+    Args:
+        tool: LangChain tool
+
+    Returns:
+        dict: Name, description and JSON schema of the tool arguments
+    """
+    args_schema = tool.args_schema
+    if isinstance(args_schema, dict):
+        schema = args_schema
+    elif args_schema is not None:
+        schema = args_schema.model_json_schema()
+    else:
+        schema = {}
+    return {"name": tool.name, "description": tool.description, "schema": schema}
+
+
+def model_fingerprint(model: BaseChatModel) -> str:
+    return _stable_hash(
+        {"type": type(model).__name__, "params": model._identifying_params}
+    )
+
+
+def agent_fingerprint(
+    model: BaseChatModel,
+    tools: Sequence[BaseTool],
+    prompt: Any,
+    prompt_caching: bool = False,
+) -> str:
+    """
+    Computes the cache key of a compiled agent.
+
+    Args:
+        model: Chat model used by the agent
+        tools: Tools exposed to the agent
+        prompt: System prompt
+        prompt_caching: Whether the prompt prefix is marked for caching
+
+    Returns:
+        str: Hex digest over the model settings, tool schema hashes and prompt
+    """
+    tool_hashes = sorted(_stable_hash(tool_schema(tool)) for tool in tools)
+    return _stable_hash(
+        {
+            "model": model_fingerprint(model),
+            "tools": tool_hashes,
+            "prompt": _stable_hash(prompt),
+            "prompt_caching": prompt_caching,
+        }
+    )
+
+
+def _session_bound_tool(tool: BaseTool) -> BaseTool:
+    """
+    Creates a stand-in for a tool that is resolved per session at call time.
+
+    MCP tools are bound to the connection of the session that loaded them, so a
+    graph shared between sessions cannot hold them directly. The stand-in keeps
+    the name and schema of the original and dispatches each call to the tool of
+    the same name found in the ``session_tools`` entry of the run configuration.
+    Outputs over the tool output limit are spilled to the blob store before
+    they enter the conversation state.
+    """
+    name = tool.name
+
+    async def call_session_tool(config: RunnableConfig, **kwargs: Any) -> Any:
+        session_tools = config.get("configurable", {}).get(SESSION_TOOLS_KEY, {})
+        if name not in session_tools:
+            raise ValueError(f"Tool '{name}' is not available in this session.")
+        result = await session_tools[name].coroutine(**kwargs)
+        return spill_tool_output(result, tool.response_format)
+
+    return StructuredTool(
+        name=name,
+        description=tool.description,
+        args_schema=tool.args_schema,
+        coroutine=call_session_tool,
+        response_format=tool.response_format,
+    )
+
+
+def get_agent(
+    model: BaseChatModel,
+    tools: Sequence[BaseTool],
+    prompt: Any,
+    checkpointer: Optional[BaseCheckpointSaver] = None,
+    prompt_caching: bool = False,
+) -> CompiledStateGraph:
+    """
+    Returns a ReAct agent for the given model, tools and prompt.
+
+    The compiled graph is shared across sessions that use the same
+    configuration; only the checkpointer is specific to the caller. Runs must
+    pass the session's tools with ``session_config``.
+
+    Args:
+        model: Chat model used by the agent
+        tools: Tools of the calling session
+        prompt: System prompt
+        checkpointer: Checkpointer of the calling session
+        prompt_caching: Order the system prompt and tool definitions as a
+            stable prefix and mark it with provider cache-control hints
+
+    Returns:
+        CompiledStateGraph: Agent bound to the given checkpointer
+    """
+    key = agent_fingerprint(model, tools, prompt, prompt_caching)
+    with _lock:
+        agent = _agents.get(key)
+        if agent is not None:
+            _agents.move_to_end(key)
+            _stats["hits"] += 1
+
+    if agent is None:
+        bound_tools = [_session_bound_tool(tool) for tool in tools]
+        if OUTPUT_LIMIT > 0:
+            bound_tools.append(load_blob)
+        if prompt_caching:
+            track_prefix(prefix_hash(prompt, bound_tools), bound_tools)
+            agent = create_react_agent(
+                bind_cached_tools(model, bound_tools),
+                bound_tools,
+                prompt=cached_system_prompt(model, prompt),
+            )
+        else:
+            agent = create_react_agent(model, bound_tools, prompt=prompt)
+        with _lock:
+            _stats["misses"] += 1
+            agent = _agents.setdefault(key, agent)
+            _agents.move_to_end(key)
+            while len(_agents) > AGENT_CACHE_SIZE:
+                _agents.popitem(last=False)
+
+    return agent.copy(update={"checkpointer": checkpointer})
+
+
+def session_config(
+    tools: Sequence[BaseTool], thread_id: str, **kwargs: Any
+) -> RunnableConfig:
+    """
+    Builds the run configuration of a session for a cached agent.
+
+    Args:
+        tools: Tools of the calling session
+        thread_id: Conversation thread of the session
+        **kwargs: Additional RunnableConfig fields, such as recursion_limit
+
+    Returns:
+        RunnableConfig: Configuration carrying the thread id and session tools
+    """
+    return RunnableConfig(
+        configurable={
+            "thread_id": thread_id,
+            SESSION_TOOLS_KEY: {tool.name: tool for tool in tools},
+        },
+        **kwargs,
+    )
+
+
+def get_cache_stats() -> Dict[str, int]:
+    with _lock:
+        return {**_stats, "size": len(_agents)}
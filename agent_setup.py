@@ -0,0 +1,160 @@
+"""
+Agent construction shared by the Streamlit app and the command-line runner.
+"""
+
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.graph.state import CompiledStateGraph
+
+from agent_cache import get_agent
+from hedging import HedgedChatModel
+from mcp_connections import MCPConnectionSet
+from model_registry import get_chat_model
+
+CONFIG_FILE_PATH = "config.json"
+# Send the system prompt and tools as a cacheable prefix (see prompt_cache.py)
+PROMPT_CACHING = os.environ.get("PROMPT_CACHING", "false").lower() == "true"
+
+DEFAULT_MCP_CONFIG = {
+    "get_current_time": {
+        "command": "python",
+        "args": ["./mcp_server_time.py"],
+        "transport": "stdio",
+    }
+}
+
+ANTHROPIC_MODELS = [
+    "claude-3-7-sonnet-latest",
+    "claude-3-5-sonnet-latest",
+    "claude-3-5-haiku-latest",
+]
+
+SYSTEM_PROMPT = """<ROLE>
+You are a smart agent with an ability to use tools. 
+You will be given a question and you will use the tools to answer the question.
+Pick the most relevant tool to answer the question. 
+If you are failed to answer the question, try different tools to get context.
+Your answer should be very polite and professional.
+</ROLE>
+
+----
+
+<INSTRUCTIONS>
+Step 1: Analyze the question
+- Analyze user's question and final goal.
+- If the user's question is consist of multiple sub-questions, split them into smaller sub-questions.
+
+Step 2: Pick the most relevant tool
+- Pick the most relevant tool to answer the question.
+- If you are failed to answer the question, try different tools to get context.
+
+Step 3: Answer the question
+- Answer the question in the same language as the question.
+- Your answer should be very polite and professional.
+
+Step 4: Provide the source of the answer(if applicable)
+- If you've used the tool, provide the source of the answer.
+- Valid sources are either a website(URL) or a document(PDF, etc).
+
+Guidelines:
+- If you've used the tool, your answer should be based on the tool's output(tool's output is more important than your own knowledge).
+- If you've used the tool, and the source is valid URL, provide the source(URL) of the answer.
+- Skip providing the source if the source is not URL.
+- Answer in the same language as the question.
+- Answer should be concise and to the point.
+- Avoid response your output with any other information than the answer and the source.  
+</INSTRUCTIONS>
+
+----
+
+<OUTPUT_FORMAT>
+(concise answer to the question)
+
+**Source**(if applicable)
+- (source1: valid URL)
+- (source2: valid URL)
+- ...
+</OUTPUT_FORMAT>
+"""
+
+OUTPUT_TOKEN_INFO = {
+    "claude-3-5-sonnet-latest": {"max_tokens": 8192},
+    "claude-3-5-haiku-latest": {"max_tokens": 8192},
+    "claude-3-7-sonnet-latest": {"max_tokens": 64000},
+    "gpt-4o": {"max_tokens": 16000},
+    "gpt-4o-mini": {"max_tokens": 16000},
+}
+
+
+def load_mcp_config(path: str = CONFIG_FILE_PATH) -> Dict[str, Any]:
+    """
+    Loads the MCP tool configuration, falling back to the default one.
+
+    Args:
+        path: Configuration file
+
+    Returns:
+        dict: MCP tool configuration
+    """
+    if not os.path.exists(path):
+        return dict(DEFAULT_MCP_CONFIG)
+    with open(path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    return config.get("mcpServers", config)
+
+
+def provider_for(model_name: str) -> str:
+    return "anthropic" if model_name in ANTHROPIC_MODELS else "openai"
+
+
+def _pooled_model(model_name: str) -> Any:
+    return get_chat_model(
+        provider_for(model_name),
+        model_name,
+        temperature=0.1,
+        max_tokens=OUTPUT_TOKEN_INFO[model_name]["max_tokens"],
+    )
+
+
+async def build_agent(
+    client: MCPConnectionSet,
+    mcp_config: Dict[str, Any],
+    model_name: str,
+    checkpointer: Optional[BaseCheckpointSaver] = None,
+    prompt_caching: bool = PROMPT_CACHING,
+    model: Optional[Any] = None,
+    fallback_model_name: Optional[str] = None,
+) -> Tuple[CompiledStateGraph, List[Any], List[Dict[str, Any]]]:
+    """
+    Connects the configured MCP servers and builds the ReAct agent.
+
+    Args:
+        client: MCP connections of the caller, updated in place
+        mcp_config: MCP tool configuration
+        model_name: Model from OUTPUT_TOKEN_INFO
+        checkpointer: Conversation state store
+        prompt_caching: Send the system prompt and tools as a cacheable prefix
+        model: Chat model to use instead of the pooled client for model_name
+        fallback_model_name: Model from OUTPUT_TOKEN_INFO that hedges slow
+            requests of the primary model; None disables hedging
+
+    Returns:
+        tuple: Agent, MCP tools and the per-server apply reports
+    """
+    reports = await client.apply(mcp_config)
+    tools = client.get_tools()
+    if model is None:
+        model = _pooled_model(model_name)
+    if fallback_model_name and fallback_model_name != model_name:
+        model = HedgedChatModel(primary=model, fallback=_pooled_model(fallback_model_name))
+    agent = get_agent(
+        model,
+        tools,
+        SYSTEM_PROMPT,
+        checkpointer=checkpointer,
+        prompt_caching=prompt_caching,
+    )
+    return agent, tools, reports
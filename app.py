@@ -4,59 +4,68 @@ import nest_asyncio
 import json
 import os
 import platform
+from contextlib import nullcontext
 
 if platform.system() == "Windows":
     asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
 
 nest_asyncio.apply()
 
-if "event_loop" not in st.session_state:
+if st.session_state.get("event_loop") is None:
     loop = asyncio.new_event_loop()
     st.session_state.event_loop = loop
     asyncio.set_event_loop(loop)
 
-from langgraph.prebuilt import create_react_agent
-from langchain_anthropic import ChatAnthropic
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage
 from dotenv import load_dotenv
-from langchain_mcp_adapters.client import MultiServerMCPClient
 from utils import astream_graph, random_uuid
+from model_registry import get_pool_stats
+from rate_limiter import ADMISSION_ENABLED, get_admission_stats
+from hedging import get_hedge_stats
+from agent_cache import get_cache_stats, session_config
+from agent_setup import (
+    ANTHROPIC_MODELS,
+    CONFIG_FILE_PATH,
+    DEFAULT_MCP_CONFIG,
+    PROMPT_CACHING,
+    build_agent,
+    load_mcp_config,
+)
+from prompt_cache import get_prefix_stats
+from mcp_connections import MCPConnectionSet
+from blob_store import blob_store, find_refs
+from session_registry import registry as session_registry
+from mcp_warm_pool import warm_pool
+from streamlit.runtime import Runtime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 from langchain_core.messages.ai import AIMessageChunk
 from langchain_core.messages.tool import ToolMessage
-from langgraph.checkpoint.memory import MemorySaver
-from langchain_core.runnables import RunnableConfig
+from delta_checkpoint import DeltaMemorySaver
+from warmup import WARMUP_ENABLED, warmup
 
 load_dotenv(override=True)
 
-CONFIG_FILE_PATH = "config.json"
+EVENT_LOG_DIR = os.environ.get("AGENT_EVENT_LOG_DIR")  # Record agent event streams if set
 
 def load_config_from_json():
     """
     Loads settings from config.json file.
     Creates a file with default settings if it doesn't exist.
 
+    Uses the same loader as warmup and the command-line runner, so all of
+    them see the same configuration.
+
     Returns:
         dict: Loaded settings
     """
-    default_config = {
-        "get_current_time": {
-            "command": "python",
-            "args": ["./mcp_server_time.py"],
-            "transport": "stdio"
-        }
-    }
-    
     try:
-        if os.path.exists(CONFIG_FILE_PATH):
-            with open(CONFIG_FILE_PATH, "r", encoding="utf-8") as f:
-                return json.load(f)
-        else:
-            save_config_to_json(default_config)
-            return default_config
+        config = load_mcp_config(CONFIG_FILE_PATH)
+        if not os.path.exists(CONFIG_FILE_PATH):
+            save_config_to_json(config)
+        return config
     except Exception as e:
         st.error(f"Error loading settings file: {str(e)}")
-        return default_config
+        return dict(DEFAULT_MCP_CONFIG)
 
 def save_config_to_json(config):
     """
@@ -113,79 +122,90 @@ st.sidebar.divider()
 st.title("💬 MCP Tool Utilization Agent")
 st.markdown("✨ Ask questions to the ReAct agent that utilizes MCP tools.")
 
-SYSTEM_PROMPT = """<ROLE>
-You are a smart agent with an ability to use tools. 
-You will be given a question and you will use the tools to answer the question.
-Pick the most relevant tool to answer the question. 
-If you are failed to answer the question, try different tools to get context.
-Your answer should be very polite and professional.
-</ROLE>
-
-----
-
-<INSTRUCTIONS>
-Step 1: Analyze the question
-- Analyze user's question and final goal.
-- If the user's question is consist of multiple sub-questions, split them into smaller sub-questions.
-
-Step 2: Pick the most relevant tool
-- Pick the most relevant tool to answer the question.
-- If you are failed to answer the question, try different tools to get context.
-
-Step 3: Answer the question
-- Answer the question in the same language as the question.
-- Your answer should be very polite and professional.
-
-Step 4: Provide the source of the answer(if applicable)
-- If you've used the tool, provide the source of the answer.
-- Valid sources are either a website(URL) or a document(PDF, etc).
-
-Guidelines:
-- If you've used the tool, your answer should be based on the tool's output(tool's output is more important than your own knowledge).
-- If you've used the tool, and the source is valid URL, provide the source(URL) of the answer.
-- Skip providing the source if the source is not URL.
-- Answer in the same language as the question.
-- Answer should be concise and to the point.
-- Avoid response your output with any other information than the answer and the source.  
-</INSTRUCTIONS>
-
-----
-
-<OUTPUT_FORMAT>
-(concise answer to the question)
-
-**Source**(if applicable)
-- (source1: valid URL)
-- (source2: valid URL)
-- ...
-</OUTPUT_FORMAT>
-"""
-
-OUTPUT_TOKEN_INFO = {
-    "claude-3-5-sonnet-latest": {"max_tokens": 8192},
-    "claude-3-5-haiku-latest": {"max_tokens": 8192},
-    "claude-3-7-sonnet-latest": {"max_tokens": 64000},
-    "gpt-4o": {"max_tokens": 16000},
-    "gpt-4o-mini": {"max_tokens": 16000},
-}
-
 if "session_initialized" not in st.session_state:
     st.session_state.session_initialized = False  # Session initialization flag
     st.session_state.agent = None  # Storage for ReAct agent object
     st.session_state.history = []  # List for storing conversation history
     st.session_state.mcp_client = None  # Storage for MCP client object
+    st.session_state.checkpointer = DeltaMemorySaver()  # Conversation state of this session
+    st.session_state.mcp_apply_report = []  # Per-server result of the last apply
+    st.session_state.tools = []  # MCP tools loaded by this session
+    st.session_state.loaded_blobs = set()  # Spilled tool outputs opened in the UI
     st.session_state.timeout_seconds = (
         120  # Response generation time limit (seconds), default 120 seconds
     )
     st.session_state.selected_model = (
         "claude-3-7-sonnet-latest"  # Default model selection
     )
+    st.session_state.fallback_model = None  # Model that hedges slow requests, if any
     st.session_state.recursion_limit = 100  # Recursion call limit, default 100
+    st.session_state.prompt_caching = PROMPT_CACHING  # Mark the stable prompt prefix for caching
+    warm_pool.prewarm(load_config_from_json())  # Start spare MCP server processes
+
+if WARMUP_ENABLED:
+    warmup.start()  # No-op if the process was started through warmup.py
 
 if "thread_id" not in st.session_state:
     st.session_state.thread_id = random_uuid()
 
 
+def reset_evicted_session(state, reason):
+    """
+    Resets a session whose resources were released by the session registry.
+
+    Runs on the registry's reaper thread, so it only replaces state entries;
+    the user is asked to apply the settings again on their next visit. The
+    registry has closed the session's event loop; the next script run
+    creates a new one.
+
+    Args:
+        state: Session state of the evicted session
+        reason: Eviction reason, "idle", "closed" or "manual"
+    """
+    state["session_initialized"] = False
+    state["agent"] = None
+    state["mcp_client"] = None
+    state["tools"] = []
+    state["checkpointer"] = DeltaMemorySaver()
+    state["history"] = []
+    state["loaded_blobs"] = set()
+    state["thread_id"] = random_uuid()
+    state["event_loop"] = None
+    state["evicted_reason"] = reason
+
+
+script_ctx = get_script_run_ctx()
+if script_ctx is not None:
+    session_registry.register(
+        script_ctx.session_id, script_ctx.session_state, on_evict=reset_evicted_session
+    )
+    session_registry.touch(script_ctx.session_id)
+    session_registry.start_reaper(is_active=Runtime.instance().is_active_session)
+
+
+def run_in_session_loop(coro):
+    """
+    Runs a coroutine to completion on the session's event loop.
+
+    The session registry's reaper may evict the session from another thread,
+    which also runs this loop; holding the session's loop lock keeps the two
+    from driving it at the same time.
+    """
+    lock = (
+        session_registry.loop_lock(script_ctx.session_id)
+        if script_ctx is not None
+        else nullcontext()
+    )
+    with lock:
+        loop = st.session_state.get("event_loop")
+        if loop is None or loop.is_closed():
+            # Evicted since this run started
+            loop = asyncio.new_event_loop()
+            st.session_state.event_loop = loop
+            asyncio.set_event_loop(loop)
+        return loop.run_until_complete(coro)
+
+
 async def cleanup_mcp_client():
     """
     Safely terminates the existing MCP client.
@@ -201,6 +221,30 @@ async def cleanup_mcp_client():
             import traceback
 
 
+def print_blob_buttons(refs, key_prefix):
+    """
+    Shows the full content of spilled tool outputs on request.
+
+    Large tool outputs are kept as a preview and a blob reference; the stored
+    content is only read from disk once its button has been clicked.
+
+    Args:
+        refs: Blob references found in the tool call information
+        key_prefix: Prefix making the button keys unique on the page
+    """
+    for ref in refs:
+        if ref in st.session_state.loaded_blobs:
+            try:
+                st.code(blob_store.get(ref))
+            except KeyError as e:
+                st.error(str(e.args[0]))
+        elif st.button(
+            f"📄 Load full output ({ref[:17]}…)", key=f"blob_{key_prefix}_{ref}"
+        ):
+            st.session_state.loaded_blobs.add(ref)
+            st.rerun()
+
+
 def print_message():
     """
     Displays chat history on the screen.
@@ -217,14 +261,22 @@ def print_message():
             i += 1
         elif message["role"] == "assistant":
             with st.chat_message("assistant", avatar="🤖"):
+                if message.get("steps"):
+                    st.caption("🧭 Steps: " + " → ".join(message["steps"]))
                 st.markdown(message["content"])
 
                 if (
                     i + 1 < len(st.session_state.history)
                     and st.session_state.history[i + 1]["role"] == "assistant_tool"
                 ):
-                    with st.expander("🔧 Tool Call Information", expanded=False):
-                        st.markdown(st.session_state.history[i + 1]["content"])
+                    tool_content = st.session_state.history[i + 1]["content"]
+                    refs = find_refs(tool_content)
+                    with st.expander(
+                        "🔧 Tool Call Information",
+                        expanded=any(ref in st.session_state.loaded_blobs for ref in refs),
+                    ):
+                        st.markdown(tool_content)
+                        print_blob_buttons(refs, key_prefix=str(i))
                     i += 2
                 else:
                     i += 1
@@ -332,11 +384,49 @@ def get_streaming_callback(text_placeholder, tool_placeholder):
     return callback_func, accumulated_text, accumulated_tool
 
 
-async def process_query(query, text_placeholder, tool_placeholder, timeout_seconds=60):
+def get_update_callback(step_placeholder):
+    """
+    Creates a callback for node state updates.
+
+    Receives the "updates" events of the multiplexed stream and shows the
+    steps taken so far, with the tools each agent step called.
+
+    Args:
+        step_placeholder: Streamlit component to display the steps
+
+    Returns:
+        callback_func: Update callback function
+        steps: List of the step labels collected so far
+    """
+    steps = []
+
+    def callback_func(event: dict):
+        update = event.get("content")
+        label = event.get("node") or "?"
+        messages = update.get("messages", []) if isinstance(update, dict) else []
+        tool_names = [
+            call["name"]
+            for message in messages
+            for call in (getattr(message, "tool_calls", None) or [])
+        ]
+        if tool_names:
+            label += f" ({', '.join(tool_names)})"
+        if event.get("namespace"):
+            label += f" [{event['namespace'][-1].split(':')[0]}]"
+        steps.append(label)
+        step_placeholder.caption("🧭 Steps: " + " → ".join(steps))
+
+    return callback_func, steps
+
+
+async def process_query(
+    query, text_placeholder, tool_placeholder, timeout_seconds=60, step_placeholder=None
+):
     """
     Processes user questions and generates responses.
 
     This function passes the user's question to the agent and streams the response in real-time.
+    Token deltas and node state updates come from a single pass over the graph.
     Returns a timeout error if the response is not completed within the specified time.
 
     Args:
@@ -344,54 +434,74 @@ async def process_query(query, text_placeholder, tool_placeholder, timeout_secon
         text_placeholder: Streamlit component to display text responses
         tool_placeholder: Streamlit component to display tool call information
         timeout_seconds: Response generation time limit (seconds)
+        step_placeholder: Streamlit component to display the steps taken
 
     Returns:
         response: Agent's response object
         final_text: Final text response
         final_tool: Final tool call information
+        steps: Steps taken by the agent
     """
     try:
         if st.session_state.agent:
             streaming_callback, accumulated_text_obj, accumulated_tool_obj = (
                 get_streaming_callback(text_placeholder, tool_placeholder)
             )
+            update_callback, steps = get_update_callback(
+                step_placeholder if step_placeholder is not None else st.empty()
+            )
             try:
                 response = await asyncio.wait_for(
                     astream_graph(
                         st.session_state.agent,
                         {"messages": [HumanMessage(content=query)]},
-                        callback=streaming_callback,
-                        config=RunnableConfig(
+                        stream_mode=["messages", "updates"],
+                        include_subgraphs=True,
+                        handlers={
+                            "messages": streaming_callback,
+                            "updates": update_callback,
+                        },
+                        record_path=(
+                            os.path.join(EVENT_LOG_DIR, f"{st.session_state.thread_id}.jsonl")
+                            if EVENT_LOG_DIR
+                            else None
+                        ),
+                        config=session_config(
+                            st.session_state.tools,
+                            st.session_state.thread_id,
                             recursion_limit=st.session_state.recursion_limit,
-                            thread_id=st.session_state.thread_id,
                         ),
                     ),
                     timeout=timeout_seconds,
                 )
             except asyncio.TimeoutError:
                 error_msg = f"⏱️ Request time exceeded {timeout_seconds} seconds. Please try again later."
-                return {"error": error_msg}, error_msg, ""
+                return {"error": error_msg}, error_msg, "", steps
 
             final_text = "".join(accumulated_text_obj)
             final_tool = "".join(accumulated_tool_obj)
-            return response, final_text, final_tool
+            return response, final_text, final_tool, steps
         else:
             return (
                 {"error": "🚫 Agent has not been initialized."},
                 "🚫 Agent has not been initialized.",
                 "",
+                [],
             )
     except Exception as e:
         import traceback
 
         error_msg = f"❌ Error occurred during query processing: {str(e)}\n{traceback.format_exc()}"
-        return {"error": error_msg}, error_msg, ""
+        return {"error": error_msg}, error_msg, "", []
 
 
 async def initialize_session(mcp_config=None):
     """
     Initializes MCP session and agent.
 
+    Only the servers whose configuration entry was added, removed or modified
+    since the last call are started or stopped; the others keep running.
+
     Args:
         mcp_config: MCP tool configuration information (JSON). Uses default settings if None
 
@@ -399,43 +509,26 @@ async def initialize_session(mcp_config=None):
         bool: Initialization success status
     """
     with st.spinner("🔄 Connecting to MCP server..."):
-        await cleanup_mcp_client()
-
         if mcp_config is None:
             mcp_config = load_config_from_json()
-        client = MultiServerMCPClient(mcp_config)
-        await client.__aenter__()
-        tools = client.get_tools()
-        st.session_state.tool_count = len(tools)
-        st.session_state.mcp_client = client
-
-        selected_model = st.session_state.selected_model
-
-        if selected_model in [
-            "claude-3-7-sonnet-latest",
-            "claude-3-5-sonnet-latest",
-            "claude-3-5-haiku-latest",
-        ]:
-            model = ChatAnthropic(
-                model=selected_model,
-                temperature=0.1,
-                max_tokens=OUTPUT_TOKEN_INFO[selected_model]["max_tokens"],
-            )
-        else:
-            model = ChatOpenAI(
-                model=selected_model,
-                temperature=0.1,
-                max_tokens=OUTPUT_TOKEN_INFO[selected_model]["max_tokens"],
-            )
-        agent = create_react_agent(
-            model,
-            tools,
-            checkpointer=MemorySaver(),
-            prompt=SYSTEM_PROMPT,
+        client = st.session_state.mcp_client
+        if client is None:
+            client = MCPConnectionSet(pool=warm_pool)
+            st.session_state.mcp_client = client
+        agent, tools, reports = await build_agent(
+            client,
+            mcp_config,
+            st.session_state.selected_model,
+            checkpointer=st.session_state.checkpointer,
+            prompt_caching=st.session_state.prompt_caching,
+            fallback_model_name=st.session_state.fallback_model,
         )
+        st.session_state.mcp_apply_report = reports
+        st.session_state.tools = tools
+        st.session_state.tool_count = len(tools)
         st.session_state.agent = agent
         st.session_state.session_initialized = True
-        return True
+        return not any(report["error"] for report in reports)
 
 with st.sidebar:
     st.subheader("⚙️ System Settings")
@@ -443,13 +536,7 @@ with st.sidebar:
 
     has_anthropic_key = os.environ.get("ANTHROPIC_API_KEY") is not None
     if has_anthropic_key:
-        available_models.extend(
-            [
-                "claude-3-7-sonnet-latest",
-                "claude-3-5-sonnet-latest",
-                "claude-3-5-haiku-latest",
-            ]
-        )
+        available_models.extend(ANTHROPIC_MODELS)
 
     has_openai_key = os.environ.get("OPENAI_API_KEY") is not None
     if has_openai_key:
@@ -481,6 +568,21 @@ with st.sidebar:
             "⚠️ Model has been changed. Click 'Apply Settings' button to apply changes."
         )
 
+    fallback_options = [None] + [
+        m for m in available_models if m != st.session_state.selected_model
+    ]
+    st.session_state.fallback_model = st.selectbox(
+        "🪂 Fallback model for slow requests",
+        options=fallback_options,
+        index=(
+            fallback_options.index(st.session_state.fallback_model)
+            if st.session_state.fallback_model in fallback_options
+            else 0
+        ),
+        format_func=lambda m: m or "None (no hedging)",
+        help="If the selected model has not started answering within its usual time to first token (95th percentile), the request is also sent to this model and the first to answer is used. Click 'Apply Settings' to apply.",
+    )
+
     st.session_state.timeout_seconds = st.slider(
         "⏱️ Response generation time limit (seconds)",
         min_value=60,
@@ -499,6 +601,12 @@ with st.sidebar:
         help="Set the recursion call limit. Setting too high a value may cause memory issues.",
     )
 
+    st.session_state.prompt_caching = st.checkbox(
+        "🧩 Prompt prefix caching",
+        value=st.session_state.prompt_caching,
+        help="Sends the system prompt and tool definitions as a stable, cacheable prefix. Cache-control hints are only added for Anthropic models. Click 'Apply Settings' to apply.",
+    )
+
     st.divider()
 
     st.subheader("🔧 Tool Settings")
@@ -658,6 +766,87 @@ with st.sidebar:
     selected_model_name = st.session_state.selected_model
     st.write(f"🧠 Current Model: {selected_model_name}")
 
+    with st.expander("🔌 Model Connection Pools", expanded=False):
+        st.json(get_pool_stats())
+        st.json({"agent_cache": get_cache_stats()})
+
+    if ADMISSION_ENABLED:
+        with st.expander("🚦 Model Admission Control", expanded=False):
+            st.json(get_admission_stats())
+
+    hedge_stats = get_hedge_stats()
+    if hedge_stats:
+        with st.expander("🪂 Hedged Requests", expanded=False):
+            st.json(hedge_stats)
+
+    with st.expander("🧩 Prompt Prefix Cache", expanded=False):
+        st.json(get_prefix_stats())
+
+    if warm_pool.enabled:
+        with st.expander("♨️ MCP Warm Pool", expanded=False):
+            st.json(warm_pool.get_stats())
+
+    with st.expander("🗂️ Session Resources", expanded=False):
+        sessions = session_registry.snapshot()
+        st.json({"sessions": sessions[:10], "recent_evictions": session_registry.evictions[-10:]})
+        st.download_button(
+            "Download JSON",
+            json.dumps(
+                {"sessions": sessions, "evictions": session_registry.evictions}, indent=2
+            ),
+            file_name="sessions.json",
+            mime="application/json",
+            use_container_width=True,
+        )
+
+    with st.expander("⏪ Time Travel", expanded=False):
+        checkpointer = st.session_state.checkpointer
+        steps = checkpointer.history(st.session_state.thread_id)
+        if not steps:
+            st.caption("No steps in this conversation yet.")
+        else:
+            labels = {
+                step["checkpoint_id"]: f"#{step['step']} · "
+                f"{', '.join(step['nodes']) or step['source']} · {step['messages']} messages"
+                for step in steps
+            }
+            checkpoint_id = st.selectbox(
+                "Step",
+                list(labels),
+                index=len(labels) - 1,
+                format_func=labels.get,
+                key="time_travel_step",
+            )
+            values, seconds = checkpointer.load_state(st.session_state.thread_id, checkpoint_id)
+            st.caption(
+                f"{len(steps)} steps · checkpoint {checkpoint_id} loaded in {seconds * 1000:.1f} ms"
+            )
+            st.json(
+                [
+                    {
+                        "type": message.type,
+                        **({"name": message.name} if message.name else {}),
+                        "content": str(message.content)[:500],
+                        **(
+                            {"tool_calls": message.tool_calls}
+                            if getattr(message, "tool_calls", None)
+                            else {}
+                        ),
+                    }
+                    for message in values.get("messages", [])
+                ],
+                expanded=1,
+            )
+            st.json({"checkpoints": checkpointer.get_stats()}, expanded=False)
+
+    if st.session_state.mcp_apply_report:
+        with st.expander("⏱️ Last Apply (per server)", expanded=False):
+            for report in st.session_state.mcp_apply_report:
+                line = f"- **{report['server']}**: {report['action']} in {report['seconds']:.2f}s ({report['tools']} tools)"
+                if report["error"]:
+                    line += f" ❌ {report['error']}"
+                st.markdown(line)
+
     if st.button(
         "Apply Settings",
         key="apply_button",
@@ -684,7 +873,7 @@ with st.sidebar:
 
             progress_bar.progress(30)
 
-            success = st.session_state.event_loop.run_until_complete(
+            success = run_in_session_loop(
                 initialize_session(st.session_state.pending_mcp_config)
             )
 
@@ -704,9 +893,11 @@ with st.sidebar:
     st.subheader("🔄 Actions")
 
     if st.button("Reset Conversation", use_container_width=True, type="primary"):
+        st.session_state.checkpointer.delete_thread(st.session_state.thread_id)
         st.session_state.thread_id = random_uuid()
 
         st.session_state.history = []
+        st.session_state.loaded_blobs = set()
 
         st.success("✅ Conversation has been reset.")
 
@@ -719,6 +910,22 @@ with st.sidebar:
             st.success("✅ You have been logged out.")
             st.rerun()
 
+if st.session_state.get("evicted_reason"):
+    st.warning(
+        "⚠️ This session was idle and its resources have been released. Please click 'Apply Settings' to start again."
+    )
+    del st.session_state["evicted_reason"]
+
+if (
+    not st.session_state.session_initialized
+    and warmup.ready
+    and not st.session_state.get("auto_initialized")
+):
+    # Warmup has started the servers and built the default agent, so
+    # initializing with the saved settings only takes a moment.
+    st.session_state.auto_initialized = True
+    run_in_session_loop(initialize_session())
+
 if not st.session_state.session_initialized:
     st.info(
         "MCP server and agent are not initialized. Please click the 'Apply Settings' button in the left sidebar to initialize."
@@ -732,15 +939,17 @@ if user_query:
     if st.session_state.session_initialized:
         st.chat_message("user", avatar="🧑‍💻").markdown(user_query)
         with st.chat_message("assistant", avatar="🤖"):
+            step_placeholder = st.empty()
             tool_placeholder = st.empty()
             text_placeholder = st.empty()
-            resp, final_text, final_tool = (
-                st.session_state.event_loop.run_until_complete(
+            resp, final_text, final_tool, steps = (
+                run_in_session_loop(
                     process_query(
                         user_query,
                         text_placeholder,
                         tool_placeholder,
                         st.session_state.timeout_seconds,
+                        step_placeholder=step_placeholder,
                     )
                 )
             )
@@ -749,7 +958,7 @@ if user_query:
         else:
             st.session_state.history.append({"role": "user", "content": user_query})
             st.session_state.history.append(
-                {"role": "assistant", "content": final_text}
+                {"role": "assistant", "content": final_text, "steps": steps}
             )
             if final_tool.strip():
                 st.session_state.history.append(
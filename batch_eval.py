@@ -0,0 +1,301 @@
+"""
+Batch evaluation of the MCP agent over a file of queries.
+
+Reads a JSON Lines file with one query per line, either a plain string or an
+object with a "query" field (an optional "id" and any other fields are
+copied to the result). Queries run concurrently, at most ``--concurrency``
+at a time, each in its own conversation thread, against one shared set of
+MCP server connections. One result line per query is appended to the output
+file as soon as it finishes: answer text, tool trace, latency, time to first
+token and token counts. A summary with throughput and latency percentiles is
+printed at the end.
+
+Usage:
+    python batch_eval.py queries.jsonl -o results.jsonl --concurrency 8
+    python batch_eval.py queries.jsonl --stub script.json   # offline, scripted model
+
+See ``ScriptedChatAnthropic`` in stub_models.py for the script format.
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage, ToolMessage
+from langgraph.checkpoint.memory import MemorySaver
+
+from agent_cache import session_config
+from agent_setup import (
+    CONFIG_FILE_PATH,
+    OUTPUT_TOKEN_INFO,
+    PROMPT_CACHING,
+    build_agent,
+    load_mcp_config,
+)
+from hedging import get_hedge_stats
+from mcp_connections import MCPConnectionSet
+from rate_limiter import BATCH, request_priority
+from utils import astream_graph, random_uuid
+
+
+def load_queries(path: str) -> List[Dict[str, Any]]:
+    """
+    Reads the queries of a JSON Lines file.
+
+    Args:
+        path: Input file
+
+    Returns:
+        list: One dict per query with at least "id" and "query"
+    """
+    queries = []
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if isinstance(item, str):
+                item = {"query": item}
+            if "query" not in item:
+                raise ValueError(f"{path}:{number}: missing 'query' field")
+            item.setdefault("id", str(len(queries)))
+            queries.append(item)
+    return queries
+
+
+def _text(content: Any) -> str:
+    if isinstance(content, str):
+        return content
+    return "".join(
+        block.get("text", "")
+        for block in content
+        if isinstance(block, dict) and block.get("type") == "text"
+    )
+
+
+class QueryTrace:
+    """Stream handlers that collect the answer, tool trace and usage of one query."""
+
+    def __init__(self, started: float):
+        self.started = started
+        self.first_token: Optional[float] = None
+        self.text: List[str] = []
+        self.tools: Dict[str, Dict[str, Any]] = {}
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.model_calls = 0
+
+    def on_message(self, event: Dict[str, Any]) -> None:
+        message = event["content"]
+        if isinstance(message, AIMessageChunk):
+            text = _text(message.content)
+            if text:
+                if self.first_token is None:
+                    self.first_token = time.perf_counter() - self.started
+                self.text.append(text)
+
+    def on_update(self, event: Dict[str, Any]) -> None:
+        content = event["content"]
+        messages = content.get("messages", []) if isinstance(content, dict) else []
+        elapsed = round(time.perf_counter() - self.started, 4)
+        for message in messages:
+            if isinstance(message, AIMessage):
+                self.model_calls += 1
+                usage = message.usage_metadata or {}
+                self.input_tokens += usage.get("input_tokens", 0)
+                self.output_tokens += usage.get("output_tokens", 0)
+                for call in message.tool_calls:
+                    self.tools[call["id"]] = {
+                        "name": call["name"],
+                        "args": call["args"],
+                        "called_at": elapsed,
+                    }
+            elif isinstance(message, ToolMessage):
+                entry = self.tools.setdefault(
+                    message.tool_call_id, {"name": message.name, "args": None}
+                )
+                output = str(message.content)
+                entry.update(
+                    returned_at=elapsed,
+                    status=getattr(message, "status", "success"),
+                    output=output[:500],
+                    output_chars=len(output),
+                )
+
+    def result(self) -> Dict[str, Any]:
+        return {
+            "answer": "".join(self.text),
+            "tool_trace": list(self.tools.values()),
+            "ttft": round(self.first_token, 4) if self.first_token is not None else None,
+            "model_calls": self.model_calls,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+        }
+
+
+async def run_query(agent, tools, item: Dict[str, Any], args) -> Dict[str, Any]:
+    thread_id = random_uuid()
+    started = time.perf_counter()
+    trace = QueryTrace(started)
+    error = None
+    try:
+        await asyncio.wait_for(
+            astream_graph(
+                agent,
+                {"messages": [HumanMessage(content=item["query"])]},
+                stream_mode=["messages", "updates"],
+                handlers={"messages": trace.on_message, "updates": trace.on_update},
+                config=session_config(tools, thread_id, recursion_limit=args.recursion_limit),
+            ),
+            timeout=args.timeout,
+        )
+    except asyncio.TimeoutError:
+        error = f"timeout after {args.timeout} seconds"
+    except Exception as e:
+        error = repr(e)
+    return {
+        **item,
+        "thread_id": thread_id,
+        **trace.result(),
+        "latency": round(time.perf_counter() - started, 4),
+        "error": error,
+    }
+
+
+def summarize(results: List[Dict[str, Any]], wall: float) -> Dict[str, Any]:
+    """
+    Aggregates the results of a batch.
+
+    Args:
+        results: Result dicts returned by run_query
+        wall: Wall-clock duration of the batch in seconds
+
+    Returns:
+        dict: Counts, throughput, latency and TTFT percentiles and token totals
+    """
+    ok = [r for r in results if not r["error"]]
+
+    def percentiles(values: List[float]) -> Dict[str, float]:
+        if not values:
+            return {}
+        p50, p95, p99 = np.percentile(values, [50, 95, 99])
+        return {
+            "p50": round(float(p50), 4),
+            "p95": round(float(p95), 4),
+            "p99": round(float(p99), 4),
+            "max": round(max(values), 4),
+        }
+
+    return {
+        "queries": len(results),
+        "errors": len(results) - len(ok),
+        "wall_seconds": round(wall, 3),
+        "queries_per_second": round(len(results) / wall, 3) if wall else 0.0,
+        "latency": percentiles([r["latency"] for r in ok]),
+        "ttft": percentiles([r["ttft"] for r in ok if r["ttft"] is not None]),
+        "input_tokens": sum(r["input_tokens"] for r in results),
+        "output_tokens": sum(r["output_tokens"] for r in results),
+        "tool_calls": sum(len(r["tool_trace"]) for r in results),
+    }
+
+
+async def run(args) -> int:
+    request_priority.set(BATCH)
+    queries = load_queries(args.queries)
+    if args.limit:
+        queries = queries[: args.limit]
+    model = None
+    if args.stub:
+        from stub_models import ScriptedChatAnthropic
+
+        model = ScriptedChatAnthropic.from_file(args.stub)
+
+    async with MCPConnectionSet() as client:
+        agent, tools, reports = await build_agent(
+            client,
+            load_mcp_config(args.config),
+            args.model,
+            checkpointer=MemorySaver(),
+            prompt_caching=args.prompt_caching,
+            fallback_model_name=args.fallback_model,
+            model=model,
+        )
+        for report in reports:
+            if report["error"]:
+                print(
+                    f"warning: MCP server '{report['server']}' failed: {report['error']}",
+                    file=sys.stderr,
+                )
+        print(
+            f"{len(queries)} queries, concurrency {args.concurrency}, "
+            f"{'scripted model' if model is not None else args.model}, {len(tools)} tools",
+            file=sys.stderr,
+        )
+
+        semaphore = asyncio.Semaphore(args.concurrency)
+        results = []
+
+        async def bounded(item: Dict[str, Any], out) -> None:
+            async with semaphore:
+                result = await run_query(agent, tools, item, args)
+            results.append(result)
+            out.write(json.dumps(result, ensure_ascii=False, default=str) + "\n")
+            out.flush()
+            if args.verbose:
+                status = result["error"] or f"{len(result['tool_trace'])} tool calls"
+                print(
+                    f"[{len(results)}/{len(queries)}] {result['id']}: "
+                    f"{result['latency']:.2f}s, {status}",
+                    file=sys.stderr,
+                )
+
+        started = time.perf_counter()
+        with open(args.output, "w", encoding="utf-8") as out:
+            await asyncio.gather(*(bounded(item, out) for item in queries))
+        wall = time.perf_counter() - started
+
+    summary = summarize(results, wall)
+    if args.fallback_model:
+        summary["hedging"] = get_hedge_stats()
+    print(json.dumps(summary, indent=2))
+    return 1 if summary["errors"] else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a JSONL file of queries against the MCP agent.")
+    parser.add_argument("queries", help="JSON Lines file of queries")
+    parser.add_argument("-o", "--output", default="results.jsonl", help="per-query results file")
+    parser.add_argument("--config", default=CONFIG_FILE_PATH, help="MCP tool configuration")
+    parser.add_argument(
+        "--model", default="claude-3-7-sonnet-latest", choices=list(OUTPUT_TOKEN_INFO)
+    )
+    parser.add_argument("--stub", help="answer with a scripted model from this JSON file")
+    parser.add_argument("--concurrency", type=int, default=4, help="queries in flight at once")
+    parser.add_argument("--limit", type=int, default=0, help="only run the first N queries")
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds per query")
+    parser.add_argument("--recursion-limit", type=int, default=100)
+    parser.add_argument(
+        "--prompt-caching",
+        action=argparse.BooleanOptionalAction,
+        default=PROMPT_CACHING,
+        help="send the system prompt and tools as a cacheable prefix",
+    )
+    parser.add_argument(
+        "--fallback-model",
+        choices=list(OUTPUT_TOKEN_INFO),
+        help="hedge slow model requests with this model (see hedging.py)",
+    )
+    parser.add_argument("-v", "--verbose", action="store_true", help="report each query on stderr")
+    args = parser.parse_args()
+
+    load_dotenv(override=True)
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
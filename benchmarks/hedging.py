@@ -0,0 +1,137 @@
+"""
+Simulates a primary model with a long latency tail, with and without hedging.
+
+Both models are scripted stub models from stub_models.py. The primary answers
+after ``--latency`` seconds plus up to ``--jitter`` more, and a
+``--slow-rate`` fraction of its calls waits ``--slow-latency`` seconds longer.
+The fallback answers after ``--fallback-latency`` seconds plus up to
+``--jitter`` more. Each worker sends streamed requests back to back; the
+time to first output and the full response time of every request are
+recorded.
+
+Usage:
+    python benchmarks/hedging.py --requests 400 --slow-rate 0.05 --slow-latency 3
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from typing import Dict, List
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import HumanMessage  # noqa: E402
+
+from hedging import HedgedChatModel, configure  # noqa: E402
+from stub_models import ScriptedChatAnthropic  # noqa: E402
+
+
+def stub(model: str, latency: float, jitter: float, **script) -> ScriptedChatAnthropic:
+    return ScriptedChatAnthropic(
+        model=model,
+        api_key="stub",
+        script={
+            "latency": latency,
+            "latency_jitter": jitter,
+            "token_delay": 0.005,
+            "default": [{"content": "stub answer " * 20}],
+            **script,
+        },
+    )
+
+
+async def simulate(args, hedged: bool) -> Dict[str, object]:
+    primary = stub(
+        "claude-3-7-sonnet-latest",
+        args.latency,
+        args.jitter,
+        slow_rate=args.slow_rate,
+        slow_latency=args.slow_latency,
+    )
+    fallback = stub("claude-3-5-haiku-latest", args.fallback_latency, args.jitter)
+    tracker = None
+    model = primary
+    if hedged:
+        tracker = configure(
+            "claude-3-7-sonnet-latest",
+            percentile=args.percentile,
+            initial_delay=args.initial_delay,
+            sample_rate=args.sample_rate,
+        )
+        model = HedgedChatModel(primary=primary, fallback=fallback)
+
+    messages = [HumanMessage(content="benchmark question")]
+    first_output: List[float] = []
+    total: List[float] = []
+    remaining = iter(range(args.requests))
+
+    async def worker() -> None:
+        for _ in remaining:
+            started = time.monotonic()
+            first = None
+            async for _ in model.astream(messages):
+                if first is None:
+                    first = time.monotonic() - started
+            first_output.append(first)
+            total.append(time.monotonic() - started)
+
+    await asyncio.gather(*[worker() for _ in range(args.workers)])
+
+    def p(values: List[float], q: float) -> float:
+        return float(np.percentile(values, q))
+
+    stats = tracker.get_stats() if tracker else {}
+    return {
+        "mode": "hedged" if hedged else "primary only",
+        "ttft_p50": p(first_output, 50),
+        "ttft_p95": p(first_output, 95),
+        "ttft_p99": p(first_output, 99),
+        "total_p99": p(total, 99),
+        "mean": float(np.mean(total)),
+        "hedge_rate": stats.get("hedge_rate", 0.0),
+        "fallback_wins": stats.get("fallback_wins", 0),
+        "sampled": stats.get("sampled_fallback_wins", 0),
+        "estimated_saved": stats.get("seconds_saved"),
+        "threshold": stats.get("threshold_seconds"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.3, help="primary base latency")
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--slow-rate", type=float, default=0.05, help="fraction of slow primary calls")
+    parser.add_argument("--slow-latency", type=float, default=3.0, help="extra latency of a slow call")
+    parser.add_argument("--fallback-latency", type=float, default=0.4)
+    parser.add_argument("--percentile", type=float, default=95.0)
+    parser.add_argument("--initial-delay", type=float, default=3.0)
+    parser.add_argument(
+        "--sample-rate", type=float, default=0.5, help="lost primaries followed to first output"
+    )
+    args = parser.parse_args()
+
+    print(
+        f"{'mode':<14}{'ttft p50':>10}{'ttft p95':>10}{'ttft p99':>10}{'total p99':>11}"
+        f"{'mean':>8}{'hedged':>8}{'fb wins':>9}{'sampled':>9}{'est saved':>11}{'threshold':>11}"
+    )
+    results = [asyncio.run(simulate(args, hedged)) for hedged in (False, True)]
+    for r in results:
+        print(
+            f"{r['mode']:<14}{r['ttft_p50']:>10.3f}{r['ttft_p95']:>10.3f}{r['ttft_p99']:>10.3f}"
+            f"{r['total_p99']:>11.3f}{r['mean']:>8.3f}{r['hedge_rate']:>8.1%}"
+            f"{r['fallback_wins']:>9}{r['sampled']:>9}"
+            f"{r['estimated_saved'] if r['estimated_saved'] is not None else '-':>11}"
+            f"{r['threshold'] if r['threshold'] is not None else '-':>11}"
+        )
+    measured = (results[0]["mean"] - results[1]["mean"]) * args.requests
+    print(f"\nmeasured time saved over {args.requests} requests: {measured:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
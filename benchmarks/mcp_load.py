@@ -0,0 +1,319 @@
+"""
+Load generator for the bundled MCP servers.
+
+Starts an MCP server locally over stdio or SSE, drives it with a number of
+concurrent MCP clients and reports throughput, latency percentiles and error
+rates per tool.
+
+Two arrival patterns are supported:
+
+- closed: every client issues its next call as soon as the previous one
+  returns (optionally after a think time).
+- open: calls arrive at a fixed total rate regardless of how fast the server
+  answers. Latency is measured from the scheduled arrival time, so queueing
+  delay is included.
+
+Usage:
+    python benchmarks/mcp_load.py mcp_server_time.py --clients 8 --duration 20
+    python benchmarks/mcp_load.py mcp_server_local.py --transport sse --mode open --rate 200
+    python benchmarks/mcp_load.py mcp_server_rag.py --call 'retrieve={"query": "summary"}'
+
+Each run appends one JSON line to --output for trend tracking.
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+from collections import defaultdict
+from contextlib import AsyncExitStack
+from typing import Any, Dict, List, Optional
+
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.sse import sse_client
+from mcp.client.stdio import stdio_client
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_CALLS = {
+    "get_current_time": {"timezone": "Asia/Seoul"},
+    "get_weather": {"location": "Seoul"},
+    "retrieve": {"query": "What is this document about?"},
+}
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(q / 100.0 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+class Recorder:
+    """Collects call latencies and errors per tool."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.error_samples: Dict[str, str] = {}
+
+    def record(self, tool: str, seconds: float, error: Optional[str]) -> None:
+        if error is None:
+            self.latencies[tool].append(seconds)
+        else:
+            self.errors[tool] += 1
+            self.error_samples.setdefault(tool, error)
+
+    def summary(self, duration: float) -> Dict[str, Any]:
+        tools = {}
+        for tool in sorted(set(self.latencies) | set(self.errors)):
+            values = sorted(self.latencies[tool])
+            errors = self.errors[tool]
+            total = len(values) + errors
+            tools[tool] = {
+                "calls": total,
+                "ok": len(values),
+                "errors": errors,
+                "error_rate": errors / total if total else 0.0,
+                "throughput": len(values) / duration if duration else 0.0,
+                "latency_ms": {
+                    "mean": 1000 * sum(values) / len(values) if values else 0.0,
+                    "p50": 1000 * percentile(values, 50),
+                    "p95": 1000 * percentile(values, 95),
+                    "p99": 1000 * percentile(values, 99),
+                    "max": 1000 * values[-1] if values else 0.0,
+                },
+                "error_sample": self.error_samples.get(tool),
+            }
+        return tools
+
+
+async def open_session(stack: AsyncExitStack, args) -> ClientSession:
+    if args.transport == "stdio":
+        params = StdioServerParameters(
+            command=sys.executable,
+            args=[os.path.join(ROOT, args.server)],
+            env={**os.environ, "FASTMCP_LOG_LEVEL": "WARNING"},
+            cwd=ROOT,
+        )
+        errlog = stack.enter_context(open(os.devnull, "w"))
+        read, write = await stack.enter_async_context(stdio_client(params, errlog))
+    else:
+        read, write = await stack.enter_async_context(
+            sse_client(f"http://127.0.0.1:{args.port}/sse")
+        )
+    session = await stack.enter_async_context(ClientSession(read, write))
+    await session.initialize()
+    return session
+
+
+async def call(session: ClientSession, tool: str, arguments: dict) -> Optional[str]:
+    try:
+        result = await session.call_tool(tool, arguments)
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+    if result.isError:
+        return " ".join(getattr(c, "text", "") for c in result.content)[:200]
+    return None
+
+
+async def run_load(args, calls: Dict[str, dict]) -> Dict[str, Any]:
+    recorder = Recorder()
+    plan = list(calls.items())
+
+    async with AsyncExitStack() as stack:
+        started = time.perf_counter()
+        # Transport contexts must be exited by the task that entered them, so
+        # the sessions are opened one after another from this task.
+        sessions = [await open_session(stack, args) for _ in range(args.clients)]
+        connect_seconds = time.perf_counter() - started
+
+        if args.warmup:
+            for tool, arguments in plan:
+                await asyncio.gather(*[call(s, tool, arguments) for s in sessions])
+
+        start = time.perf_counter()
+        deadline = start + args.duration
+
+        async def timed(session, tool, arguments, scheduled):
+            error = await call(session, tool, arguments)
+            recorder.record(tool, time.perf_counter() - scheduled, error)
+
+        if args.mode == "closed":
+
+            async def client_loop(index: int, session: ClientSession):
+                i = index
+                while time.perf_counter() < deadline:
+                    tool, arguments = plan[i % len(plan)]
+                    await timed(session, tool, arguments, time.perf_counter())
+                    i += 1
+                    if args.think_time:
+                        await asyncio.sleep(args.think_time)
+
+            await asyncio.gather(
+                *[client_loop(i, s) for i, s in enumerate(sessions)]
+            )
+        else:
+            interval = 1.0 / args.rate
+            pending = set()
+            i = 0
+            while True:
+                scheduled = start + i * interval
+                if scheduled >= deadline:
+                    break
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                tool, arguments = plan[i % len(plan)]
+                task = asyncio.create_task(
+                    timed(sessions[i % len(sessions)], tool, arguments, scheduled)
+                )
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+                i += 1
+            if pending:
+                await asyncio.gather(*pending)
+
+        elapsed = time.perf_counter() - start
+
+    return {
+        "connect_seconds": connect_seconds,
+        "elapsed_seconds": elapsed,
+        "tools": recorder.summary(elapsed),
+    }
+
+
+def serve_sse(server: str, port: int) -> None:
+    spec = importlib.util.spec_from_file_location("mcp_load_target", server)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.mcp.settings.port = port
+    module.mcp.settings.log_level = "WARNING"
+    module.mcp.run(transport="sse")
+
+
+def start_sse_server(args) -> subprocess.Popen:
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            os.path.abspath(__file__),
+            "--serve-sse",
+            os.path.join(ROOT, args.server),
+            "--port",
+            str(args.port),
+        ],
+        cwd=ROOT,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{args.port}/sse", timeout=1):
+                return process
+        except Exception:
+            if process.poll() is not None:
+                raise RuntimeError("SSE server exited during startup")
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("SSE server did not become ready")
+
+
+async def discover_calls(args) -> Dict[str, dict]:
+    if args.call:
+        calls = {}
+        for spec in args.call:
+            name, _, arguments = spec.partition("=")
+            calls[name] = json.loads(arguments) if arguments else {}
+        return calls
+    async with AsyncExitStack() as stack:
+        session = await open_session(stack, args)
+        tools = (await session.list_tools()).tools
+    calls = {t.name: DEFAULT_CALLS[t.name] for t in tools if t.name in DEFAULT_CALLS}
+    if not calls:
+        raise SystemExit(
+            "No default arguments for this server's tools; pass them with --call"
+        )
+    return calls
+
+
+def print_report(result: Dict[str, Any]) -> None:
+    print(
+        f"{result['server']} over {result['transport']}, {result['mode']}-loop, "
+        f"{result['clients']} clients, {result['elapsed_seconds']:.1f}s "
+        f"(connect {result['connect_seconds']:.2f}s)"
+    )
+    header = f"{'tool':<20}{'calls':>8}{'err%':>7}{'rps':>9}{'p50ms':>9}{'p95ms':>9}{'p99ms':>9}"
+    print(header)
+    print("-" * len(header))
+    for tool, stats in result["tools"].items():
+        latency = stats["latency_ms"]
+        print(
+            f"{tool:<20}{stats['calls']:>8}{100 * stats['error_rate']:>7.1f}"
+            f"{stats['throughput']:>9.1f}{latency['p50']:>9.1f}"
+            f"{latency['p95']:>9.1f}{latency['p99']:>9.1f}"
+        )
+        if stats["error_sample"]:
+            print(f"    first error: {stats['error_sample']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Load generator for the bundled MCP servers."
+    )
+    parser.add_argument("server", nargs="?", help="server script, e.g. mcp_server_time.py")
+    parser.add_argument("--transport", choices=["stdio", "sse"], default="stdio")
+    parser.add_argument("--clients", type=int, default=4, help="concurrent MCP clients")
+    parser.add_argument("--mode", choices=["closed", "open"], default="closed")
+    parser.add_argument("--rate", type=float, default=50.0, help="calls/s in open mode")
+    parser.add_argument("--think-time", type=float, default=0.0, help="closed mode pause")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--call", action="append", help="TOOL=JSON_ARGS, repeatable")
+    parser.add_argument("--no-warmup", dest="warmup", action="store_false")
+    parser.add_argument("--port", type=int, default=18010, help="port for SSE mode")
+    parser.add_argument("--output", help="append results as a JSON line to this file")
+    parser.add_argument("--serve-sse", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve_sse:
+        serve_sse(args.serve_sse, args.port)
+        return
+    if not args.server:
+        parser.error("the server script is required")
+
+    server_process = start_sse_server(args) if args.transport == "sse" else None
+    try:
+        calls = asyncio.run(discover_calls(args))
+        result = asyncio.run(run_load(args, calls))
+    finally:
+        if server_process is not None:
+            server_process.terminate()
+            try:
+                server_process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                server_process.kill()
+                server_process.wait()
+
+    result = {
+        "timestamp": time.time(),
+        "server": args.server,
+        "transport": args.transport,
+        "mode": args.mode,
+        "clients": args.clients,
+        "rate": args.rate if args.mode == "open" else None,
+        "duration": args.duration,
+        **result,
+    }
+    print_report(result)
+    if args.output:
+        with open(args.output, "a", encoding="utf-8") as f:
+            f.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+
+if __name__ == "__main__":
+    main()
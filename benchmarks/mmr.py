@@ -0,0 +1,85 @@
+"""
+Measures the latency of the MMR diversification stage used by retrieve.
+
+Compares the vectorized implementation in rag_index.mmr_select with a
+straightforward per-pair Python loop, for several candidate pool sizes.
+
+Usage:
+    python benchmarks/mmr.py --dim 1536 --fetch-k 50 200 --k 10 50
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rag_index import mmr_select  # noqa: E402
+
+
+def mmr_loop(query, candidates, k, lambda_mult):
+    candidates = candidates / np.linalg.norm(candidates, axis=1, keepdims=True)
+    query = query / np.linalg.norm(query)
+    relevance = [float(np.dot(c, query)) for c in candidates]
+    selected = [int(np.argmax(relevance))]
+    while len(selected) < min(k, len(candidates)):
+        best, best_score = None, -np.inf
+        for i in range(len(candidates)):
+            if i in selected:
+                continue
+            redundancy = max(float(np.dot(candidates[i], candidates[j])) for j in selected)
+            score = lambda_mult * relevance[i] - (1 - lambda_mult) * redundancy
+            if score > best_score:
+                best, best_score = i, score
+        selected.append(best)
+    return selected
+
+
+def timeit(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return 1000 * samples[len(samples) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark MMR re-ranking.")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--fetch-k", type=int, nargs="+", default=[50, 200])
+    parser.add_argument("--k", type=int, nargs="+", default=[10, 50])
+    parser.add_argument("--lambda-mult", type=float, default=0.5)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--skip-loop", action="store_true")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    query = rng.normal(size=args.dim).astype(np.float32)
+    print(f"{'fetch_k':>8}{'k':>6}{'vectorized ms':>16}{'python loop ms':>17}")
+    for fetch_k in args.fetch_k:
+        candidates = rng.normal(size=(fetch_k, args.dim)).astype(np.float32)
+        for k in args.k:
+            if k > fetch_k:
+                continue
+            fast = timeit(
+                lambda: mmr_select(query, candidates, k, args.lambda_mult), args.repeat
+            )
+            if args.skip_loop:
+                slow = float("nan")
+            else:
+                expected = list(mmr_select(query, candidates, k, args.lambda_mult))
+                assert mmr_loop(query, candidates, k, args.lambda_mult) == expected
+                slow = timeit(
+                    lambda: mmr_loop(query, candidates, k, args.lambda_mult),
+                    max(args.repeat // 10, 1),
+                )
+            print(f"{fetch_k:>8}{k:>6}{fast:>16.3f}{slow:>17.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Simulates many sessions calling an overloaded provider, with and without
+admission control.
+
+The provider is the scripted stub model from stub_models.py: it answers after
+a variable latency and rejects calls beyond ``--capacity`` in flight with a
+429. Batch workers send requests back to back while interactive workers send
+a streamed request every ``--think`` seconds. Without admission control each
+call retries on its own like the SDK default (two retries, exponential
+backoff); with it, calls go through rate_limiter.AdmissionController.
+
+Usage:
+    python benchmarks/rate_limiter.py --capacity 8 --batch-workers 24 --interactive-workers 3
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from typing import ClassVar, Dict, List
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import HumanMessage  # noqa: E402
+
+from rate_limiter import (  # noqa: E402
+    BATCH,
+    INTERACTIVE,
+    AdmissionControlled,
+    classify_error,
+    configure,
+    priority,
+)
+from stub_models import ScriptedChatAnthropic  # noqa: E402
+
+
+class AdmittedScriptedChatAnthropic(AdmissionControlled, ScriptedChatAnthropic):
+    admission_provider: ClassVar[str] = "stub"
+
+
+async def sdk_retry(call, max_retries: int = 2):
+    # The retry policy of the provider SDKs: 0.5s doubling, up to 25% jitter.
+    for attempt in range(max_retries + 1):
+        try:
+            return await call()
+        except Exception as e:
+            outcome, retry_after = classify_error(e)
+            if outcome == "error" or attempt == max_retries:
+                raise
+            delay = min(0.5 * 2**attempt, 8.0) * (1 - 0.25 * random.random())
+            await asyncio.sleep(max(delay, retry_after or 0.0))
+
+
+async def simulate(args, admitted: bool) -> Dict[str, object]:
+    script = {
+        "latency": args.latency,
+        "latency_jitter": args.jitter,
+        "max_concurrency": args.capacity,
+        "retry_after": args.retry_after,
+        "default": [{"content": "stub answer " * 20}],
+    }
+    model_cls = AdmittedScriptedChatAnthropic if admitted else ScriptedChatAnthropic
+    model = model_cls(model="claude-3-5-haiku-latest", api_key="stub", script=script)
+    controller = None
+    if admitted:
+        controller = configure(
+            "stub",
+            concurrency=args.initial_concurrency,
+            max_concurrency=4 * args.capacity,
+            backoff_base=0.25,
+            backoff_cap=4.0,
+            max_retries=8,
+        )
+    messages = [HumanMessage(content="benchmark question")]
+    latencies: Dict[int, List[float]] = {INTERACTIVE: [], BATCH: []}
+    failures = {INTERACTIVE: 0, BATCH: 0}
+    deadline = time.monotonic() + args.duration
+
+    async def request(level: int) -> None:
+        started = time.monotonic()
+        try:
+            if level == INTERACTIVE:
+                call = lambda: _drain(model.astream(messages))  # noqa: E731
+            else:
+                call = lambda: model.ainvoke(messages)  # noqa: E731
+            await (call() if admitted else sdk_retry(call))
+        except Exception:
+            failures[level] += 1
+        else:
+            latencies[level].append(time.monotonic() - started)
+
+    async def worker(level: int) -> None:
+        with priority(level):
+            while time.monotonic() < deadline:
+                await request(level)
+                if level == INTERACTIVE:
+                    await asyncio.sleep(args.think)
+
+    started = time.monotonic()
+    await asyncio.gather(
+        *[worker(BATCH) for _ in range(args.batch_workers)],
+        *[worker(INTERACTIVE) for _ in range(args.interactive_workers)],
+    )
+    wall = time.monotonic() - started
+
+    def p(values: List[float], q: float) -> float:
+        return float(np.percentile(values, q)) if values else float("nan")
+
+    return {
+        "mode": "admission" if admitted else "sdk retries",
+        "rejected_429": model.rejected,
+        "batch_ok": len(latencies[BATCH]),
+        "batch_failed": failures[BATCH],
+        "batch_rps": len(latencies[BATCH]) / wall,
+        "interactive_ok": len(latencies[INTERACTIVE]),
+        "interactive_failed": failures[INTERACTIVE],
+        "interactive_p50": p(latencies[INTERACTIVE], 50),
+        "interactive_p95": p(latencies[INTERACTIVE], 95),
+        "final_limit": controller.get_stats()["concurrency_limit"] if controller else None,
+    }
+
+
+async def _drain(stream) -> None:
+    async for _ in stream:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--capacity", type=int, default=8, help="provider calls in flight before 429")
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--retry-after", type=float, default=0.0)
+    parser.add_argument("--batch-workers", type=int, default=24)
+    parser.add_argument("--interactive-workers", type=int, default=3)
+    parser.add_argument("--think", type=float, default=0.3, help="pause between interactive turns")
+    parser.add_argument("--initial-concurrency", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+
+    print(
+        f"{'mode':<12}{'429s':>7}{'batch ok':>10}{'failed':>8}{'batch rps':>11}"
+        f"{'inter ok':>10}{'failed':>8}{'inter p50':>11}{'inter p95':>11}{'limit':>7}"
+    )
+    for admitted in (False, True):
+        r = asyncio.run(simulate(args, admitted))
+        print(
+            f"{r['mode']:<12}{r['rejected_429']:>7}{r['batch_ok']:>10}{r['batch_failed']:>8}"
+            f"{r['batch_rps']:>11.1f}{r['interactive_ok']:>10}{r['interactive_failed']:>8}"
+            f"{r['interactive_p50']:>11.3f}{r['interactive_p95']:>11.3f}"
+            f"{r['final_limit'] if r['final_limit'] is not None else '-':>7}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Measures how throughput of mcp_server_remote.py scales with the worker count.
+
+For each worker count the server is started in streamable HTTP mode and driven
+by several client processes, each running concurrent MCP sessions that call
+``get_weather`` in a closed loop for a fixed duration.
+
+Usage:
+    python benchmarks/remote_workers.py --workers 1 2 4 --duration 10
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+from queue import Empty
+
+from mcp import ClientSession
+from mcp.client.streamable_http import streamablehttp_client
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+async def _client_loop(url: str, deadline: float, counts: list) -> None:
+    async with streamablehttp_client(url) as (read, write, _):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+            while time.time() < deadline:
+                try:
+                    await session.call_tool("get_weather", {"location": "Seoul"})
+                    counts[0] += 1
+                except Exception:
+                    counts[1] += 1
+
+
+def _client_process(url: str, sessions: int, deadline: float, queue) -> None:
+    counts = [0, 0]
+
+    async def run():
+        await asyncio.gather(
+            *[_client_loop(url, deadline, counts) for _ in range(sessions)]
+        )
+
+    asyncio.run(run())
+    queue.put(counts)
+
+
+def _collect(queue, procs, timeout: float) -> list:
+    # A client that crashes never reports, so check exit codes while waiting.
+    results = []
+    deadline = time.time() + timeout
+    while len(results) < len(procs):
+        try:
+            results.append(queue.get(timeout=1.0))
+        except Empty:
+            failed = [p.exitcode for p in procs if p.exitcode not in (None, 0)]
+            if failed:
+                raise RuntimeError(f"client processes failed with exit codes {failed}")
+            if time.time() > deadline:
+                raise RuntimeError("client processes did not report their results")
+    return results
+
+
+def _wait_ready(port: int, timeout: float = 30.0) -> dict:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as r:
+                return json.loads(r.read())
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("server did not become ready")
+
+
+def run_once(workers: int, port: int, clients: int, sessions: int, duration: float):
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            os.path.join(ROOT, "mcp_server_remote.py"),
+            "--transport",
+            "streamable-http",
+            "--workers",
+            str(workers),
+            "--port",
+            str(port),
+        ],
+        cwd=ROOT,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    procs = []
+    try:
+        _wait_ready(port)
+        url = f"http://127.0.0.1:{port}/mcp"
+        queue = multiprocessing.Queue()
+        deadline = time.time() + duration
+        procs = [
+            multiprocessing.Process(
+                target=_client_process, args=(url, sessions, deadline, queue)
+            )
+            for _ in range(clients)
+        ]
+        for p in procs:
+            p.start()
+        results = _collect(queue, procs, duration + 60)
+        for p in procs:
+            p.join()
+        metrics = _wait_ready(port)
+    finally:
+        for p in procs:
+            if p.is_alive():
+                p.terminate()
+        server.terminate()
+        server.wait()
+
+    calls = sum(r[0] for r in results)
+    errors = sum(r[1] for r in results)
+    return {
+        "workers": workers,
+        "calls": calls,
+        "errors": errors,
+        "calls_per_second": calls / duration,
+        "requests_per_worker": [w["requests"] for w in metrics["workers"]],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=4, help="client processes")
+    parser.add_argument("--sessions", type=int, default=8, help="sessions per client")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--port", type=int, default=18005)
+    args = parser.parse_args()
+
+    baseline = None
+    for workers in args.workers:
+        result = run_once(
+            workers, args.port, args.clients, args.sessions, args.duration
+        )
+        baseline = baseline or result["calls_per_second"]
+        print(
+            f"workers={workers:<3} calls/s={result['calls_per_second']:8.1f} "
+            f"speedup={result['calls_per_second'] / baseline:5.2f}x "
+            f"errors={result['errors']} per-worker={result['requests_per_worker']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
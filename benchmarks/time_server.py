@@ -0,0 +1,139 @@
+"""
+Compares the time server's zone lookups with the per-call pytz lookup it
+replaced.
+
+Two measurements:
+
+- in-process: calls per second of get_current_time with the previous
+  implementation, which called pytz.timezone() on every call, and with the
+  current one, which reads a prebuilt index; plus get_times over all zones.
+- stdio: wall time to read ``--zones`` zones from a running server, once as
+  one get_current_time round-trip per zone and once as a single get_times
+  call.
+
+Usage:
+    python benchmarks/time_server.py --calls 20000 --zones 8
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from contextlib import AsyncExitStack
+from datetime import datetime
+from typing import Optional
+
+import pytz
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mcp import ClientSession, StdioServerParameters  # noqa: E402
+from mcp.client.stdio import stdio_client  # noqa: E402
+
+import mcp_server_time  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ZONES = [
+    "Asia/Seoul",
+    "America/New_York",
+    "Europe/London",
+    "Asia/Tokyo",
+    "Australia/Sydney",
+    "America/Los_Angeles",
+    "Europe/Berlin",
+    "Asia/Kolkata",
+    "America/Sao_Paulo",
+    "Africa/Johannesburg",
+    "Asia/Singapore",
+    "Europe/Moscow",
+]
+
+
+async def previous_get_current_time(timezone: Optional[str] = "Asia/Seoul") -> str:
+    # get_current_time as it was before the timezone index.
+    try:
+        tz = pytz.timezone(timezone)
+        current_time = datetime.now(tz)
+        formatted_time = current_time.strftime("%Y-%m-%d %H:%M:%S %Z")
+        return f"Current time in {timezone} is: {formatted_time}"
+    except pytz.exceptions.UnknownTimeZoneError:
+        return f"Error: Unknown timezone '{timezone}'. Please provide a valid timezone."
+
+
+async def calls_per_second(tool, calls: int, queries) -> float:
+    started = time.perf_counter()
+    for i in range(calls):
+        await tool(queries[i % len(queries)])
+    return calls / (time.perf_counter() - started)
+
+
+async def in_process(args) -> None:
+    print(f"{'in-process':<42}{'calls/s':>12}")
+    rows = [
+        ("previous get_current_time (IANA names)", previous_get_current_time, ZONES),
+        ("indexed get_current_time (IANA names)", mcp_server_time.get_current_time, ZONES),
+        (
+            "indexed get_current_time (aliases)",
+            mcp_server_time.get_current_time,
+            ["seoul", "new york", "KST", "london", "PST", "UTC+5:30"],
+        ),
+    ]
+    for label, tool, queries in rows:
+        print(f"{label:<42}{await calls_per_second(tool, args.calls, queries):>12,.0f}")
+
+    batch = ZONES[: args.zones]
+    rate = await calls_per_second(
+        lambda _: mcp_server_time.get_times(batch), args.calls // args.zones, [None]
+    )
+    print(f"{f'get_times ({args.zones} zones per call)':<42}{rate * args.zones:>12,.0f} zones/s")
+
+
+async def over_stdio(args) -> None:
+    async with AsyncExitStack() as stack:
+        params = StdioServerParameters(
+            command=sys.executable,
+            args=[os.path.join(ROOT, "mcp_server_time.py")],
+            env={**os.environ, "FASTMCP_LOG_LEVEL": "WARNING"},
+            cwd=ROOT,
+        )
+        errlog = stack.enter_context(open(os.devnull, "w"))
+        read, write = await stack.enter_async_context(stdio_client(params, errlog))
+        session = await stack.enter_async_context(ClientSession(read, write))
+        await session.initialize()
+
+        zones = ZONES[: args.zones]
+        await session.call_tool("get_times", {"timezones": zones})
+
+        started = time.perf_counter()
+        for _ in range(args.rounds):
+            for zone in zones:
+                await session.call_tool("get_current_time", {"timezone": zone})
+        one_by_one = (time.perf_counter() - started) / args.rounds
+
+        started = time.perf_counter()
+        for _ in range(args.rounds):
+            await session.call_tool("get_times", {"timezones": zones})
+        batched = (time.perf_counter() - started) / args.rounds
+
+    print(f"\n{f'stdio, {len(zones)} zones':<42}{'ms':>12}")
+    print(f"{f'{len(zones)} x get_current_time':<42}{one_by_one * 1000:>12.2f}")
+    print(f"{'1 x get_times':<42}{batched * 1000:>12.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--calls", type=int, default=20000, help="in-process calls per row")
+    parser.add_argument("--zones", type=int, default=8, help="zones per batched lookup")
+    parser.add_argument("--rounds", type=int, default=50, help="repetitions over stdio")
+    parser.add_argument("--skip-stdio", action="store_true")
+    args = parser.parse_args()
+
+    asyncio.run(in_process(args))
+    if not args.skip_stdio:
+        asyncio.run(over_stdio(args))
+
+
+if __name__ == "__main__":
+    main()
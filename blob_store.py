@@ -0,0 +1,175 @@
+"""
+Content-addressed store for large tool outputs.
+
+Tool results longer than TOOL_OUTPUT_LIMIT characters are written to disk
+under their SHA-256 digest and replaced, in the conversation state, by a
+preview followed by a ``blob:<digest>`` reference. The agent can read the
+full content back with the ``load_blob`` tool, and the UI loads it only when
+asked to, so a large result is neither kept in memory several times nor
+re-sent with every model call.
+"""
+
+import hashlib
+import os
+import re
+import uuid
+from typing import Any, List, Optional
+
+from langchain_core.tools import tool
+
+BLOB_DIR = os.environ.get("TOOL_BLOB_DIR", "data/blobs")
+OUTPUT_LIMIT = int(os.environ.get("TOOL_OUTPUT_LIMIT", "8000"))
+PREVIEW_CHARS = int(os.environ.get("TOOL_OUTPUT_PREVIEW", "1500"))
+LOAD_CHARS = int(os.environ.get("TOOL_BLOB_LOAD_CHARS", str(OUTPUT_LIMIT or 20000)))
+
+REF_PATTERN = re.compile(r"blob:([0-9a-f]{64})")
+
+
+class BlobStore:
+    """Text blobs stored under ``root/<first two hex digits>/<digest>``."""
+
+    def __init__(self, root: str = BLOB_DIR):
+        self.root = root
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest)
+
+    def put(self, text: str) -> str:
+        """
+        Stores a text and returns its reference.
+
+        Identical texts share one file, so storing the same output again only
+        costs the hash.
+
+        Args:
+            text: Content to store
+
+        Returns:
+            str: Reference of the form ``blob:<sha256 hex digest>``
+        """
+        data = text.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        return f"blob:{digest}"
+
+    def get(self, ref: str) -> str:
+        """
+        Returns the content of a stored blob.
+
+        Args:
+            ref: Blob reference, with or without the ``blob:`` prefix
+
+        Returns:
+            str: Stored content
+
+        Raises:
+            KeyError: If the reference is malformed or the blob does not exist
+        """
+        digest = ref[len("blob:"):] if ref.startswith("blob:") else ref
+        if not re.fullmatch(r"[0-9a-f]{64}", digest):
+            raise KeyError(f"Invalid blob reference: {ref}")
+        try:
+            with open(self._path(digest), encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            raise KeyError(f"Blob not found: {ref}") from None
+
+
+blob_store = BlobStore()
+
+
+def spill_text(
+    text: str,
+    store: Optional[BlobStore] = None,
+    limit: int = OUTPUT_LIMIT,
+    preview_chars: int = PREVIEW_CHARS,
+) -> str:
+    """
+    Replaces a text over the size limit with a preview and a blob reference.
+
+    Args:
+        text: Tool output
+        store: Blob store to write to. Uses the default store if None
+        limit: Largest text kept inline, in characters. 0 disables spilling
+        preview_chars: Number of leading characters kept as the preview
+
+    Returns:
+        str: The text itself, or its preview followed by the reference
+    """
+    if limit <= 0 or len(text) <= limit:
+        return text
+    ref = (store or blob_store).put(text)
+    return (
+        f"{text[:preview_chars]}\n\n"
+        f"[Output truncated: showing {preview_chars} of {len(text)} characters. "
+        f"Full output stored as {ref}; call load_blob with this ref to read more.]"
+    )
+
+
+def spill_tool_output(result: Any, response_format: str = "content") -> Any:
+    """
+    Applies the size limit to the value returned by a tool coroutine.
+
+    Args:
+        result: Tool return value
+        response_format: "content", or "content_and_artifact" for tools that
+            return a (content, artifact) tuple, such as MCP tools
+
+    Returns:
+        Any: Tool return value with large text content spilled to the store
+    """
+    if response_format == "content_and_artifact" and isinstance(result, tuple):
+        content, artifact = result
+        return spill_tool_output(content), artifact
+    if isinstance(result, str):
+        return spill_text(result)
+    if isinstance(result, list):
+        return [spill_text(item) if isinstance(item, str) else item for item in result]
+    return result
+
+
+def find_refs(text: str) -> List[str]:
+    """Returns the blob references in a text, in order of first appearance."""
+    return list(dict.fromkeys(f"blob:{d}" for d in REF_PATTERN.findall(text)))
+
+
+@tool
+def load_blob(ref: str, offset: int = 0, max_chars: int = LOAD_CHARS) -> str:
+    """
+    Reads a tool output that was too large to show in full.
+
+    Large tool outputs are replaced by a preview and a reference such as
+    blob:3f2a...; use this tool with that reference to read the full content.
+    Long content is returned in parts; pass the offset given at the end of a
+    part to read the next one.
+
+    Args:
+        ref: Blob reference from a truncated tool output
+        offset: Character position to start reading from
+        max_chars: Maximum number of characters to return, capped at the
+            tool output limit
+
+    Returns:
+        str: Requested part of the stored output
+    """
+    try:
+        text = blob_store.get(ref)
+    except KeyError as e:
+        return str(e.args[0])
+    if OUTPUT_LIMIT > 0:
+        # load_blob's own output is not spilled, so keep it within the limit.
+        max_chars = min(max_chars, OUTPUT_LIMIT)
+    end = offset + max(max_chars, 1)
+    part = text[offset:end]
+    if end < len(text):
+        part += (
+            f"\n\n[Showing characters {offset}-{end} of {len(text)}. "
+            f"Call load_blob with offset={end} to continue.]"
+        )
+    return part
@@ -0,0 +1,197 @@
+"""
+Command-line runner for the MCP agent.
+
+Loads config.json, builds the same agent as the Streamlit app and streams
+answers to the terminal. Output goes through a buffered writer that flushes
+on newlines or after a short interval instead of on every token.
+
+Usage:
+    python cli.py                                  # interactive session
+    python cli.py < questions.txt                  # one question per line
+    cat questions.txt | python cli.py --batch --model gpt-4o-mini
+
+In interactive mode, /reset starts a new conversation and /exit quits.
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from typing import Any, Dict
+
+from dotenv import load_dotenv
+from langchain_core.messages import AIMessageChunk, HumanMessage, ToolMessage
+from langgraph.checkpoint.memory import MemorySaver
+
+from agent_cache import session_config
+from agent_setup import (
+    CONFIG_FILE_PATH,
+    OUTPUT_TOKEN_INFO,
+    PROMPT_CACHING,
+    build_agent,
+    load_mcp_config,
+)
+from mcp_connections import MCPConnectionSet
+from rate_limiter import BATCH, request_priority
+from utils import BufferedConsoleWriter, astream_graph, random_uuid
+
+
+def make_callback(out: BufferedConsoleWriter, err: BufferedConsoleWriter, verbose: bool):
+    """
+    Creates a streaming callback that writes answer text to ``out``.
+
+    Tool calls and results are reported on ``err`` when ``verbose`` is set, so
+    the answer stream stays clean when stdout is piped.
+    """
+    announced = set()
+
+    def callback(event: Dict[str, Any]) -> None:
+        message = event.get("content")
+        if isinstance(message, AIMessageChunk):
+            content = message.content
+            if isinstance(content, str):
+                out.write(content)
+            else:
+                for block in content:
+                    if isinstance(block, dict) and block.get("type") == "text":
+                        out.write(block.get("text", ""))
+            if verbose:
+                for chunk in message.tool_call_chunks:
+                    if chunk.get("name") and chunk.get("id") not in announced:
+                        announced.add(chunk.get("id"))
+                        err.write(f"\n[tool] {chunk['name']}\n")
+        elif isinstance(message, ToolMessage) and verbose:
+            err.write(f"[tool] {message.name} returned {len(str(message.content))} chars\n")
+
+    return callback
+
+
+async def ask(agent, tools, query: str, thread_id: str, args, out, err) -> bool:
+    started = time.perf_counter()
+    try:
+        await asyncio.wait_for(
+            astream_graph(
+                agent,
+                {"messages": [HumanMessage(content=query)]},
+                callback=make_callback(out, err, args.verbose),
+                config=session_config(
+                    tools, thread_id, recursion_limit=args.recursion_limit
+                ),
+                record_path=args.record,
+            ),
+            timeout=args.timeout,
+        )
+        ok = True
+    except asyncio.TimeoutError:
+        err.write(f"\nerror: no answer within {args.timeout} seconds\n")
+        ok = False
+    except Exception as e:
+        err.write(f"\nerror: {e}\n")
+        ok = False
+    out.write("\n")
+    if args.verbose:
+        err.write(f"[{time.perf_counter() - started:.2f}s]\n")
+    out.flush()
+    err.flush()
+    return ok
+
+
+async def run(args) -> int:
+    out = BufferedConsoleWriter(sys.stdout, interval=args.flush_interval)
+    err = BufferedConsoleWriter(sys.stderr, interval=args.flush_interval)
+    interactive = not args.batch and sys.stdin.isatty()
+    if not interactive:
+        request_priority.set(BATCH)
+
+    async with MCPConnectionSet() as client:
+        agent, tools, reports = await build_agent(
+            client,
+            load_mcp_config(args.config),
+            args.model,
+            checkpointer=MemorySaver(),
+            prompt_caching=args.prompt_caching,
+            fallback_model_name=args.fallback_model,
+        )
+        for report in reports:
+            if report["error"]:
+                err.write(f"warning: MCP server '{report['server']}' failed: {report['error']}\n")
+        if interactive or args.verbose:
+            err.write(f"{args.model} with {len(tools)} tools: {', '.join(t.name for t in tools)}\n")
+        err.flush()
+
+        thread_id = random_uuid()
+        failures = 0
+        if interactive:
+            while True:
+                try:
+                    query = await asyncio.to_thread(input, "\n> ")
+                except (EOFError, KeyboardInterrupt):
+                    break
+                query = query.strip()
+                if not query:
+                    continue
+                if query in ("/exit", "/quit"):
+                    break
+                if query == "/reset":
+                    thread_id = random_uuid()
+                    err.write("conversation reset\n")
+                    err.flush()
+                    continue
+                failures += not await ask(agent, tools, query, thread_id, args, out, err)
+        else:
+            for line in sys.stdin:
+                query = line.strip()
+                if not query:
+                    continue
+                if not args.shared_thread:
+                    thread_id = random_uuid()
+                if args.echo:
+                    out.write(f"> {query}\n")
+                failures += not await ask(agent, tools, query, thread_id, args, out, err)
+                out.write("\n")
+        out.flush()
+    return 1 if failures else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the MCP agent from the command line.")
+    parser.add_argument("--config", default=CONFIG_FILE_PATH, help="MCP tool configuration")
+    parser.add_argument(
+        "--model", default="claude-3-7-sonnet-latest", choices=list(OUTPUT_TOKEN_INFO)
+    )
+    parser.add_argument("--batch", action="store_true", help="read questions from stdin")
+    parser.add_argument(
+        "--shared-thread",
+        action="store_true",
+        help="in batch mode, keep one conversation for all questions",
+    )
+    parser.add_argument("--echo", action="store_true", help="print each question before its answer")
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds per answer")
+    parser.add_argument("--recursion-limit", type=int, default=100)
+    parser.add_argument(
+        "--prompt-caching",
+        action=argparse.BooleanOptionalAction,
+        default=PROMPT_CACHING,
+        help="send the system prompt and tools as a cacheable prefix",
+    )
+    parser.add_argument(
+        "--fallback-model",
+        choices=list(OUTPUT_TOKEN_INFO),
+        help="hedge slow model requests with this model (see hedging.py)",
+    )
+    parser.add_argument(
+        "--flush-interval",
+        type=float,
+        default=0.05,
+        help="longest time in seconds output stays buffered",
+    )
+    parser.add_argument("--record", help="append the event stream of each answer to this file")
+    parser.add_argument("-v", "--verbose", action="store_true", help="report tool calls on stderr")
+    args = parser.parse_args()
+
+    load_dotenv(override=True)
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""
+Delta-encoded in-memory checkpoints.
+
+MemorySaver stores a new serialized copy of a channel every time it changes.
+For the ``messages`` channel, which grows by a few messages per step, the
+stored history of a thread therefore grows quadratically with its length.
+``DeltaMemorySaver`` stores a list-valued channel as the messages appended
+since an earlier version of the same channel, plus the length of the prefix
+they share, and writes a full snapshot every CHECKPOINT_SNAPSHOT_INTERVAL
+versions so that no reconstruction replays a long chain.
+
+Values are reconstructed only when a checkpoint is read, starting from the
+nearest cached or full version; the last CHECKPOINT_CACHE_SIZE reconstructed
+values are kept. The cached values are private copies: values passed to
+``put`` and returned by reads are copied, so that the graph can change its
+message objects without changing stored state. ``history`` lists the steps of a thread from the checkpoint
+metadata alone, without reconstructing any state.
+"""
+
+import copy
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.memory import MemorySaver
+
+SNAPSHOT_INTERVAL = int(os.environ.get("CHECKPOINT_SNAPSHOT_INTERVAL", "16"))
+CACHE_SIZE = int(os.environ.get("CHECKPOINT_CACHE_SIZE", "64"))
+
+BlobKey = Tuple[str, str, str, Any]
+
+
+class ChainEntry(NamedTuple):
+    """How a stored list value relates to an earlier version of its channel."""
+
+    base: Optional[Any]  # Version the delta applies to, None for a full snapshot
+    prefix: int  # Items of the base value kept before the stored tail
+    length: int  # Length of the reconstructed value
+    depth: int  # Deltas between this value and the nearest full snapshot
+
+
+def _common_prefix(old: List[Any], new: List[Any]) -> int:
+    n = min(len(old), len(new))
+    for i in range(n):
+        if old[i] is not new[i] and old[i] != new[i]:
+            return i
+    return n
+
+
+class DeltaMemorySaver(MemorySaver):
+    """
+    MemorySaver that stores list-valued channels as deltas.
+
+    ``blobs`` holds the serialized tail of a delta in place of the full value;
+    ``chain`` records, for every list-valued blob, the version it applies to.
+    Other channels are stored exactly as MemorySaver stores them.
+
+    Args:
+        snapshot_interval: Largest number of deltas between two full snapshots
+        cache_size: Number of reconstructed list values kept in memory
+    """
+
+    def __init__(
+        self,
+        *,
+        snapshot_interval: int = SNAPSHOT_INTERVAL,
+        cache_size: int = CACHE_SIZE,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(**kwargs)
+        self.snapshot_interval = snapshot_interval
+        self.cache_size = cache_size
+        self.chain: Dict[BlobKey, ChainEntry] = {}
+        self.values_cache: "OrderedDict[BlobKey, List[Any]]" = OrderedDict()
+        self.heads: Dict[Tuple[str, str, str], Any] = {}
+        self.stats = {"snapshots": 0, "deltas": 0, "reconstructed": 0, "cache_hits": 0}
+
+    def _cache(self, key: BlobKey, value: List[Any]) -> None:
+        self.values_cache[key] = value
+        self.values_cache.move_to_end(key)
+        while len(self.values_cache) > self.cache_size:
+            self.values_cache.popitem(last=False)
+
+    def _materialize(self, key: BlobKey) -> List[Any]:
+        cached = self.values_cache.get(key)
+        if cached is not None:
+            self.values_cache.move_to_end(key)
+            self.stats["cache_hits"] += 1
+            return cached
+        thread_id, checkpoint_ns, channel, _ = key
+        pending = []
+        while key not in self.values_cache and self.chain[key].base is not None:
+            pending.append(key)
+            key = (thread_id, checkpoint_ns, channel, self.chain[key].base)
+        value = self.values_cache.get(key)
+        if value is None:
+            value = self.serde.loads_typed(self.blobs[key])
+            self._cache(key, value)
+        for key in reversed(pending):
+            entry = self.chain[key]
+            value = value[: entry.prefix] + self.serde.loads_typed(self.blobs[key])
+            self._cache(key, value)
+            self.stats["reconstructed"] += 1
+        return value
+
+    def _store_list(self, key: BlobKey, value: List[Any]) -> None:
+        thread_id, checkpoint_ns, channel, version = key
+        head = self.heads.get((thread_id, checkpoint_ns, channel))
+        base_key = (thread_id, checkpoint_ns, channel, head)
+        base_entry = self.chain.get(base_key)
+        entry = ChainEntry(None, 0, len(value), 0)
+        base_value: List[Any] = []
+        if base_entry is not None and base_entry.depth + 1 < self.snapshot_interval:
+            base_value = self._materialize(base_key)
+            prefix = _common_prefix(base_value, value)
+            # A delta that drops most of its base is no smaller than a snapshot.
+            if prefix and prefix * 2 >= base_entry.length:
+                entry = ChainEntry(head, prefix, len(value), base_entry.depth + 1)
+        self.blobs[key] = self.serde.dumps_typed(value[entry.prefix :])
+        self.chain[key] = entry
+        self.heads[(thread_id, checkpoint_ns, channel)] = version
+        self.stats["snapshots" if entry.base is None else "deltas"] += 1
+        tail = copy.deepcopy(value[entry.prefix :])
+        self._cache(key, base_value[: entry.prefix] + tail)
+
+    def _load_blobs(
+        self, thread_id: str, checkpoint_ns: str, versions: ChannelVersions
+    ) -> Dict[str, Any]:
+        channel_values: Dict[str, Any] = {}
+        for k, v in versions.items():
+            key = (thread_id, checkpoint_ns, k, v)
+            if key in self.chain:
+                channel_values[k] = copy.deepcopy(self._materialize(key))
+            elif key in self.blobs:
+                blob = self.blobs[key]
+                if blob[0] != "empty":
+                    channel_values[k] = self.serde.loads_typed(blob)
+        return channel_values
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        c = checkpoint.copy()
+        c.pop("pending_sends", None)  # type: ignore[misc]  # Not in newer checkpoint formats
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        values: Dict[str, Any] = c.pop("channel_values")  # type: ignore[misc]
+        for k, v in new_versions.items():
+            key = (thread_id, checkpoint_ns, k, v)
+            if isinstance(values.get(k), list):
+                self._store_list(key, values[k])
+            else:
+                self.blobs[key] = (
+                    self.serde.dumps_typed(values[k]) if k in values else ("empty", b"")
+                )
+        self.storage[thread_id][checkpoint_ns].update(
+            {
+                checkpoint["id"]: (
+                    self.serde.dumps_typed(c),
+                    self.serde.dumps_typed(get_checkpoint_metadata(config, metadata)),
+                    config["configurable"].get("checkpoint_id"),  # parent
+                )
+            }
+        )
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def delete_thread(self, thread_id: str) -> None:
+        """
+        Deletes the checkpoints, pending writes and stored values of a thread.
+
+        Args:
+            thread_id: Conversation thread
+        """
+        self.storage.pop(thread_id, None)
+        for container in (self.writes, self.blobs, self.chain, self.values_cache, self.heads):
+            for key in [key for key in container if key[0] == thread_id]:
+                del container[key]
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        self.delete_thread(thread_id)
+
+    def history(self, thread_id: str, checkpoint_ns: str = "") -> List[Dict[str, Any]]:
+        """
+        Lists the checkpoints of a thread, oldest first, without loading state.
+
+        Args:
+            thread_id: Conversation thread
+            checkpoint_ns: Checkpoint namespace; "" is the top-level graph
+
+        Returns:
+            list: One dict per checkpoint with its id, parent id, step, source,
+            the nodes whose writes produced it and the number of messages
+        """
+        steps = []
+        for checkpoint_id, (checkpoint, metadata, parent_id) in sorted(
+            self.storage.get(thread_id, {}).get(checkpoint_ns, {}).items()
+        ):
+            metadata = self.serde.loads_typed(metadata)
+            versions = self.serde.loads_typed(checkpoint).get("channel_versions", {})
+            entry = self.chain.get(
+                (thread_id, checkpoint_ns, "messages", versions.get("messages"))
+            )
+            writes = metadata.get("writes") or {}
+            steps.append(
+                {
+                    "checkpoint_id": checkpoint_id,
+                    "parent_id": parent_id,
+                    "step": metadata.get("step"),
+                    "source": metadata.get("source"),
+                    "nodes": list(writes) if isinstance(writes, dict) else [],
+                    "messages": entry.length if entry is not None else 0,
+                }
+            )
+        return steps
+
+    def load_state(
+        self, thread_id: str, checkpoint_id: str, checkpoint_ns: str = ""
+    ) -> Tuple[Dict[str, Any], float]:
+        """
+        Reconstructs the channel values of one checkpoint.
+
+        Args:
+            thread_id: Conversation thread
+            checkpoint_id: Checkpoint to load
+            checkpoint_ns: Checkpoint namespace
+
+        Returns:
+            tuple: Channel values and the time the reconstruction took, in seconds
+
+        Raises:
+            KeyError: If the checkpoint does not exist
+        """
+        started = time.perf_counter()
+        saved = self.storage.get(thread_id, {}).get(checkpoint_ns, {}).get(checkpoint_id)
+        if saved is None:
+            raise KeyError(f"Checkpoint not found: {checkpoint_id}")
+        checkpoint = self.serde.loads_typed(saved[0])
+        values = self._load_blobs(thread_id, checkpoint_ns, checkpoint["channel_versions"])
+        return values, time.perf_counter() - started
+
+    def get_stats(self) -> Dict[str, Any]:
+        stored = sum(len(blob[1]) for blob in self.blobs.values())
+        return {**self.stats, "cached_values": len(self.values_cache), "blob_bytes": stored}
@@ -0,0 +1,230 @@
+"""
+Recording and replay of agent event streams.
+
+A recording is an append-only JSON Lines file. Each run starts with a header
+line giving the stream mode, followed by one line per item yielded by
+``graph.astream``: its offset in seconds from the start of the run and the
+item serialized with LangChain's ``dumpd``. Several runs can be appended to
+the same file.
+
+``RecordingGraph`` wraps a compiled graph and writes everything it streams.
+``ReplayGraph`` reads a run back and yields the same items, at the original
+pace or as fast as possible, so ``astream_graph`` and ``ainvoke_graph`` render
+a replay through the same callbacks and printers as a live run, with no model
+or tool calls.
+
+Usage:
+    python event_log.py list events.jsonl
+    python event_log.py replay events.jsonl --run -1 --speed 0
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+import warnings
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from langchain_core.load import dumpd, load
+
+FORMAT_VERSION = 1
+
+warnings.filterwarnings("ignore", message="The function `load` is in beta")
+
+_write_lock = threading.Lock()
+
+
+def _revive(value: Any) -> Any:
+    """Replaces values dumpd could not serialize by their repr string."""
+    if isinstance(value, dict):
+        if value.get("lc") == 1 and value.get("type") == "not_implemented":
+            return value.get("repr")
+        return {k: _revive(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_revive(v) for v in value]
+    return value
+
+
+def encode_item(item: Any) -> Any:
+    """Serializes a streamed item, keeping tuples distinguishable from lists."""
+    if isinstance(item, tuple):
+        return {"__tuple__": [encode_item(v) for v in item]}
+    return dumpd(item)
+
+
+def decode_item(data: Any) -> Any:
+    if isinstance(data, dict) and "__tuple__" in data:
+        return tuple(decode_item(v) for v in data["__tuple__"])
+    return load(_revive(data))
+
+
+def _append(path: str, lines: List[Dict[str, Any]]) -> None:
+    text = "".join(
+        json.dumps(line, ensure_ascii=False, separators=(",", ":"), default=str) + "\n"
+        for line in lines
+    )
+    with _write_lock:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(text)
+
+
+class RecordingGraph:
+    """
+    Graph wrapper that appends every streamed item to a recording file.
+
+    Items are buffered per run and written with a single append when the
+    stream ends, so recording adds no file I/O between events.
+    """
+
+    def __init__(self, graph: Any, path: str):
+        self.graph = graph
+        self.path = path
+
+    async def astream(self, inputs: Any, config: Any = None, **kwargs: Any) -> AsyncIterator[Any]:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        header = {
+            "version": FORMAT_VERSION,
+            "run": uuid.uuid4().hex[:12],
+            "created": time.time(),
+            "stream_mode": kwargs.get("stream_mode", "values"),
+            "subgraphs": kwargs.get("subgraphs", False),
+        }
+        lines = [header]
+        started = time.perf_counter()
+        try:
+            async for item in self.graph.astream(inputs, config, **kwargs):
+                lines.append(
+                    {"t": round(time.perf_counter() - started, 6), "item": encode_item(item)}
+                )
+                yield item
+        except GeneratorExit:
+            raise
+        except BaseException as e:
+            lines.append(
+                {"t": round(time.perf_counter() - started, 6), "error": repr(e)}
+            )
+            raise
+        finally:
+            header["duration"] = round(time.perf_counter() - started, 6)
+            header["events"] = len(lines) - 1
+            _append(self.path, lines)
+
+
+def read_runs(path: str) -> List[Dict[str, Any]]:
+    """
+    Reads all runs of a recording file.
+
+    Args:
+        path: Recording file
+
+    Returns:
+        list: Runs, each a header dict with an added "lines" list of recorded events
+    """
+    runs: List[Dict[str, Any]] = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            data = json.loads(line)
+            if "version" in data:
+                runs.append({**data, "lines": []})
+            elif runs:
+                runs[-1]["lines"].append(data)
+    return runs
+
+
+class ReplayGraph:
+    """
+    Stand-in for a compiled graph that streams a recorded run.
+
+    Args:
+        path: Recording file
+        run: Index of the run to replay; negative values count from the end
+        speed: Playback speed relative to the recording. 1.0 keeps the
+            original timing, None or 0 replays as fast as possible
+    """
+
+    def __init__(self, path: str, run: int = -1, speed: Optional[float] = 1.0):
+        runs = read_runs(path)
+        if not runs:
+            raise ValueError(f"No recorded runs in {path}")
+        self.header = runs[run]
+        self.speed = speed
+
+    async def astream(self, inputs: Any = None, config: Any = None, **kwargs: Any) -> AsyncIterator[Any]:
+        stream_mode = kwargs.get("stream_mode", "values")
+        if stream_mode != self.header["stream_mode"] or bool(
+            kwargs.get("subgraphs", False)
+        ) != bool(self.header["subgraphs"]):
+            raise ValueError(
+                f"The run was recorded with stream_mode={self.header['stream_mode']!r} "
+                f"and subgraphs={self.header['subgraphs']}, not with "
+                f"stream_mode={stream_mode!r} and subgraphs={kwargs.get('subgraphs', False)}."
+            )
+        started = time.perf_counter()
+        for line in self.header["lines"]:
+            if self.speed:
+                delay = line["t"] / self.speed - (time.perf_counter() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            if "error" in line:
+                raise RuntimeError(f"Recorded run failed: {line['error']}")
+            yield decode_item(line["item"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and replay agent event recordings.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    list_parser = subparsers.add_parser("list", help="list the runs in a recording")
+    list_parser.add_argument("path")
+    replay = subparsers.add_parser("replay", help="replay a run through the console printers")
+    replay.add_argument("path")
+    replay.add_argument("--run", type=int, default=-1)
+    replay.add_argument(
+        "--speed", type=float, default=1.0, help="1 = original pace, 0 = as fast as possible"
+    )
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for i, run in enumerate(read_runs(args.path)):
+            print(
+                f"{i:>3}  {run['run']}  {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(run['created']))}"
+                f"  {'+'.join(run['stream_mode']) if isinstance(run['stream_mode'], list) else run['stream_mode']:<16}"
+                f" {run.get('events', len(run['lines'])):>6} events"
+                f"  {run.get('duration', 0.0):8.2f}s"
+            )
+        return
+
+    from utils import ainvoke_graph, astream_graph
+
+    graph = ReplayGraph(args.path, args.run, args.speed)
+    started = time.perf_counter()
+    if isinstance(graph.header["stream_mode"], list):
+        asyncio.run(
+            astream_graph(
+                graph,
+                {},
+                stream_mode=graph.header["stream_mode"],
+                include_subgraphs=graph.header["subgraphs"],
+            )
+        )
+    elif graph.header["stream_mode"] == "messages":
+        asyncio.run(astream_graph(graph, {}, stream_mode="messages"))
+    elif graph.header["subgraphs"]:
+        asyncio.run(ainvoke_graph(graph, {}, include_subgraphs=True))
+    else:
+        asyncio.run(astream_graph(graph, {}, stream_mode="updates"))
+    elapsed = time.perf_counter() - started
+    print(
+        f"\n\nreplayed {len(graph.header['lines'])} events in {elapsed:.3f}s "
+        f"(recorded {graph.header.get('duration', 0.0):.3f}s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
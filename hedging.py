@@ -0,0 +1,382 @@
+"""
+Hedged model requests.
+
+A session is bound to one model, and a slow provider stalls the whole turn.
+``HedgedChatModel`` sends each request to the primary model and, if no output
+has arrived after a threshold, sends the same request to a fallback model.
+Whichever stream produces output first is used and the other request is
+cancelled. A primary request that fails before producing output is handed to
+the fallback at once.
+
+The threshold is the MODEL_HEDGE_PERCENTILE percentile of the primary
+model's recent times to first output (the last MODEL_HEDGE_WINDOW requests,
+process-wide), but never below MODEL_HEDGE_MIN_DELAY. Until
+MODEL_HEDGE_MIN_SAMPLES have been observed, MODEL_HEDGE_INITIAL_DELAY is
+used. With the default 95th percentile about one request in twenty is
+hedged, so the fallback provider sees about 5% extra traffic.
+
+The latency a fallback win saved is only known if the primary's first output
+is seen. A MODEL_HEDGE_SAMPLE_RATE fraction of the losing primaries is
+therefore kept running while the fallback's response streams (input tokens
+are billed either way), and the mean saving of these samples is extrapolated
+to all fallback wins. A sampled primary is cancelled when the response ends,
+so no request outlives the call that made it; one that is still silent then
+is counted at the time it was cancelled, which makes the estimate a lower
+bound.
+
+Synchronous calls are sent to the primary model without hedging.
+
+Prompt caching breakpoints are not added to hedged requests, since the two
+models may be from different providers.
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.language_models.chat_models import BaseChatModel, agenerate_from_stream
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from langchain_core.runnables import Runnable
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+HEDGE_PERCENTILE = float(os.environ.get("MODEL_HEDGE_PERCENTILE", "95"))
+HEDGE_WINDOW = int(os.environ.get("MODEL_HEDGE_WINDOW", "200"))
+HEDGE_MIN_SAMPLES = int(os.environ.get("MODEL_HEDGE_MIN_SAMPLES", "20"))
+HEDGE_INITIAL_DELAY = float(os.environ.get("MODEL_HEDGE_INITIAL_DELAY", "3.0"))
+HEDGE_MIN_DELAY = float(os.environ.get("MODEL_HEDGE_MIN_DELAY", "0.25"))
+HEDGE_SAMPLE_RATE = float(os.environ.get("MODEL_HEDGE_SAMPLE_RATE", "0.1"))
+
+OUTCOME_COUNTERS = {
+    "primary": "primary_wins",
+    "fallback": "fallback_wins",
+    "failover": "failovers",
+    "failed": "failed",
+}
+
+
+def _model_name(model: BaseChatModel) -> str:
+    return getattr(model, "model", None) or getattr(model, "model_name", None) or type(model).__name__
+
+
+def _has_output(chunk: ChatGenerationChunk) -> bool:
+    message = chunk.message
+    return bool(message.content or getattr(message, "tool_call_chunks", None))
+
+
+class HedgeTracker:
+    """
+    Times to first output of one primary model and the outcome of its
+    hedged requests.
+
+    A primary that was cancelled is recorded at the threshold it exceeded, a
+    lower bound of its time to first output, so that cancelling slow requests
+    does not pull the threshold down. Recording the time the fallback won
+    instead would push the threshold up with every hedge.
+    """
+
+    def __init__(
+        self,
+        percentile: float = HEDGE_PERCENTILE,
+        window: int = HEDGE_WINDOW,
+        min_samples: int = HEDGE_MIN_SAMPLES,
+        initial_delay: float = HEDGE_INITIAL_DELAY,
+        min_delay: float = HEDGE_MIN_DELAY,
+        sample_rate: float = HEDGE_SAMPLE_RATE,
+    ):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.sample_rate = sample_rate
+        self.samples: deque = deque(maxlen=window)
+        self.stats = {
+            "requests": 0,
+            "hedged": 0,
+            "primary_wins": 0,
+            "fallback_wins": 0,
+            "failovers": 0,
+            "failed": 0,
+            "sampled_wins": 0,
+            "sampled_seconds_saved": 0.0,
+        }
+        self._lock = threading.Lock()
+
+    def threshold(self) -> float:
+        with self._lock:
+            if len(self.samples) < self.min_samples:
+                return self.initial_delay
+            value = float(np.percentile(self.samples, self.percentile))
+        return max(value, self.min_delay)
+
+    def record(
+        self,
+        outcome: str,
+        first_output: Optional[float],
+        hedged: bool,
+        primary_first_output: Optional[float] = None,
+    ) -> None:
+        """
+        Records one request.
+
+        Args:
+            outcome: "primary", "fallback", "failover" or "failed"
+            first_output: Seconds until the winning stream produced output
+            hedged: Whether the fallback was started
+            primary_first_output: Seconds until the primary produced output,
+                the threshold it exceeded if it was cancelled, or None if it
+                is being followed to its first output
+        """
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["hedged"] += hedged
+            self.stats[OUTCOME_COUNTERS[outcome]] += 1
+            if primary_first_output is not None:
+                self.samples.append(primary_first_output)
+
+    def record_sample(self, primary_first_output: float, fallback_first_output: float) -> None:
+        """
+        Records a primary that was followed after a fallback win.
+
+        Args:
+            primary_first_output: Seconds until the primary produced output,
+                or until it was cancelled if it had not
+            fallback_first_output: Seconds until the fallback produced output
+        """
+        with self._lock:
+            self.samples.append(primary_first_output)
+            self.stats["sampled_wins"] += 1
+            self.stats["sampled_seconds_saved"] += primary_first_output - fallback_first_output
+
+    def get_stats(self) -> Dict[str, Any]:
+        threshold = self.threshold()
+        with self._lock:
+            stats = dict(self.stats)
+            samples = list(self.samples)
+        requests = stats["requests"]
+        sampled = stats.pop("sampled_wins")
+        sampled_saved = stats.pop("sampled_seconds_saved")
+        saved_per_win = sampled_saved / sampled if sampled else None
+        p50, p95 = np.percentile(samples, [50, 95]) if samples else (None, None)
+        return {
+            **stats,
+            "hedge_rate": stats["hedged"] / requests if requests else 0.0,
+            "sampled_fallback_wins": sampled,
+            "seconds_saved_per_fallback_win": (
+                round(saved_per_win, 3) if saved_per_win is not None else None
+            ),
+            "seconds_saved": (
+                round(saved_per_win * stats["fallback_wins"], 3)
+                if saved_per_win is not None
+                else None
+            ),
+            "threshold_seconds": round(threshold, 3),
+            "primary_first_output_p50": round(float(p50), 3) if samples else None,
+            "primary_first_output_p95": round(float(p95), 3) if samples else None,
+        }
+
+
+_lock = threading.Lock()
+_trackers: Dict[str, HedgeTracker] = {}
+
+
+def get_tracker(primary: str) -> HedgeTracker:
+    """Returns the process-wide tracker of a primary model, creating it on first use."""
+    with _lock:
+        tracker = _trackers.get(primary)
+        if tracker is None:
+            tracker = _trackers[primary] = HedgeTracker()
+        return tracker
+
+
+def configure(primary: str, **settings: Any) -> HedgeTracker:
+    """Replaces the tracker of a primary model by one with the given settings."""
+    tracker = HedgeTracker(**settings)
+    with _lock:
+        _trackers[primary] = tracker
+    return tracker
+
+
+def get_hedge_stats() -> Dict[str, Any]:
+    """
+    Returns the hedging counters of every primary model.
+
+    Returns:
+        dict: Per primary model: requests, hedge rate, wins per model,
+        current threshold, first output percentiles and the estimated
+        seconds saved
+    """
+    with _lock:
+        trackers = dict(_trackers)
+    return {name: tracker.get_stats() for name, tracker in trackers.items()}
+
+
+class _Attempt:
+    """One model's stream, read up to its first output chunk."""
+
+    def __init__(self, model: BaseChatModel, messages, stop, kwargs, started: float):
+        self.stream = model._astream(messages, stop=stop, **kwargs)
+        self.started = started
+        self.buffered: List[ChatGenerationChunk] = []
+        self.first_output: Optional[float] = None
+        self.task = asyncio.ensure_future(self._read_to_first_output())
+
+    async def _read_to_first_output(self) -> None:
+        async for chunk in self.stream:
+            self.buffered.append(chunk)
+            if _has_output(chunk):
+                self.first_output = time.monotonic() - self.started
+                return
+        # A stream without output chunks is complete as it is.
+        self.first_output = time.monotonic() - self.started
+
+    @property
+    def succeeded(self) -> bool:
+        return self.task.done() and not self.task.cancelled() and self.task.exception() is None
+
+    async def cancel(self) -> None:
+        self.task.cancel()
+        await asyncio.gather(self.task, return_exceptions=True)
+        try:
+            await self.stream.aclose()
+        except Exception:
+            pass
+
+    async def rest(self) -> AsyncIterator[ChatGenerationChunk]:
+        for chunk in self.buffered:
+            yield chunk
+        async for chunk in self.stream:
+            yield chunk
+
+
+class HedgedChatModel(BaseChatModel):
+    """
+    Chat model that hedges slow requests of ``primary`` with ``fallback``.
+
+    Tools are bound in a provider-neutral format and converted for each model
+    when a request is sent, so the two models may be from different
+    providers. Both are called through their own stream implementation, which
+    keeps their admission control and connection pools in effect.
+    """
+
+    primary: BaseChatModel
+    fallback: BaseChatModel
+
+    @property
+    def _llm_type(self) -> str:
+        return "hedged"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {
+            "primary": {"type": type(self.primary).__name__, **self.primary._identifying_params},
+            "fallback": {"type": type(self.fallback).__name__, **self.fallback._identifying_params},
+        }
+
+    @property
+    def tracker(self) -> HedgeTracker:
+        return get_tracker(_model_name(self.primary))
+
+    def bind_tools(self, tools, *, tool_choice=None, **kwargs: Any) -> Runnable:
+        if tool_choice is not None:
+            kwargs["tool_choice"] = tool_choice
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+    @staticmethod
+    def _request_kwargs(model: BaseChatModel, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        kwargs = dict(kwargs)
+        tools = kwargs.pop("tools", None)
+        if tools is None:
+            return kwargs
+        tool_choice = kwargs.pop("tool_choice", None)
+        bound = model.bind_tools(tools, **({"tool_choice": tool_choice} if tool_choice else {}))
+        return {**bound.kwargs, **kwargs}
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        return self.primary._generate(
+            messages, stop=stop, run_manager=run_manager, **self._request_kwargs(self.primary, kwargs)
+        )
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        return self.primary._stream(
+            messages, stop=stop, run_manager=run_manager, **self._request_kwargs(self.primary, kwargs)
+        )
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        return await agenerate_from_stream(self._astream(messages, stop=stop, **kwargs))
+
+    async def _race(
+        self, messages: List[BaseMessage], stop: Optional[List[str]], kwargs: Dict[str, Any]
+    ) -> Tuple[_Attempt, List[_Attempt], Optional[_Attempt]]:
+        tracker = self.tracker
+        started = time.monotonic()
+        primary = _Attempt(
+            self.primary, messages, stop, self._request_kwargs(self.primary, kwargs), started
+        )
+        attempts = [primary]
+        try:
+            delay = tracker.threshold()
+            await asyncio.wait({primary.task}, timeout=delay)
+            if primary.succeeded:
+                tracker.record("primary", primary.first_output, False, primary.first_output)
+                return primary, [], None
+
+            fallback = _Attempt(
+                self.fallback, messages, stop, self._request_kwargs(self.fallback, kwargs), started
+            )
+            attempts.append(fallback)
+            pending = {primary.task, fallback.task}
+            while pending:
+                _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((a for a in attempts if a.succeeded), None)
+                if winner is not None:
+                    break
+            if winner is None:
+                tracker.record("failed", None, True)
+                primary.task.result()  # Raises the primary's error
+            losers = [a for a in attempts if a is not winner]
+            followed = None
+            if winner is primary:
+                tracker.record("primary", primary.first_output, True, primary.first_output)
+            elif primary.task.done():
+                # The primary failed before producing output.
+                tracker.record("failover", fallback.first_output, True)
+            elif random.random() < tracker.sample_rate:
+                tracker.record("fallback", fallback.first_output, True)
+                losers.remove(primary)
+                followed = primary
+            else:
+                tracker.record("fallback", fallback.first_output, True, delay)
+            return winner, losers, followed
+        except BaseException:
+            for attempt in attempts:
+                await attempt.cancel()
+            raise
+
+    async def _astream(
+        self, messages, stop=None, run_manager=None, **kwargs
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        winner, losers, followed = await self._race(messages, stop, kwargs)
+        for loser in losers:
+            await loser.cancel()
+        try:
+            async for chunk in winner.rest():
+                yield chunk
+        finally:
+            await winner.stream.aclose()
+            if followed is not None:
+                await self._end_sample(followed, winner)
+
+    async def _end_sample(self, primary: _Attempt, fallback: _Attempt) -> None:
+        # The sampled primary ran alongside the fallback's response; record
+        # what it reached by now and cancel it.
+        if primary.succeeded:
+            self.tracker.record_sample(primary.first_output, fallback.first_output)
+        elif not primary.task.done():
+            self.tracker.record_sample(time.monotonic() - primary.started, fallback.first_output)
+        await primary.cancel()
@@ -0,0 +1,290 @@
+import asyncio
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from langchain_core.tools import BaseTool
+from langchain_mcp_adapters.client import MultiServerMCPClient
+
+
+def canonical_entry(entry: Dict[str, Any]) -> str:
+    return json.dumps(entry, sort_keys=True, ensure_ascii=False)
+
+
+def diff_config(
+    running: Dict[str, Dict[str, Any]], target: Dict[str, Dict[str, Any]]
+) -> Dict[str, List[str]]:
+    """
+    Compares two MCP configurations server by server.
+
+    Args:
+        running: Configuration of the currently connected servers
+        target: Configuration to apply
+
+    Returns:
+        dict: Server names grouped into "added", "removed", "modified" and "unchanged"
+    """
+    result = {"added": [], "removed": [], "modified": [], "unchanged": []}
+    for name, entry in target.items():
+        if name not in running:
+            result["added"].append(name)
+        elif canonical_entry(running[name]) != canonical_entry(entry):
+            result["modified"].append(name)
+        else:
+            result["unchanged"].append(name)
+    result["removed"] = [name for name in running if name not in target]
+    return result
+
+
+def child_pids(parent: Optional[int] = None) -> List[int]:
+    """
+    Returns the ids of the direct child processes of a process.
+
+    Reads /proc, so it returns an empty list on platforms without it.
+
+    Args:
+        parent: Parent process id. Defaults to the current process
+
+    Returns:
+        list: Child process ids
+    """
+    parent = os.getpid() if parent is None else parent
+    pids = []
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return pids
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", encoding="utf-8") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # The command name may contain spaces, so fields are counted after it.
+        if int(stat.rsplit(")", 1)[1].split()[1]) == parent:
+            pids.append(int(entry))
+    return pids
+
+
+def process_tree_rss(pid: int) -> int:
+    """
+    Returns the resident memory of a process and its descendants in bytes.
+
+    Args:
+        pid: Root process id
+
+    Returns:
+        int: Total resident set size, or 0 if it cannot be read
+    """
+    total = 0
+    try:
+        with open(f"/proc/{pid}/statm", encoding="utf-8") as f:
+            total = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return 0
+    return total + sum(process_tree_rss(child) for child in child_pids(pid))
+
+
+def _command_line(pid: int) -> str:
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            return f.read().replace(b"\0", b" ").decode("utf-8", "replace")
+    except OSError:
+        return ""
+
+
+class ServerConnection:
+    """
+    Connection to a single MCP server, owned by a dedicated background task.
+
+    The stdio and SSE transports are anyio contexts that must be exited by the
+    task that entered them, in reverse order of entry. Running each server in
+    its own task lets servers be stopped individually and from any caller.
+    """
+
+    def __init__(self, name: str, entry: Dict[str, Any]):
+        self.name = name
+        self.entry = entry
+        self.client: Optional[MultiServerMCPClient] = None
+        self._ready = asyncio.Event()
+        self._stop = asyncio.Event()
+        self._error: Optional[BaseException] = None
+        self._task: Optional[asyncio.Task] = None
+        self.pids: List[int] = []
+
+    async def _run(self) -> None:
+        try:
+            async with MultiServerMCPClient({self.name: self.entry}) as client:
+                self.client = client
+                self._ready.set()
+                await self._stop.wait()
+        except Exception as e:
+            self._error = e
+        finally:
+            self.client = None
+            self._ready.set()
+
+    async def start(self) -> None:
+        before = set(child_pids())
+        self._task = asyncio.create_task(self._run())
+        await self._ready.wait()
+        if self._error is not None:
+            raise self._error
+        if self.entry.get("transport", "stdio") == "stdio":
+            # Servers of other sessions may start at the same time, so new
+            # children are only attributed if their command line matches.
+            args = [str(arg) for arg in self.entry.get("args", [])]
+            self.pids = [
+                pid
+                for pid in set(child_pids()) - before
+                if all(arg in _command_line(pid) for arg in args)
+            ]
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            await self._task
+        if self._error is not None:
+            raise self._error
+
+    def get_tools(self) -> List[BaseTool]:
+        return self.client.get_tools() if self.client is not None else []
+
+
+class MCPConnectionSet:
+    """
+    MCP connections managed independently per server entry.
+
+    Each server runs as its own ServerConnection, so a single server can be
+    started or stopped without touching the others. ``apply`` reconciles the
+    running servers with a new configuration. With a warm pool, stdio
+    servers are leased from its spare processes instead of started here.
+    """
+
+    def __init__(self, pool=None):
+        self.configs: Dict[str, Dict[str, Any]] = {}
+        self.clients: Dict[str, ServerConnection] = {}
+        self.pool = pool
+
+    async def _start(self, name: str, entry: Dict[str, Any]) -> ServerConnection:
+        if self.pool is not None and self.pool.enabled and self.pool.pooled(entry):
+            connection = await self.pool.lease(name, entry)
+        else:
+            connection = ServerConnection(name, entry)
+            await connection.start()
+        self.clients[name] = connection
+        self.configs[name] = entry
+        return connection
+
+    async def _stop(self, name: str) -> None:
+        connection = self.clients.pop(name, None)
+        self.configs.pop(name, None)
+        if connection is not None:
+            await connection.stop()
+
+    async def apply(self, config: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Starts and stops servers so the running set matches ``config``.
+
+        Servers whose entry is unchanged keep their connection. A server that
+        fails to start is reported and left out; the others are unaffected.
+
+        Args:
+            config: MCP tool configuration to apply
+
+        Returns:
+            list: One report per server with the action taken, the time it took
+            in seconds, the number of tools and any error message
+        """
+        changes = diff_config(self.configs, config)
+        reports = []
+        stop_errors = {}
+
+        for name in changes["removed"] + changes["modified"]:
+            started = time.perf_counter()
+            error = None
+            try:
+                await self._stop(name)
+            except Exception as e:
+                error = str(e)
+                stop_errors[name] = error
+            if name in changes["removed"]:
+                reports.append(
+                    {
+                        "server": name,
+                        "action": "stopped",
+                        "seconds": time.perf_counter() - started,
+                        "tools": 0,
+                        "error": error,
+                    }
+                )
+
+        for name in changes["added"] + changes["modified"]:
+            started = time.perf_counter()
+            action = "started" if name in changes["added"] else "restarted"
+            tools = 0
+            error = stop_errors.get(name)
+            try:
+                connection = await self._start(name, config[name])
+                tools = len(connection.get_tools())
+            except Exception as e:
+                error = str(e)
+            reports.append(
+                {
+                    "server": name,
+                    "action": action,
+                    "seconds": time.perf_counter() - started,
+                    "tools": tools,
+                    "error": error,
+                }
+            )
+
+        for name in changes["unchanged"]:
+            reports.append(
+                {
+                    "server": name,
+                    "action": "unchanged",
+                    "seconds": 0.0,
+                    "tools": len(self.clients[name].get_tools()),
+                    "error": None,
+                }
+            )
+        return reports
+
+    def get_tools(self, server_name: Optional[str] = None) -> List[BaseTool]:
+        """
+        Returns the tools of all connected servers, or of a single server.
+
+        Args:
+            server_name: Server to return tools for. Returns all tools if None
+
+        Returns:
+            list: LangChain tools
+        """
+        if server_name is not None:
+            connection = self.clients.get(server_name)
+            return connection.get_tools() if connection is not None else []
+        tools: List[BaseTool] = []
+        for connection in self.clients.values():
+            tools.extend(connection.get_tools())
+        return tools
+
+    def processes(self) -> Dict[str, List[int]]:
+        """Returns the local server process ids of each stdio server."""
+        return {name: list(c.pids) for name, c in self.clients.items() if c.pids}
+
+    async def aclose(self) -> None:
+        for name in list(self.clients):
+            try:
+                await self._stop(name)
+            except Exception:
+                pass
+
+    async def __aenter__(self) -> "MCPConnectionSet":
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.aclose()
@@ -1,41 +1,43 @@
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import PyMuPDFLoader
-from langchain_community.vectorstores import FAISS
-from langchain_openai import OpenAIEmbeddings
 from mcp.server.fastmcp import FastMCP
 from dotenv import load_dotenv
-from typing import Any
+from typing import Any, Dict
+import os
+
+from rag_index import INDEX_ROOT, IndexReader, ResultSetCache, build_index, build_lock, parse_cursor
 
 load_dotenv(override=True)
 
+INDEX_SOURCES = ["data/sample.pdf"]
+MAX_RESULTS = 50
+# Maximal marginal relevance re-ranking of the FETCH_K nearest chunks.
+# MMR_LAMBDA = 1.0 ranks by relevance only; lower values favor diversity.
+USE_MMR = os.environ.get("RAG_USE_MMR", "true").lower() == "true"
+FETCH_K = int(os.environ.get("RAG_FETCH_K", "200"))
+MMR_LAMBDA = float(os.environ.get("RAG_MMR_LAMBDA", "0.5"))
 
-def create_retriever() -> Any:
-    """
-    Creates and returns a document retriever based on FAISS vector store.
+index_reader = IndexReader(INDEX_ROOT)
+result_sets = ResultSetCache()
 
-    This function performs the following steps:
-    1. Loads a PDF document(place your PDF file in the data folder)
-    2. Splits the document into manageable chunks
-    3. Creates embeddings for each chunk
-    4. Builds a FAISS vector store from the embeddings
-    5. Returns a retriever interface to the vector store
 
-    Returns:
-        Any: A retriever object that can be used to query the document database
+def get_index_reader() -> IndexReader:
     """
+    Returns the reader of the shared, memory-mapped document index.
 
-    loader = PyMuPDFLoader("data/sample.pdf")
-    docs = loader.load()
-    
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=50)
-    split_documents = text_splitter.split_documents(docs)
-
-    embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
-
-    vectorstore = FAISS.from_documents(documents=split_documents, embedding=embeddings)
+    The index is built once from the PDF files in INDEX_SOURCES (place your PDF
+    file in the data folder) and stored on disk. Every retriever process maps
+    the same files, so concurrent sessions share one copy of the vectors and
+    chunk text in memory. Rebuild it with 'python rag_index.py build <pdf>';
+    running servers switch to the new version on their next query. Servers
+    that start without an index wait on a file lock so that only one builds it.
 
-    retriever = vectorstore.as_retriever()
-    return retriever
+    Returns:
+        IndexReader: Reader for the active index version
+    """
+    if index_reader._current_version() is None:
+        with build_lock(INDEX_ROOT):
+            if index_reader._current_version() is None:
+                build_index(INDEX_SOURCES, INDEX_ROOT)
+    return index_reader
 
 
 mcp = FastMCP(
@@ -47,25 +49,57 @@ mcp = FastMCP(
 
 
 @mcp.tool()
-async def retrieve(query: str) -> str:
+async def retrieve(query: str, page_size: int = 4) -> Dict[str, Any]:
     """
     Retrieves information from the document database based on the query.
 
-    This function creates a retriever, queries it with the provided input,
-    and returns the concatenated content of all retrieved documents.
+    This function searches the document index with the provided input and
+    returns the best matching chunks with their source file, page and score.
+    Near-duplicate passages are filtered out by diversity re-ranking. Up to
+    50 hits are ranked at once; use retrieve_next with the returned cursor to
+    read further pages instead of searching again.
 
     Args:
         query (str): The search query to find relevant information
+        page_size (int, optional): Number of hits per page, at least 1. Defaults to 4.
+
+    Returns:
+        dict: The query, the hits of the first page (chunk_id, source, page,
+            score, text), the total number of hits and next_cursor
+    """
+
+    reader = get_index_reader()
+    index = reader.index()
+    query_vector = await reader.aembed_query(query)
+    if USE_MMR:
+        ids, scores = index.top_k_mmr(
+            query_vector, MAX_RESULTS, fetch_k=FETCH_K, lambda_mult=MMR_LAMBDA
+        )
+    else:
+        ids, scores = index.top_k(query_vector, MAX_RESULTS)
+    token = result_sets.put(index, query, ids, scores)
+
+    return result_sets.page(token, 0, page_size)
+
+
+@mcp.tool()
+async def retrieve_next(cursor: str, page_size: int = 4) -> Dict[str, Any]:
+    """
+    Returns the next page of hits of an earlier retrieve call.
+
+    This is a lookup in the cached result set; no new search is run.
+
+    Args:
+        cursor (str): The next_cursor value returned by retrieve or retrieve_next
+        page_size (int, optional): Number of hits per page, at least 1. Defaults to 4.
 
     Returns:
-        str: Concatenated text content from all retrieved documents
+        dict: Same structure as retrieve, for the requested page
     """
-    
-    retriever = create_retriever()
 
-    retrieved_docs = retriever.invoke(query)
+    token, offset = parse_cursor(cursor)
 
-    return "\n".join([doc.page_content for doc in retrieved_docs])
+    return result_sets.page(token, offset, page_size)
 
 
 if __name__ == "__main__":
@@ -1,3 +1,6 @@
+import argparse
+import os
+
 from mcp.server.fastmcp import FastMCP
 
 mcp = FastMCP(
@@ -26,5 +29,29 @@ async def get_weather(location: str) -> str:
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Remote MCP weather server")
+    parser.add_argument(
+        "--transport",
+        choices=["sse", "streamable-http"],
+        default=os.environ.get("MCP_TRANSPORT", "sse"),
+        help="Transport to serve. Multi-worker mode requires streamable-http.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.environ.get("MCP_WORKERS", "1")),
+        help="Number of worker processes sharing the port (streamable-http only).",
+    )
+    parser.add_argument("--port", type=int, default=mcp.settings.port)
+    args = parser.parse_args()
+
     print("mcp remote server is running...")
-    mcp.run(transport="sse")
+    if args.transport == "sse":
+        if args.workers > 1:
+            parser.error("--workers > 1 requires --transport streamable-http")
+        mcp.settings.port = args.port
+        mcp.run(transport="sse")
+    else:
+        from mcp_workers import serve
+
+        serve(mcp, workers=args.workers, port=args.port)
@@ -1,15 +1,213 @@
 from mcp.server.fastmcp import FastMCP
-from datetime import datetime
+from datetime import datetime, tzinfo
+import difflib
+import re
 import pytz
-from typing import Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 mcp = FastMCP(
     "TimeService",
-    instructions="You are a time assistant that can provide the current time for different timezones.", 
+    instructions="You are a time assistant that can provide the current time for different timezones.",
     host="0.0.0.0",
     port=8005,
 )
 
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S %Z"
+
+# Abbreviations and city names that are not the last part of an IANA name.
+# Ambiguous abbreviations resolve to their most common use (CST: US Central,
+# IST: India, BST: British Summer Time).
+EXTRA_ALIASES = {
+    "utc": "UTC",
+    "gmt": "Etc/GMT",
+    "z": "UTC",
+    "kst": "Asia/Seoul",
+    "jst": "Asia/Tokyo",
+    "cst": "America/Chicago",
+    "cdt": "America/Chicago",
+    "est": "America/New_York",
+    "edt": "America/New_York",
+    "mst": "America/Denver",
+    "mdt": "America/Denver",
+    "pst": "America/Los_Angeles",
+    "pdt": "America/Los_Angeles",
+    "akst": "America/Anchorage",
+    "hst": "Pacific/Honolulu",
+    "bst": "Europe/London",
+    "wet": "Europe/Lisbon",
+    "cet": "Europe/Paris",
+    "cest": "Europe/Paris",
+    "eet": "Europe/Athens",
+    "msk": "Europe/Moscow",
+    "ist": "Asia/Kolkata",
+    "pkt": "Asia/Karachi",
+    "ict": "Asia/Bangkok",
+    "wib": "Asia/Jakarta",
+    "sgt": "Asia/Singapore",
+    "hkt": "Asia/Hong_Kong",
+    "pht": "Asia/Manila",
+    "aest": "Australia/Sydney",
+    "aedt": "Australia/Sydney",
+    "acst": "Australia/Adelaide",
+    "awst": "Australia/Perth",
+    "nzst": "Pacific/Auckland",
+    "nzdt": "Pacific/Auckland",
+    "brt": "America/Sao_Paulo",
+    "art": "America/Argentina/Buenos_Aires",
+    "sast": "Africa/Johannesburg",
+    "cat": "Africa/Maputo",
+    "eat": "Africa/Nairobi",
+    "wat": "Africa/Lagos",
+    "beijing": "Asia/Shanghai",
+    "china": "Asia/Shanghai",
+    "delhi": "Asia/Kolkata",
+    "new delhi": "Asia/Kolkata",
+    "mumbai": "Asia/Kolkata",
+    "bangalore": "Asia/Kolkata",
+    "india": "Asia/Kolkata",
+    "korea": "Asia/Seoul",
+    "south korea": "Asia/Seoul",
+    "busan": "Asia/Seoul",
+    "osaka": "Asia/Tokyo",
+    "kyoto": "Asia/Tokyo",
+    "hanoi": "Asia/Bangkok",
+    "san francisco": "America/Los_Angeles",
+    "seattle": "America/Los_Angeles",
+    "silicon valley": "America/Los_Angeles",
+    "washington": "America/New_York",
+    "washington dc": "America/New_York",
+    "boston": "America/New_York",
+    "miami": "America/New_York",
+    "atlanta": "America/New_York",
+    "dallas": "America/Chicago",
+    "houston": "America/Chicago",
+    "austin": "America/Chicago",
+    "las vegas": "America/Los_Angeles",
+    "san diego": "America/Los_Angeles",
+    "munich": "Europe/Berlin",
+    "frankfurt": "Europe/Berlin",
+    "milan": "Europe/Rome",
+    "barcelona": "Europe/Madrid",
+    "geneva": "Europe/Zurich",
+    "st petersburg": "Europe/Moscow",
+    "saint petersburg": "Europe/Moscow",
+    "dubai": "Asia/Dubai",
+    "abu dhabi": "Asia/Dubai",
+    "tel aviv": "Asia/Jerusalem",
+    "rio de janeiro": "America/Sao_Paulo",
+    "uk": "Europe/London",
+    "united kingdom": "Europe/London",
+    "england": "Europe/London",
+}
+
+OFFSET_PATTERN = re.compile(r"^(?:utc|gmt)?\s*([+-])\s*(\d{1,2})(?::?(\d{2}))?$")
+
+
+def _normalize(name: str) -> str:
+    return re.sub(r"[\s_]+", " ", name.strip().lower())
+
+
+def build_timezone_index() -> Tuple[Dict[str, tzinfo], Dict[str, str]]:
+    """
+    Builds the zone objects and the alias table once at startup.
+
+    Aliases are case-insensitive and treat spaces and underscores alike. They
+    cover every IANA name, the city part of each name ("seoul",
+    "new york"), countries with a single zone, and EXTRA_ALIASES. Canonical
+    zones in pytz.common_timezones win over historical ones with the same city.
+
+    Returns:
+        tuple: Zone object by canonical name, canonical name by alias
+    """
+    zones = {name: pytz.timezone(name) for name in pytz.all_timezones}
+    aliases: Dict[str, str] = {}
+    common = set(pytz.common_timezones)
+    for name in sorted(zones, key=lambda n: (n not in common, n)):
+        aliases.setdefault(_normalize(name), name)
+        city = name.rsplit("/", 1)[-1]
+        if "/" in name and not city.startswith("GMT"):
+            aliases.setdefault(_normalize(city), name)
+    for code, country_zones in pytz.country_timezones.items():
+        if len(country_zones) == 1:
+            aliases.setdefault(code.lower(), country_zones[0])
+            aliases.setdefault(_normalize(pytz.country_names[code]), country_zones[0])
+    for alias, name in EXTRA_ALIASES.items():
+        aliases[_normalize(alias)] = name
+    return zones, aliases
+
+
+TIMEZONES, ALIASES = build_timezone_index()
+# IANA names that resolve to themselves. EXTRA_ALIASES overrides the
+# fixed-offset zones "EST", "MST", "HST", "CET", "EET" and "WET", so these
+# are left out and resolve like their lowercase spelling.
+EXACT_NAMES = frozenset(name for name in TIMEZONES if ALIASES.get(_normalize(name)) == name)
+
+
+class UnknownTimezone(ValueError):
+    """Raised for a zone name that matches no alias, with close matches."""
+
+    def __init__(self, name: str, suggestions: List[str]):
+        self.name = name
+        self.suggestions = suggestions
+        hint = f" Did you mean: {', '.join(suggestions)}?" if suggestions else ""
+        super().__init__(f"Unknown timezone '{name}'.{hint}")
+
+
+def resolve_timezone(name: str) -> Tuple[str, tzinfo]:
+    """
+    Resolves an IANA name, city, country, abbreviation or UTC offset.
+
+    Lookups are case-insensitive: "EST" and "est" both resolve to
+    America/New_York.
+
+    Args:
+        name: e.g. "Asia/Seoul", "seoul", "New York", "KST", "UTC+9", "+05:30"
+
+    Returns:
+        tuple: Canonical zone name and zone object
+
+    Raises:
+        UnknownTimezone: If the name matches nothing; carries close matches
+    """
+    if name in EXACT_NAMES:
+        return name, TIMEZONES[name]
+    key = _normalize(name or "")
+    canonical = ALIASES.get(key)
+    if canonical is not None:
+        return canonical, TIMEZONES[canonical]
+    match = OFFSET_PATTERN.match(key)
+    if match:
+        sign, hours, minutes = match.groups()
+        offset = int(hours) * 60 + int(minutes or 0)
+        if offset <= 14 * 60:
+            offset = -offset if sign == "-" else offset
+            label = f"UTC{sign}{int(hours):02d}:{int(minutes or 0):02d}"
+            return label, pytz.FixedOffset(offset)
+    suggestions = [
+        ALIASES[alias] for alias in difflib.get_close_matches(key, ALIASES, n=5, cutoff=0.75)
+    ]
+    raise UnknownTimezone(name, list(dict.fromkeys(suggestions))[:3])
+
+
+def _describe(moment: datetime, canonical: str) -> Dict[str, Any]:
+    offset = moment.strftime("%z")
+    return {
+        "timezone": canonical,
+        "time": moment.strftime(TIME_FORMAT).rstrip(),
+        "iso": moment.isoformat(),
+        "utc_offset": f"{offset[:3]}:{offset[3:]}",
+    }
+
+
+def _parse_timestamp(value: Any, default_tz: tzinfo) -> datetime:
+    if isinstance(value, (int, float)) or re.fullmatch(r"-?\d+(\.\d+)?", str(value).strip()):
+        return datetime.fromtimestamp(float(value), pytz.utc)
+    text = str(value).strip().replace("Z", "+00:00")
+    moment = datetime.fromisoformat(text)
+    if moment.tzinfo is None:
+        moment = default_tz.localize(moment)
+    return moment
+
 
 @mcp.tool()
 async def get_current_time(timezone: Optional[str] = "Asia/Seoul") -> str:
@@ -17,26 +215,97 @@ async def get_current_time(timezone: Optional[str] = "Asia/Seoul") -> str:
     Get current time information for the specified timezone.
 
     This function returns the current system time for the requested timezone.
+    Besides IANA names, city names, countries, abbreviations and UTC offsets
+    are accepted, case-insensitively.
 
     Args:
-        timezone (str, optional): The timezone to get current time for. Defaults to "Asia/Seoul".
+        timezone (str, optional): The timezone to get current time for, e.g. "Asia/Seoul", "seoul", "KST" or "UTC+9". Defaults to "Asia/Seoul".
 
     Returns:
         str: A string containing the current time information for the specified timezone
     """
     try:
-        tz = pytz.timezone(timezone)
+        canonical, tz = resolve_timezone(timezone)
 
         current_time = datetime.now(tz)
 
-        formatted_time = current_time.strftime("%Y-%m-%d %H:%M:%S %Z")
+        formatted_time = current_time.strftime(TIME_FORMAT).rstrip()
 
-        return f"Current time in {timezone} is: {formatted_time}"
-    except pytz.exceptions.UnknownTimeZoneError:
-        return f"Error: Unknown timezone '{timezone}'. Please provide a valid timezone."
+        return f"Current time in {canonical} is: {formatted_time}"
+    except UnknownTimezone as e:
+        return f"Error: {e} Please provide a valid timezone."
     except Exception as e:
         return f"Error getting time: {str(e)}"
 
 
+@mcp.tool()
+async def get_times(timezones: List[str]) -> Dict[str, Any]:
+    """
+    Get the current time in several timezones with one call.
+
+    Prefer this tool over repeated get_current_time calls when more than one
+    timezone is needed. Every zone is read at the same instant.
+
+    Args:
+        timezones (list[str]): Timezones as IANA names, cities, countries, abbreviations or UTC offsets
+
+    Returns:
+        dict: The UTC instant and, per requested zone, its canonical name, local time and UTC offset, or an error with suggestions
+    """
+    now = datetime.now(pytz.utc)
+    results = []
+    for name in timezones:
+        try:
+            canonical, tz = resolve_timezone(name)
+        except UnknownTimezone as e:
+            results.append({"query": name, "error": str(e), "suggestions": e.suggestions})
+            continue
+        results.append({"query": name, **_describe(now.astimezone(tz), canonical)})
+    return {"utc": now.isoformat(), "times": results}
+
+
+@mcp.tool()
+async def convert_times(
+    timestamps: List[str], to_timezones: List[str], from_timezone: str = "UTC"
+) -> Dict[str, Any]:
+    """
+    Convert many timestamps into many timezones with one call.
+
+    Args:
+        timestamps (list[str]): ISO 8601 date-times such as "2025-03-01 09:30" or "2025-03-01T09:30:00+09:00", or Unix epoch seconds. Timestamps without an offset are read in from_timezone
+        to_timezones (list[str]): Target timezones as IANA names, cities, countries, abbreviations or UTC offsets
+        from_timezone (str, optional): Timezone of timestamps without an offset. Defaults to "UTC".
+
+    Returns:
+        dict: Per timestamp, its UTC instant and its local time in every target zone, plus any timestamps or zones that could not be read
+    """
+    errors = []
+    try:
+        _, source = resolve_timezone(from_timezone)
+    except UnknownTimezone as e:
+        return {"error": str(e), "suggestions": e.suggestions}
+    targets = []
+    for name in to_timezones:
+        try:
+            targets.append(resolve_timezone(name))
+        except UnknownTimezone as e:
+            errors.append({"timezone": name, "error": str(e), "suggestions": e.suggestions})
+    conversions = []
+    for value in timestamps:
+        try:
+            moment = _parse_timestamp(value, source)
+        except (ValueError, OverflowError, OSError) as e:
+            errors.append({"timestamp": value, "error": f"Cannot read timestamp: {e}"})
+            continue
+        conversions.append(
+            {
+                "input": value,
+                "utc": moment.astimezone(pytz.utc).isoformat(),
+                "times": [_describe(moment.astimezone(tz), canonical) for canonical, tz in targets],
+            }
+        )
+    return {"conversions": conversions, "errors": errors}
+
+
 if __name__ == "__main__":
     mcp.run(transport="stdio")
@@ -0,0 +1,365 @@
+"""
+Warm pool of pre-started stdio MCP server processes.
+
+Starting a stdio server and listing its tools takes from a few hundred
+milliseconds for a local Python server to several seconds for an ``npx``
+package. The pool keeps MCP_WARM_POOL_SIZE initialized spare processes per
+configuration entry, hands one out as soon as a session asks for it and
+starts a replacement in the background.
+
+The pool runs its own event loop in a daemon thread, because MCP client
+sessions are bound to the loop that opened them while every Streamlit
+session has a loop of its own. Tool calls from a session are forwarded to
+the pool loop. A process is recycled, transparently to the session that
+holds it, after MCP_POOL_MAX_CALLS calls or once its resident memory has
+grown by more than MCP_POOL_MAX_RSS_GROWTH_MB since it was started. Memory
+is measured at most every MCP_POOL_RSS_CHECK_SECONDS, in a worker thread.
+
+A process that a session has used may hold state of that session, so it is
+stopped when the session releases it. Only entries that declare
+``"stateless": true`` return their processes to the pool for reuse.
+"""
+
+import asyncio
+import concurrent.futures
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Coroutine, Dict, List, Optional
+
+from langchain_core.tools import BaseTool, StructuredTool
+
+from mcp_connections import ServerConnection, canonical_entry, process_tree_rss
+
+WARM_POOL_SIZE = int(os.environ.get("MCP_WARM_POOL_SIZE", "1"))
+MAX_CALLS = int(os.environ.get("MCP_POOL_MAX_CALLS", "1000"))
+MAX_RSS_GROWTH = int(os.environ.get("MCP_POOL_MAX_RSS_GROWTH_MB", "256")) * 1024 * 1024
+RSS_CHECK_SECONDS = float(os.environ.get("MCP_POOL_RSS_CHECK_SECONDS", "30"))
+
+
+class PooledProcess:
+    """A started server connection with its usage counters."""
+
+    def __init__(self, key: str, connection: ServerConnection):
+        self.key = key
+        self.connection = connection
+        self.tools: Dict[str, BaseTool] = {t.name: t for t in connection.get_tools()}
+        self.started = time.time()
+        self.baseline_rss = self.rss()
+        self.rss_growth = 0
+        self.rss_checked = time.monotonic()
+        self.calls = 0
+        self.in_flight = 0
+        self.retiring = False
+
+    def rss(self) -> int:
+        return sum(process_tree_rss(pid) for pid in self.connection.pids)
+
+    async def refresh_rss(self, interval: float = RSS_CHECK_SECONDS) -> None:
+        """Measures the memory growth if the last measurement is older than interval."""
+        now = time.monotonic()
+        if now - self.rss_checked < interval:
+            return
+        self.rss_checked = now
+        # Reading /proc for the process tree scans every process on the host.
+        self.rss_growth = await asyncio.to_thread(self.rss) - self.baseline_rss
+
+    def exhausted(self, max_calls: int, max_rss_growth: int) -> bool:
+        if max_calls and self.calls >= max_calls:
+            return True
+        return bool(max_rss_growth) and self.rss_growth > max_rss_growth
+
+
+class LeasedConnection:
+    """
+    Server connection lent to a session by the warm pool.
+
+    Offers the interface of ServerConnection. The tools it returns forward
+    their calls to the pool loop and always use the process currently held by
+    the lease, so a process can be recycled between two calls.
+    """
+
+    def __init__(self, pool: "WarmPool", name: str, entry: Dict[str, Any]):
+        self.pool = pool
+        self.name = name
+        self.entry = entry
+        self.process: Optional[PooledProcess] = None
+        self._tools: List[BaseTool] = []
+        self._swap_lock: Optional[asyncio.Lock] = None
+
+    @property
+    def pids(self) -> List[int]:
+        return list(self.process.connection.pids) if self.process is not None else []
+
+    async def _acquire(self) -> None:
+        # Runs on the pool loop.
+        self._swap_lock = asyncio.Lock()
+        self.process = await self.pool._take(self.name, self.entry)
+
+    async def start(self) -> None:
+        await self.pool.run(self._acquire())
+        self._tools = [self._proxy(tool) for tool in self.process.tools.values()]
+
+    async def stop(self) -> None:
+        await self.pool.run(self._release())
+
+    async def _release(self) -> None:
+        process, self.process = self.process, None
+        if process is not None:
+            await self.pool._give_back(process, self.entry)
+
+    def get_tools(self) -> List[BaseTool]:
+        return list(self._tools) if self.process is not None else []
+
+    async def _call(self, tool_name: str, arguments: Dict[str, Any]) -> Any:
+        # Runs on the pool loop.
+        if self.process is None:
+            raise RuntimeError(f"MCP server '{self.name}' has been released.")
+        if self.pool.max_rss_growth:
+            await self.process.refresh_rss()
+        if self.process.exhausted(self.pool.max_calls, self.pool.max_rss_growth):
+            async with self._swap_lock:
+                old = self.process
+                if old is not None and old.exhausted(
+                    self.pool.max_calls, self.pool.max_rss_growth
+                ):
+                    self.process = await self.pool._recycle(old, self.name, self.entry)
+        process = self.process
+        process.calls += 1
+        process.in_flight += 1
+        try:
+            return await process.tools[tool_name].coroutine(**arguments)
+        finally:
+            process.in_flight -= 1
+            if process.retiring and process.in_flight == 0:
+                await self.pool._retire(process)
+
+    def _proxy(self, tool: BaseTool) -> BaseTool:
+        tool_name = tool.name
+
+        async def call_pooled_tool(**arguments: Any) -> Any:
+            return await self.pool.run(self._call(tool_name, arguments))
+
+        return StructuredTool(
+            name=tool.name,
+            description=tool.description,
+            args_schema=tool.args_schema,
+            coroutine=call_pooled_tool,
+            response_format=tool.response_format,
+        )
+
+
+class WarmPool:
+    """
+    Spare stdio server processes kept ready per configuration entry.
+
+    Entries are keyed by their canonical JSON, so sessions with the same
+    server configuration share spares whatever name they give the server.
+    """
+
+    def __init__(
+        self,
+        size: int = WARM_POOL_SIZE,
+        max_calls: int = MAX_CALLS,
+        max_rss_growth: int = MAX_RSS_GROWTH,
+    ):
+        self.size = size
+        self.max_calls = max_calls
+        self.max_rss_growth = max_rss_growth
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+        self._idle: Dict[str, List[PooledProcess]] = defaultdict(list)
+        self._spawning: Dict[str, int] = defaultdict(int)
+        self._names: Dict[str, str] = {}
+        self._leased: Dict[str, int] = defaultdict(int)
+        self._errors: Dict[str, str] = {}  # Last failed start per entry
+        self._spawn_lock: Optional[asyncio.Lock] = None
+        self.stats = defaultdict(int)
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._thread_lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self.loop.run_forever, name="mcp-warm-pool", daemon=True
+                )
+                self._thread.start()
+            return self.loop
+
+    async def run(self, coro: Coroutine) -> Any:
+        """Runs a coroutine on the pool loop and awaits it from the caller's loop."""
+        loop = self._ensure_loop()
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+    @staticmethod
+    def pooled(entry: Dict[str, Any]) -> bool:
+        return entry.get("transport", "stdio") == "stdio"
+
+    async def _spawn(self, key: str, name: str, entry: Dict[str, Any]) -> PooledProcess:
+        # Processes are started one at a time so that each connection can
+        # tell which new child process is its own.
+        if self._spawn_lock is None:
+            self._spawn_lock = asyncio.Lock()
+        started = time.perf_counter()
+        connection = ServerConnection(name, entry)
+        async with self._spawn_lock:
+            await connection.start()
+        self.stats["spawned"] += 1
+        self.stats["spawn_seconds_total"] += time.perf_counter() - started
+        return PooledProcess(key, connection)
+
+    async def _replenish(self, key: str, name: str, entry: Dict[str, Any]) -> None:
+        self._names.setdefault(key, name)
+        while len(self._idle[key]) + self._spawning[key] < self.size:
+            self._spawning[key] += 1
+            try:
+                process = await self._spawn(key, name, entry)
+            except Exception as e:
+                self.stats["spawn_errors"] += 1
+                self._errors[key] = str(e) or repr(e)
+                return
+            finally:
+                self._spawning[key] -= 1
+            self._errors.pop(key, None)
+            self._idle[key].append(process)
+
+    async def _take(self, name: str, entry: Dict[str, Any]) -> PooledProcess:
+        key = canonical_entry(entry)
+        self._names.setdefault(key, name)
+        if self._idle[key]:
+            process = self._idle[key].pop()
+            self.stats["warm_hits"] += 1
+        else:
+            process = await self._spawn(key, name, entry)
+            self.stats["cold_starts"] += 1
+        self._leased[key] += 1
+        asyncio.create_task(self._replenish(key, name, entry))
+        return process
+
+    async def _recycle(
+        self, process: PooledProcess, name: str, entry: Dict[str, Any]
+    ) -> PooledProcess:
+        replacement = await self._take(name, entry)
+        self._leased[process.key] -= 1
+        self.stats["recycled"] += 1
+        await self._retire(process)
+        return replacement
+
+    async def _give_back(self, process: PooledProcess, entry: Dict[str, Any]) -> None:
+        self._leased[process.key] -= 1
+        if (
+            (process.calls == 0 or entry.get("stateless", False))
+            and not process.retiring
+            and process.in_flight == 0
+            and len(self._idle[process.key]) < self.size
+            and not process.exhausted(self.max_calls, self.max_rss_growth)
+        ):
+            self._idle[process.key].append(process)
+            self.stats["returned"] += 1
+        else:
+            await self._retire(process)
+
+    async def _retire(self, process: PooledProcess) -> None:
+        process.retiring = True
+        if process.in_flight:
+            # The last call in flight retires the process when it finishes.
+            return
+        try:
+            await process.connection.stop()
+        except Exception:
+            pass
+        self.stats["retired"] += 1
+
+    async def _prewarm(self, config: Dict[str, Dict[str, Any]]) -> None:
+        keys = {}
+        for name, entry in config.items():
+            if self.pooled(entry):
+                keys[canonical_entry(entry)] = (name, entry)
+        for key in list(self._idle):
+            if key not in keys:
+                idle, self._idle[key] = self._idle[key], []
+                for process in idle:
+                    await self._retire(process)
+        await asyncio.gather(
+            *(self._replenish(key, name, entry) for key, (name, entry) in keys.items())
+        )
+
+    def prewarm(self, config: Dict[str, Dict[str, Any]]) -> Optional[concurrent.futures.Future]:
+        """
+        Starts spare processes for the stdio servers of a configuration.
+
+        Returns immediately; the processes start in the background. Spares
+        of entries that are no longer in the configuration are stopped.
+
+        Args:
+            config: MCP tool configuration
+
+        Returns:
+            Future: Completes once the spares have started, None if the pool is disabled
+        """
+        if self.enabled:
+            return asyncio.run_coroutine_threadsafe(self._prewarm(config), self._ensure_loop())
+        return None
+
+    async def lease(self, name: str, entry: Dict[str, Any]) -> LeasedConnection:
+        """
+        Returns a started connection for a server entry, warm if possible.
+
+        Args:
+            name: Server name in the session's configuration
+            entry: Server configuration entry
+
+        Returns:
+            LeasedConnection: Connection to hand back with ``stop``
+        """
+        connection = LeasedConnection(self, name, entry)
+        await connection.start()
+        return connection
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Returns the pool counters and the state of each server entry.
+
+        The counters are changed on the pool loop, so the snapshot is taken
+        there when called from another thread.
+
+        Returns:
+            dict: Pool size, counters and, per server, idle, starting and
+            leased processes and the error of the last failed start, if any
+        """
+        loop = self.loop
+        if loop is None or not loop.is_running() or threading.current_thread() is self._thread:
+            return self._stats_snapshot()
+        return asyncio.run_coroutine_threadsafe(self._get_stats(), loop).result(timeout=5)
+
+    async def _get_stats(self) -> Dict[str, Any]:
+        return self._stats_snapshot()
+
+    def _stats_snapshot(self) -> Dict[str, Any]:
+        servers = {}
+        for key in set(self._idle) | set(self._leased) | set(self._spawning) | set(self._errors):
+            servers[self._names.get(key, key)] = {
+                "idle": len(self._idle.get(key, [])),
+                "starting": self._spawning.get(key, 0),
+                "leased": self._leased.get(key, 0),
+                "last_error": self._errors.get(key),
+            }
+        stats = dict(self.stats)
+        spawned = stats.get("spawned", 0)
+        return {
+            "size": self.size,
+            **{k: v for k, v in stats.items() if k != "spawn_seconds_total"},
+            "spawn_seconds_avg": stats.get("spawn_seconds_total", 0.0) / spawned
+            if spawned
+            else 0.0,
+            "servers": servers,
+        }
+
+
+warm_pool = WarmPool()
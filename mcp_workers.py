@@ -0,0 +1,338 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from typing import Any, Dict, List, Optional
+
+import uvicorn
+from mcp.server.fastmcp import FastMCP
+
+# Per-worker counters kept in shared memory: requests, errors, in-flight,
+# total latency in milliseconds, pid and start time.
+_FIELDS = ("requests", "errors", "in_flight", "latency_ms_total", "pid", "started")
+_WIDTH = len(_FIELDS)
+
+
+class WorkerMetrics:
+    """
+    Request counters of every worker slot, stored in shared memory.
+
+    Each worker only writes its own slot, so no locking is needed, and any
+    worker can report the counters of all of them. Slots with a pid of 0 are
+    unused or belong to a worker that has been retired.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._values = multiprocessing.RawArray("d", workers * _WIDTH)
+
+    def _index(self, slot: int, field: str) -> int:
+        return slot * _WIDTH + _FIELDS.index(field)
+
+    def add(self, slot: int, field: str, amount: float) -> None:
+        self._values[self._index(slot, field)] += amount
+
+    def reset(self, slot: int, pid: int) -> None:
+        for field in _FIELDS:
+            self._values[self._index(slot, field)] = 0
+        self._values[self._index(slot, "pid")] = pid
+        self._values[self._index(slot, "started")] = time.time()
+
+    def retire(self, slot: int) -> None:
+        self._values[self._index(slot, "pid")] = 0
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        workers = []
+        for slot in range(self.workers):
+            row = {field: self._values[self._index(slot, field)] for field in _FIELDS}
+            if not row["pid"]:
+                continue
+            requests = row["requests"]
+            workers.append(
+                {
+                    "slot": slot,
+                    "pid": int(row["pid"]),
+                    "uptime_seconds": time.time() - row["started"] if row["started"] else 0.0,
+                    "requests": int(requests),
+                    "errors": int(row["errors"]),
+                    "in_flight": int(row["in_flight"]),
+                    "latency_ms_avg": row["latency_ms_total"] / requests if requests else 0.0,
+                }
+            )
+        return workers
+
+
+class MetricsMiddleware:
+    """ASGI middleware that records request metrics and serves ``/metrics``."""
+
+    def __init__(self, app, metrics: WorkerMetrics, slot: int):
+        self.app = app
+        self.metrics = metrics
+        self.slot = slot
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        if scope["path"] == "/metrics":
+            body = json.dumps(
+                {"served_by": os.getpid(), "workers": self.metrics.snapshot()}
+            ).encode("utf-8")
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": 200,
+                    "headers": [(b"content-type", b"application/json")],
+                }
+            )
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        status = {"code": 500}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        self.metrics.add(self.slot, "in_flight", 1)
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            self.metrics.add(self.slot, "in_flight", -1)
+            self.metrics.add(self.slot, "requests", 1)
+            self.metrics.add(
+                self.slot, "latency_ms_total", (time.perf_counter() - started) * 1000
+            )
+            if status["code"] >= 500:
+                self.metrics.add(self.slot, "errors", 1)
+
+
+def streamable_http_app(mcp: FastMCP):
+    """
+    Returns the stateless streamable HTTP app of a FastMCP server.
+
+    Workers share no session state, so the server runs in stateless mode and
+    any worker can answer any request.
+
+    Args:
+        mcp: FastMCP server
+
+    Returns:
+        Starlette: ASGI application serving the MCP endpoint
+    """
+    if not hasattr(mcp, "streamable_http_app"):
+        raise RuntimeError(
+            "The streamable HTTP transport requires mcp>=1.8.0. "
+            "Please upgrade the mcp package to use multi-worker mode."
+        )
+    mcp.settings.stateless_http = True
+    return mcp.streamable_http_app()
+
+
+def _worker_main(
+    mcp: FastMCP,
+    sock: socket.socket,
+    metrics: WorkerMetrics,
+    slot: int,
+    ready,
+    graceful_timeout: float,
+) -> None:
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    metrics.reset(slot, os.getpid())
+    app = MetricsMiddleware(streamable_http_app(mcp), metrics, slot)
+    config = uvicorn.Config(
+        app,
+        log_level=mcp.settings.log_level.lower(),
+        timeout_graceful_shutdown=graceful_timeout,
+    )
+    server = uvicorn.Server(config)
+
+    async def serve():
+        task = asyncio.create_task(server.serve(sockets=[sock]))
+        while not server.started and not task.done():
+            await asyncio.sleep(0.05)
+        ready.set()
+        await task
+
+    asyncio.run(serve())
+
+
+class WorkerSupervisor:
+    """
+    Pre-fork supervisor running several server workers on one listening socket.
+
+    The supervisor binds the port once and forks the workers, which all accept
+    connections from the inherited socket. Workers that exit unexpectedly are
+    replaced. SIGHUP triggers a rolling restart: each worker is replaced by a
+    fresh one, and the old worker is only asked to stop (finishing its
+    in-flight requests) once its replacement is accepting connections.
+    SIGINT and SIGTERM stop all workers gracefully.
+    """
+
+    def __init__(
+        self,
+        mcp: FastMCP,
+        host: str,
+        port: int,
+        workers: int,
+        graceful_timeout: float = 30.0,
+    ):
+        self.mcp = mcp
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.graceful_timeout = graceful_timeout
+        # One spare metrics slot lets a replacement worker start counting
+        # while the worker it replaces is still draining.
+        self.metrics = WorkerMetrics(workers + 1)
+        self._context = multiprocessing.get_context("fork")
+        self._processes: List[Optional[multiprocessing.Process]] = [None] * workers
+        self._slots = list(range(workers))
+        self._spare_slot = workers
+        self._socket: Optional[socket.socket] = None
+        self._restart_requested = False
+        self._stopping = False
+
+    def _bind(self) -> socket.socket:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(2048)
+        sock.set_inheritable(True)
+        return sock
+
+    def _spawn(self, slot: int) -> multiprocessing.Process:
+        ready = self._context.Event()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(
+                self.mcp,
+                self._socket,
+                self.metrics,
+                slot,
+                ready,
+                self.graceful_timeout,
+            ),
+            daemon=False,
+        )
+        process.start()
+        deadline = time.monotonic() + self.graceful_timeout
+        while not ready.wait(timeout=0.1):
+            if not process.is_alive() or time.monotonic() > deadline:
+                self._stop_process(process)
+                raise RuntimeError(
+                    f"worker in slot {slot} did not start (exit code {process.exitcode})"
+                )
+        return process
+
+    def _stop_process(self, process: Optional[multiprocessing.Process]) -> None:
+        if process is None or not process.is_alive():
+            return
+        process.terminate()
+        process.join(self.graceful_timeout + 5)
+        if process.is_alive():
+            process.kill()
+            process.join()
+
+    def rolling_restart(self) -> None:
+        for position in range(self.workers):
+            old, old_slot = self._processes[position], self._slots[position]
+            new_slot = self._spare_slot
+            try:
+                self._processes[position] = self._spawn(new_slot)
+            except RuntimeError as e:
+                # Keep the old worker rather than lose its capacity.
+                self.metrics.retire(new_slot)
+                print(f"rolling restart stopped at worker {position}: {e}")
+                return
+            self._slots[position] = new_slot
+            self._stop_process(old)
+            self.metrics.retire(old_slot)
+            self._spare_slot = old_slot
+            print(
+                f"worker {position} restarted (pid {self._processes[position].pid})"
+            )
+
+    def _on_hup(self, signum, frame) -> None:
+        self._restart_requested = True
+
+    def _on_stop(self, signum, frame) -> None:
+        self._stopping = True
+
+    def run(self) -> None:
+        self._socket = self._bind()
+        signal.signal(signal.SIGHUP, self._on_hup)
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+
+        try:
+            for position, slot in enumerate(self._slots):
+                self._processes[position] = self._spawn(slot)
+            print(
+                f"serving streamable HTTP on http://{self.host}:{self.port}"
+                f"{self.mcp.settings.streamable_http_path} with {self.workers} workers"
+            )
+
+            while not self._stopping:
+                if self._restart_requested:
+                    self._restart_requested = False
+                    self.rolling_restart()
+                for position, process in enumerate(self._processes):
+                    if process is not None and not process.is_alive():
+                        print(
+                            f"worker {position} exited with {process.exitcode}, respawning"
+                        )
+                        try:
+                            self._processes[position] = self._spawn(self._slots[position])
+                        except RuntimeError as e:
+                            # Retried on the next pass while the dead process is listed.
+                            print(f"worker {position}: {e}")
+                time.sleep(0.5)
+        finally:
+            for process in self._processes:
+                if process is not None and process.is_alive():
+                    process.terminate()
+            for process in self._processes:
+                self._stop_process(process)
+            self._socket.close()
+
+
+def serve(
+    mcp: FastMCP,
+    workers: int = 1,
+    host: Optional[str] = None,
+    port: Optional[int] = None,
+    graceful_timeout: float = 30.0,
+) -> None:
+    """
+    Serves a FastMCP server over streamable HTTP with one or more workers.
+
+    Args:
+        mcp: FastMCP server
+        workers: Number of worker processes
+        host: Address to bind. Defaults to the server's configured host
+        port: Port to bind. Defaults to the server's configured port
+        graceful_timeout: Seconds a stopping worker may spend finishing requests
+    """
+    host = host or mcp.settings.host
+    port = port or mcp.settings.port
+    if workers > 1 and not hasattr(signal, "SIGHUP"):
+        raise RuntimeError("Multi-worker mode is not supported on this platform.")
+    if workers <= 1:
+        metrics = WorkerMetrics(1)
+        metrics.reset(0, os.getpid())
+        uvicorn.run(
+            MetricsMiddleware(streamable_http_app(mcp), metrics, 0),
+            host=host,
+            port=port,
+            log_level=mcp.settings.log_level.lower(),
+            timeout_graceful_shutdown=graceful_timeout,
+        )
+        return
+    WorkerSupervisor(mcp, host, port, workers, graceful_timeout).run()
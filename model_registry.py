@@ -0,0 +1,316 @@
+import asyncio
+import os
+import threading
+import weakref
+from functools import cached_property
+from typing import Any, ClassVar, Dict, Optional, Tuple
+
+import anthropic
+import httpx
+from langchain_anthropic import ChatAnthropic
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_openai import ChatOpenAI
+
+from rate_limiter import ADMISSION_ENABLED, AdmissionControlled
+
+POOL_MAX_CONNECTIONS = int(os.environ.get("MODEL_POOL_MAX_CONNECTIONS", "20"))
+POOL_MAX_KEEPALIVE = int(os.environ.get("MODEL_POOL_MAX_KEEPALIVE", "10"))
+POOL_KEEPALIVE_EXPIRY = float(os.environ.get("MODEL_POOL_KEEPALIVE_EXPIRY", "30"))
+POOL_TIMEOUT = httpx.Timeout(600.0, connect=10.0)
+
+ModelKey = Tuple[str, str, float, int]
+
+
+def _pool_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=POOL_MAX_CONNECTIONS,
+        max_keepalive_connections=POOL_MAX_KEEPALIVE,
+        keepalive_expiry=POOL_KEEPALIVE_EXPIRY,
+    )
+
+
+class PoolStats:
+    """
+    Counters describing how a provider connection pool is being used.
+
+    Attributes are updated from the transport without locking; the values are
+    meant for monitoring, so an occasional lost increment is acceptable.
+    """
+
+    def __init__(self, max_connections: int):
+        self.max_connections = max_connections
+        self.requests = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.saturated_requests = 0
+        self.connections_opened = 0
+        self.errors = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        reused = max(self.requests - self.connections_opened, 0)
+        return {
+            "max_connections": self.max_connections,
+            "requests": self.requests,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "saturation": (
+                self.in_flight / self.max_connections if self.max_connections else 0.0
+            ),
+            "saturated_requests": self.saturated_requests,
+            "connections_opened": self.connections_opened,
+            "connection_reuse_ratio": (
+                reused / self.requests if self.requests else 0.0
+            ),
+            "errors": self.errors,
+        }
+
+
+class _CountedStream(httpx.AsyncByteStream):
+    """Response stream that reports back to the transport when it is closed."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, on_close):
+        self._stream = stream
+        self._on_close = on_close
+
+    async def __aiter__(self):
+        async for part in self._stream:
+            yield part
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            on_close, self._on_close = self._on_close, None
+            if on_close is not None:
+                on_close()
+
+
+class LoopLocalPoolTransport(httpx.AsyncBaseTransport):
+    """
+    Bounded keep-alive transport shared by every model client of one provider.
+
+    httpx async connections are bound to the event loop that opened them, and
+    each Streamlit session drives its own loop. The transport therefore keeps
+    one bounded connection pool per live event loop and routes each request to
+    the pool of the loop it is running on, while all sessions and model
+    clients of a provider share the same transport object and statistics.
+    """
+
+    def __init__(self, limits: httpx.Limits):
+        self._limits = limits
+        self._pools = weakref.WeakKeyDictionary()
+        self.stats = PoolStats(limits.max_connections or 0)
+
+    def _pool_for_running_loop(self) -> httpx.AsyncHTTPTransport:
+        loop = asyncio.get_running_loop()
+        pool = self._pools.get(loop)
+        if pool is None:
+            pool = httpx.AsyncHTTPTransport(limits=self._limits)
+            self._pools[loop] = pool
+        return pool
+
+    @property
+    def loop_pools(self) -> int:
+        return len(self._pools)
+
+    def open_connections(self) -> int:
+        total = 0
+        for pool in list(self._pools.values()):
+            total += len(getattr(pool._pool, "connections", []))
+        return total
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        pool = self._pool_for_running_loop()
+        connections = getattr(pool._pool, "connections", [])
+        known = {id(c) for c in connections}
+
+        stats = self.stats
+        stats.requests += 1
+        if stats.max_connections and stats.in_flight >= stats.max_connections:
+            stats.saturated_requests += 1
+        stats.in_flight += 1
+        stats.peak_in_flight = max(stats.peak_in_flight, stats.in_flight)
+
+        def release():
+            stats.in_flight -= 1
+
+        try:
+            response = await pool.handle_async_request(request)
+        except Exception:
+            stats.errors += 1
+            release()
+            raise
+
+        stats.connections_opened += sum(
+            1 for c in getattr(pool._pool, "connections", []) if id(c) not in known
+        )
+        response.stream = _CountedStream(response.stream, release)
+        return response
+
+    async def release_loop(self, loop: asyncio.AbstractEventLoop) -> None:
+        pool = self._pools.pop(loop, None)
+        if pool is not None:
+            await pool.aclose()
+
+    async def aclose(self) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        await self.release_loop(loop)
+
+
+class _ProviderPool:
+    """Shared sync and async HTTP clients for one model provider."""
+
+    def __init__(self):
+        limits = _pool_limits()
+        self.transport = LoopLocalPoolTransport(limits)
+        self.async_client = httpx.AsyncClient(
+            transport=self.transport, timeout=POOL_TIMEOUT
+        )
+        self.sync_client = httpx.Client(limits=limits, timeout=POOL_TIMEOUT)
+
+
+class PooledChatAnthropic(AdmissionControlled, ChatAnthropic):
+    """
+    ChatAnthropic whose SDK clients use the process-wide provider pool and
+    whose requests pass the provider's admission controller.
+    """
+
+    admission_provider: ClassVar[str] = "anthropic"
+
+    @cached_property
+    def _client(self) -> anthropic.Client:
+        return anthropic.Client(
+            **self._client_params, http_client=_provider_pool("anthropic").sync_client
+        )
+
+    @cached_property
+    def _async_client(self) -> anthropic.AsyncClient:
+        return anthropic.AsyncClient(
+            **self._client_params,
+            http_client=_provider_pool("anthropic").async_client,
+        )
+
+
+class PooledChatOpenAI(AdmissionControlled, ChatOpenAI):
+    """ChatOpenAI whose requests pass the provider's admission controller."""
+
+    admission_provider: ClassVar[str] = "openai"
+
+
+_lock = threading.Lock()
+_provider_pools: Dict[str, _ProviderPool] = {}
+_models: Dict[ModelKey, BaseChatModel] = {}
+_model_hits: Dict[ModelKey, int] = {}
+
+
+def _provider_pool(provider: str) -> _ProviderPool:
+    with _lock:
+        pool = _provider_pools.get(provider)
+        if pool is None:
+            pool = _ProviderPool()
+            _provider_pools[provider] = pool
+        return pool
+
+
+def _create_model(
+    provider: str, model: str, temperature: float, max_tokens: int
+) -> BaseChatModel:
+    # Rate-limit retries are left to the admission controller, so that they
+    # are coordinated across sessions instead of multiplied by them.
+    max_retries = 0 if ADMISSION_ENABLED else 2
+    if provider == "anthropic":
+        return PooledChatAnthropic(
+            model=model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            max_retries=max_retries,
+        )
+    if provider == "openai":
+        pool = _provider_pool("openai")
+        return PooledChatOpenAI(
+            model=model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            max_retries=max_retries,
+            http_client=pool.sync_client,
+            http_async_client=pool.async_client,
+        )
+    raise ValueError(f"Unsupported model provider: {provider}")
+
+
+def get_chat_model(
+    provider: str, model: str, temperature: float, max_tokens: int
+) -> BaseChatModel:
+    """
+    Returns the shared chat model client for the given settings.
+
+    Clients are created once per (provider, model, temperature, max_tokens)
+    and reused by every session, so connection setup and TLS handshakes are
+    paid once per pool instead of once per "Apply Settings".
+
+    Args:
+        provider: Either "anthropic" or "openai"
+        model: Model name
+        temperature: Sampling temperature
+        max_tokens: Maximum number of output tokens
+
+    Returns:
+        BaseChatModel: Shared chat model instance
+    """
+    key = (provider, model, float(temperature), int(max_tokens))
+    with _lock:
+        client = _models.get(key)
+        if client is not None:
+            _model_hits[key] += 1
+            return client
+    client = _create_model(*key)
+    with _lock:
+        existing = _models.setdefault(key, client)
+        _model_hits.setdefault(key, 0)
+        if existing is not client:
+            _model_hits[key] += 1
+        return existing
+
+
+async def release_loop_pools(loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+    """
+    Closes the connections that were opened on the given event loop.
+
+    Args:
+        loop: Event loop whose pools should be closed. Defaults to the running loop
+    """
+    loop = loop or asyncio.get_running_loop()
+    for pool in list(_provider_pools.values()):
+        await pool.transport.release_loop(loop)
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    """
+    Returns connection pool and client reuse statistics.
+
+    Returns:
+        dict: Per-provider pool counters and per-model reuse counts
+    """
+    with _lock:
+        providers = {
+            name: {
+                **pool.transport.stats.as_dict(),
+                "open_connections": pool.transport.open_connections(),
+                "loop_pools": pool.transport.loop_pools,
+            }
+            for name, pool in _provider_pools.items()
+        }
+        models = [
+            {
+                "provider": key[0],
+                "model": key[1],
+                "temperature": key[2],
+                "max_tokens": key[3],
+                "reuse_count": _model_hits.get(key, 0),
+            }
+            for key in _models
+        ]
+    return {"providers": providers, "models": models}
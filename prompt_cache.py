@@ -0,0 +1,135 @@
+import hashlib
+import json
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Sequence
+
+from langchain_anthropic import ChatAnthropic
+from langchain_anthropic.chat_models import convert_to_anthropic_tool
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import SystemMessage
+from langchain_core.runnables import Runnable
+from langchain_core.tools import BaseTool
+
+CACHE_CONTROL = {"type": "ephemeral"}
+
+_lock = threading.Lock()
+_prefix_history: deque = deque(maxlen=50)
+_prefix_stats = {"current": None, "builds": 0, "invalidations": 0}
+
+
+def supports_cache_control(model: BaseChatModel) -> bool:
+    return isinstance(model, ChatAnthropic)
+
+
+def sort_tools(tools: Sequence[BaseTool]) -> List[BaseTool]:
+    """
+    Orders tools deterministically so the tool definitions form a stable prefix.
+
+    Args:
+        tools: Tools exposed to the agent
+
+    Returns:
+        list: Tools sorted by name
+    """
+    return sorted(tools, key=lambda tool: tool.name)
+
+
+def prefix_hash(system_prompt: str, tools: Sequence[BaseTool]) -> str:
+    """
+    Hashes the stable request prefix: the system prompt and the tool definitions.
+
+    Args:
+        system_prompt: System prompt text
+        tools: Tools exposed to the agent
+
+    Returns:
+        str: Hex digest of the prefix
+    """
+    definitions = [convert_to_anthropic_tool(tool) for tool in sort_tools(tools)]
+    payload = json.dumps(
+        {"system": system_prompt, "tools": definitions},
+        sort_keys=True,
+        default=str,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def track_prefix(digest: str, tools: Sequence[BaseTool]) -> None:
+    """
+    Records the prefix hash of a newly built agent.
+
+    A change of hash means the provider-side cache entry of the previous
+    prefix can no longer be hit.
+
+    Args:
+        digest: Prefix hash returned by ``prefix_hash``
+        tools: Tools the prefix was built from
+    """
+    with _lock:
+        _prefix_stats["builds"] += 1
+        previous = _prefix_stats["current"]
+        if previous == digest:
+            return
+        if previous is not None:
+            _prefix_stats["invalidations"] += 1
+        _prefix_stats["current"] = digest
+        _prefix_history.append(
+            {
+                "hash": digest,
+                "previous": previous,
+                "tools": [tool.name for tool in sort_tools(tools)],
+                "time": time.time(),
+            }
+        )
+
+
+def get_prefix_stats() -> Dict[str, Any]:
+    with _lock:
+        return {**_prefix_stats, "history": list(_prefix_history)}
+
+
+def cached_system_prompt(model: BaseChatModel, system_prompt: str) -> Any:
+    """
+    Returns the system prompt, marked as a cache breakpoint when supported.
+
+    Args:
+        model: Chat model the prompt is sent to
+        system_prompt: System prompt text
+
+    Returns:
+        SystemMessage or str: Prompt for ``create_react_agent``
+    """
+    if not supports_cache_control(model):
+        return system_prompt
+    return SystemMessage(
+        content=[
+            {"type": "text", "text": system_prompt, "cache_control": CACHE_CONTROL}
+        ]
+    )
+
+
+def bind_cached_tools(model: BaseChatModel, tools: Sequence[BaseTool]) -> Runnable:
+    """
+    Binds tools to the model in a stable order with a cache breakpoint.
+
+    Anthropic renders the request as tools, then system, then messages. The
+    breakpoint on the last tool definition lets the tool block be reused even
+    when only the system prompt changes, and the breakpoint on the system
+    prompt covers both.
+
+    Args:
+        model: Chat model to bind
+        tools: Tools exposed to the agent
+
+    Returns:
+        Runnable: Model with the ordered tool definitions bound
+    """
+    ordered = sort_tools(tools)
+    if not supports_cache_control(model) or not ordered:
+        return model.bind_tools(ordered)
+    definitions = [dict(convert_to_anthropic_tool(tool)) for tool in ordered]
+    definitions[-1]["cache_control"] = CACHE_CONTROL
+    return model.bind_tools(definitions)
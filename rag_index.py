@@ -0,0 +1,671 @@
+"""
+Read-only, memory-mapped retrieval index shared by all retriever processes.
+
+An index version is a directory holding:
+
+- vectors.npy: float32 matrix of L2-normalized chunk embeddings
+- chunks.bin: UTF-8 JSON records (text, source, page), concatenated
+- offsets.npy: int64 byte offsets of the records in chunks.bin
+- manifest.json: embedding model, dimension, chunk count, sources and the
+  chunk store format
+
+With ``RAG_CHUNK_STORE=sqlite`` the records are written to chunks.sqlite
+instead of chunks.bin and offsets.npy, and only the texts of the hits are
+read from disk at query time. Either way the recently returned records are
+kept in a small LRU cache of RAG_HOT_CHUNKS entries.
+
+The vector and offset files are opened with mmap, so every process that
+serves the same version shares one copy of the pages in the OS page cache. A ``CURRENT``
+file in the index root names the active version; a rebuild writes a new
+version directory and then replaces ``CURRENT`` atomically, and readers
+switch to it on their next query.
+
+Usage:
+    python rag_index.py build data/sample.pdf
+"""
+
+import argparse
+import fcntl
+import json
+import mmap
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+INDEX_ROOT = os.environ.get("RAG_INDEX_DIR", "data/index")
+EMBEDDING_MODEL = "text-embedding-3-small"
+KEEP_VERSIONS = 2
+# "file" (offset-indexed chunks.bin) or "sqlite" (chunks.sqlite)
+CHUNK_STORE = os.environ.get("RAG_CHUNK_STORE", "file")
+HOT_CHUNKS = int(os.environ.get("RAG_HOT_CHUNKS", "256"))
+
+
+def _embeddings(model: str = EMBEDDING_MODEL):
+    from langchain_openai import OpenAIEmbeddings
+
+    return OpenAIEmbeddings(model=model)
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _fsync_dir(path: str) -> None:
+    if hasattr(os, "O_DIRECTORY"):
+        fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def load_chunks(pdf_paths: Sequence[str]) -> List[Any]:
+    """
+    Loads PDF files and splits them into chunks.
+
+    Args:
+        pdf_paths: PDF files to index
+
+    Returns:
+        list: LangChain documents, one per chunk
+    """
+    from langchain_community.document_loaders import PyMuPDFLoader
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    docs = []
+    for path in pdf_paths:
+        docs.extend(PyMuPDFLoader(path).load())
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=50)
+    return text_splitter.split_documents(docs)
+
+
+def _write_offset_chunks(path: str, records: Sequence[Dict[str, Any]]) -> None:
+    offsets = np.zeros(len(records) + 1, dtype=np.int64)
+    with open(os.path.join(path, "chunks.bin"), "wb") as f:
+        for i, record in enumerate(records):
+            data = json.dumps(record, ensure_ascii=False).encode("utf-8")
+            f.write(data)
+            offsets[i + 1] = offsets[i] + len(data)
+        f.flush()
+        os.fsync(f.fileno())
+    np.save(os.path.join(path, "offsets.npy"), offsets)
+
+
+def _write_sqlite_chunks(path: str, records: Sequence[Dict[str, Any]]) -> None:
+    connection = sqlite3.connect(os.path.join(path, "chunks.sqlite"))
+    try:
+        connection.execute("PRAGMA journal_mode = OFF")
+        connection.execute(
+            "CREATE TABLE chunks (id INTEGER PRIMARY KEY, source TEXT, page INTEGER, text TEXT)"
+        )
+        connection.executemany(
+            "INSERT INTO chunks VALUES (?, ?, ?, ?)",
+            (
+                (i, r.get("source"), r.get("page"), r.get("text", ""))
+                for i, r in enumerate(records)
+            ),
+        )
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def write_index(
+    root: str,
+    records: Sequence[Dict[str, Any]],
+    vectors: np.ndarray,
+    manifest: Dict[str, Any],
+    chunk_store: str = CHUNK_STORE,
+) -> str:
+    """
+    Writes a new index version and makes it the active one.
+
+    Args:
+        root: Index root directory
+        records: Chunk records with "text", "source" and "page"
+        vectors: Chunk embeddings, one row per record
+        manifest: Extra manifest fields, such as the embedding model
+        chunk_store: Record storage format, "file" or "sqlite"
+
+    Returns:
+        str: Path of the new version directory
+    """
+    if chunk_store not in ("file", "sqlite"):
+        raise ValueError(f"Unknown chunk store: {chunk_store}")
+    os.makedirs(root, exist_ok=True)
+    version = f"v-{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    staging = os.path.join(root, f".{version}.tmp")
+    os.makedirs(staging)
+
+    vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+    np.save(os.path.join(staging, "vectors.npy"), vectors)
+
+    if chunk_store == "sqlite":
+        _write_sqlite_chunks(staging, records)
+    else:
+        _write_offset_chunks(staging, records)
+
+    with open(os.path.join(staging, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                **manifest,
+                "version": version,
+                "chunk_store": chunk_store,
+                "count": len(records),
+                "dim": int(vectors.shape[1]) if vectors.ndim == 2 else 0,
+                "created": time.time(),
+            },
+            f,
+            indent=2,
+        )
+
+    final = os.path.join(root, version)
+    os.rename(staging, final)
+    current_tmp = os.path.join(root, f".CURRENT.{uuid.uuid4().hex}")
+    with open(current_tmp, "w", encoding="utf-8") as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(current_tmp, os.path.join(root, "CURRENT"))
+    _fsync_dir(root)
+    _prune_versions(root, keep=version)
+    return final
+
+
+def _prune_versions(root: str, keep: str) -> None:
+    versions = sorted(
+        (name for name in os.listdir(root) if name.startswith("v-") and name != keep),
+        key=lambda name: os.path.getmtime(os.path.join(root, name)),
+    )
+    for name in versions[: max(len(versions) - (KEEP_VERSIONS - 1), 0)]:
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+@contextmanager
+def build_lock(root: str = INDEX_ROOT) -> Iterator[None]:
+    """
+    Holds an exclusive file lock on the index root while building.
+
+    Retriever processes that start together would otherwise all find no
+    ``CURRENT`` file and embed the sources concurrently. Callers re-check
+    ``CURRENT`` after acquiring the lock, so only the first one builds.
+
+    Args:
+        root: Index root directory
+    """
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, ".build.lock"), "a") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def build_index(
+    pdf_paths: Sequence[str],
+    root: str = INDEX_ROOT,
+    model: str = EMBEDDING_MODEL,
+    chunk_store: str = CHUNK_STORE,
+) -> str:
+    """
+    Builds an index from PDF files and swaps it in atomically.
+
+    Args:
+        pdf_paths: PDF files to index
+        root: Index root directory
+        model: OpenAI embedding model
+        chunk_store: Record storage format, "file" or "sqlite"
+
+    Returns:
+        str: Path of the new version directory
+    """
+    chunks = load_chunks(pdf_paths)
+    records = [
+        {
+            "text": chunk.page_content,
+            "source": chunk.metadata.get("source"),
+            "page": chunk.metadata.get("page"),
+        }
+        for chunk in chunks
+    ]
+    vectors = np.array(
+        _embeddings(model).embed_documents([r["text"] for r in records]),
+        dtype=np.float32,
+    )
+    return write_index(
+        root,
+        records,
+        vectors,
+        {"model": model, "sources": list(pdf_paths)},
+        chunk_store=chunk_store,
+    )
+
+
+def mmr_select(
+    query_vector: np.ndarray,
+    candidate_vectors: np.ndarray,
+    k: int,
+    lambda_mult: float = 0.5,
+) -> np.ndarray:
+    """
+    Selects k diverse candidates by maximal marginal relevance.
+
+    Relevance to the query and the pairwise similarity of all candidates are
+    computed up front as two matrix products. Each greedy step then updates
+    the similarity to the selected set with a single vectorized maximum, so
+    there are k array operations instead of a Python loop over pairs.
+
+    Args:
+        query_vector: Query embedding
+        candidate_vectors: Candidate embeddings, one row per candidate
+        k: Number of candidates to select
+        lambda_mult: Trade-off between relevance (1.0) and diversity (0.0)
+
+    Returns:
+        np.ndarray: Positions of the selected candidates, in selection order
+    """
+    n = len(candidate_vectors)
+    k = min(k, n)
+    if k == 0:
+        return np.empty(0, dtype=np.int64)
+    candidates = _normalize(np.asarray(candidate_vectors, dtype=np.float32))
+    query = _normalize(np.asarray(query_vector, dtype=np.float32))
+    relevance = candidates @ query
+    similarity = candidates @ candidates.T
+
+    selected = np.empty(k, dtype=np.int64)
+    available = np.ones(n, dtype=bool)
+    max_similarity = np.full(n, -np.inf, dtype=np.float32)
+    first = int(np.argmax(relevance))
+    selected[0] = first
+    available[first] = False
+    np.maximum(max_similarity, similarity[first], out=max_similarity)
+
+    for step in range(1, k):
+        scores = lambda_mult * relevance - (1.0 - lambda_mult) * max_similarity
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected[step] = best
+        available[best] = False
+        np.maximum(max_similarity, similarity[best], out=max_similarity)
+    return selected
+
+
+class OffsetChunkStore:
+    """Chunk records in a memory-mapped file, located by a byte offset table."""
+
+    def __init__(self, path: str):
+        self.offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+        self._file = open(os.path.join(path, "chunks.bin"), "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._chunks = (
+            mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        )
+
+    def get_many(self, chunk_ids: Sequence[int]) -> Dict[int, Dict[str, Any]]:
+        records = {}
+        for chunk_id in chunk_ids:
+            start, end = int(self.offsets[chunk_id]), int(self.offsets[chunk_id + 1])
+            records[chunk_id] = json.loads(bytes(self._chunks[start:end]).decode("utf-8"))
+        return records
+
+    def close(self) -> None:
+        if isinstance(self._chunks, mmap.mmap):
+            self._chunks.close()
+        self._file.close()
+
+
+class SQLiteChunkStore:
+    """Chunk records in a read-only SQLite table, fetched by primary key."""
+
+    def __init__(self, path: str):
+        self._connection = sqlite3.connect(
+            f"file:{os.path.join(path, 'chunks.sqlite')}?mode=ro",
+            uri=True,
+            check_same_thread=False,
+        )
+        self._lock = threading.Lock()
+
+    def get_many(self, chunk_ids: Sequence[int]) -> Dict[int, Dict[str, Any]]:
+        if not chunk_ids:
+            return {}
+        placeholders = ",".join("?" * len(chunk_ids))
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT id, source, page, text FROM chunks WHERE id IN ({placeholders})",
+                list(chunk_ids),
+            ).fetchall()
+        return {
+            row[0]: {"source": row[1], "page": row[2], "text": row[3]} for row in rows
+        }
+
+    def close(self) -> None:
+        self._connection.close()
+
+
+class MappedIndex:
+    """
+    One memory-mapped index version.
+
+    Only the vectors are scanned at query time. Chunk records are read from
+    the chunk store for the hits being returned, and the most recently used
+    ones are kept in an LRU cache of ``hot_chunks`` entries.
+    """
+
+    def __init__(self, path: str, hot_chunks: int = HOT_CHUNKS):
+        self.path = path
+        with open(os.path.join(path, "manifest.json"), encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        if self.manifest.get("chunk_store", "file") == "sqlite":
+            self.chunks = SQLiteChunkStore(path)
+        else:
+            self.chunks = OffsetChunkStore(path)
+        self.hot_chunks = hot_chunks
+        self._hot: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._hot_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def __len__(self) -> int:
+        return int(self.manifest["count"])
+
+    def records(self, chunk_ids: Sequence[int]) -> List[Dict[str, Any]]:
+        """
+        Returns the records of several chunks with one chunk store lookup.
+
+        Args:
+            chunk_ids: Chunk ids
+
+        Returns:
+            list: Records with "text", "source" and "page", in the given order
+        """
+        chunk_ids = [int(i) for i in chunk_ids]
+        found = {}
+        with self._hot_lock:
+            for chunk_id in chunk_ids:
+                if chunk_id in self._hot:
+                    self._hot.move_to_end(chunk_id)
+                    found[chunk_id] = self._hot[chunk_id]
+            self.cache_hits += len(found)
+        missing = [i for i in dict.fromkeys(chunk_ids) if i not in found]
+        if missing:
+            loaded = self.chunks.get_many(missing)
+            found.update(loaded)
+            with self._hot_lock:
+                self.cache_misses += len(missing)
+                for chunk_id, record in loaded.items():
+                    self._hot[chunk_id] = record
+                while len(self._hot) > self.hot_chunks:
+                    self._hot.popitem(last=False)
+        return [found[i] for i in chunk_ids]
+
+    def record(self, chunk_id: int) -> Dict[str, Any]:
+        return self.records([chunk_id])[0]
+
+    def top_k(self, query_vector: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Finds the k chunks most similar to the query vector.
+
+        Args:
+            query_vector: Query embedding
+            k: Number of hits
+
+        Returns:
+            tuple: Chunk ids and cosine similarity scores, best first
+        """
+        if len(self) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        query = _normalize(np.asarray(query_vector, dtype=np.float32))
+        scores = self.vectors @ query
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return top, scores[top]
+
+    def top_k_mmr(
+        self,
+        query_vector: np.ndarray,
+        k: int,
+        fetch_k: int = 200,
+        lambda_mult: float = 0.5,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Finds k relevant but mutually diverse chunks.
+
+        The fetch_k most similar chunks are fetched first and then re-ranked
+        with maximal marginal relevance, which drops near-duplicate passages
+        such as overlapping chunks or repeated boilerplate.
+
+        Args:
+            query_vector: Query embedding
+            k: Number of hits
+            fetch_k: Number of candidates to re-rank
+            lambda_mult: Trade-off between relevance (1.0) and diversity (0.0)
+
+        Returns:
+            tuple: Chunk ids in MMR order and their similarity to the query
+        """
+        ids, scores = self.top_k(query_vector, max(fetch_k, k))
+        order = mmr_select(query_vector, self.vectors[ids], k, lambda_mult)
+        return ids[order], scores[order]
+
+    def hits(
+        self, chunk_ids: Sequence[int], scores: Sequence[float]
+    ) -> List[Dict[str, Any]]:
+        return [
+            {
+                "chunk_id": int(chunk_id),
+                "source": record.get("source"),
+                "page": record.get("page"),
+                "score": round(float(score), 4),
+                "text": record.get("text", ""),
+            }
+            for chunk_id, score, record in zip(
+                chunk_ids, scores, self.records(chunk_ids)
+            )
+        ]
+
+    def hit(self, chunk_id: int, score: float) -> Dict[str, Any]:
+        return self.hits([chunk_id], [score])[0]
+
+    def search(self, query_vector: np.ndarray, k: int) -> List[Dict[str, Any]]:
+        ids, scores = self.top_k(query_vector, k)
+        return self.hits(ids, scores)
+
+    def close(self) -> None:
+        self.chunks.close()
+
+
+class IndexReader:
+    """
+    Serves queries from the active index version and follows atomic swaps.
+
+    Each query checks the ``CURRENT`` pointer and maps the new version when a
+    rebuild has completed, so long-running retriever processes pick up new
+    indexes without a restart.
+    """
+
+    def __init__(self, root: str = INDEX_ROOT):
+        self.root = root
+        self._lock = threading.Lock()
+        self._index: Optional[MappedIndex] = None
+        self._version: Optional[str] = None
+        self._embeddings = None
+
+    def _current_version(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.root, "CURRENT"), encoding="utf-8") as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return None
+
+    def index(self) -> MappedIndex:
+        version = self._current_version()
+        if version is None:
+            raise FileNotFoundError(
+                f"No index found in {self.root}. Build one with "
+                "'python rag_index.py build <pdf>'."
+            )
+        with self._lock:
+            if version != self._version:
+                # The previous version is not closed explicitly: a query that
+                # is still running keeps its mapping alive until it finishes.
+                self._index = MappedIndex(os.path.join(self.root, version))
+                self._version = version
+            return self._index
+
+    def prime(self) -> int:
+        """
+        Reads the files of the active index version once.
+
+        The index is memory-mapped, so this loads it into the operating
+        system's page cache, where every retriever process finds it on its
+        first query.
+
+        Returns:
+            int: Number of bytes read
+        """
+        self.index()
+        directory = os.path.join(self.root, self._version)
+        total = 0
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if os.path.isfile(path):
+                with open(path, "rb") as f:
+                    while block := f.read(1 << 20):
+                        total += len(block)
+        return total
+
+    def embed_query(self, query: str) -> np.ndarray:
+        if self._embeddings is None:
+            self._embeddings = _embeddings(
+                self.index().manifest.get("model", EMBEDDING_MODEL)
+            )
+        return np.asarray(self._embeddings.embed_query(query), dtype=np.float32)
+
+    async def aembed_query(self, query: str) -> np.ndarray:
+        if self._embeddings is None:
+            self._embeddings = _embeddings(
+                self.index().manifest.get("model", EMBEDDING_MODEL)
+            )
+        return np.asarray(await self._embeddings.aembed_query(query), dtype=np.float32)
+
+    def search(self, query: str, k: int = 4) -> List[Dict[str, Any]]:
+        return self.index().search(self.embed_query(query), k)
+
+    async def asearch(self, query: str, k: int = 4) -> List[Dict[str, Any]]:
+        return self.index().search(await self.aembed_query(query), k)
+
+
+class ResultSetCache:
+    """
+    Keeps recent ranked result sets so later pages are plain lookups.
+
+    A result set remembers the index version it was computed on, so paging
+    stays consistent even if a new version is swapped in meanwhile.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 900.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(
+        self, index: MappedIndex, query: str, ids: np.ndarray, scores: np.ndarray
+    ) -> str:
+        token = uuid.uuid4().hex[:12]
+        with self._lock:
+            self._entries[token] = {
+                "index": index,
+                "query": query,
+                "ids": ids,
+                "scores": scores,
+                "created": time.time(),
+            }
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return token
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            if time.time() - entry["created"] > self.ttl_seconds:
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return entry
+
+    def page(self, token: str, offset: int, page_size: int) -> Dict[str, Any]:
+        """
+        Returns one page of a cached result set.
+
+        Args:
+            token: Result set token
+            offset: Position of the first hit of the page, clamped to the
+                result set
+            page_size: Number of hits per page, clamped to 1 and the size of
+                the result set
+
+        Returns:
+            dict: Query, hits of the page, total hit count and the cursor of
+            the next page (None on the last page)
+        """
+        entry = self.get(token)
+        if entry is None:
+            raise KeyError("The cursor has expired. Please run the search again.")
+        index, ids, scores = entry["index"], entry["ids"], entry["scores"]
+        offset = min(max(offset, 0), len(ids))
+        page_size = min(max(page_size, 1), max(len(ids), 1))
+        end = min(offset + page_size, len(ids))
+        return {
+            "query": entry["query"],
+            "index_version": index.manifest.get("version"),
+            "total_hits": len(ids),
+            "hits": index.hits(ids[offset:end], scores[offset:end]),
+            "next_cursor": f"{token}:{end}" if end < len(ids) else None,
+        }
+
+
+def parse_cursor(cursor: str) -> Tuple[str, int]:
+    token, _, offset = cursor.partition(":")
+    if not token or not offset.isdigit():
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return token, int(offset)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the shared RAG index.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="build an index and swap it in")
+    build.add_argument("pdf", nargs="+")
+    build.add_argument("--root", default=INDEX_ROOT)
+    build.add_argument("--model", default=EMBEDDING_MODEL)
+    build.add_argument("--chunk-store", choices=["file", "sqlite"], default=CHUNK_STORE)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        from dotenv import load_dotenv
+
+        load_dotenv(override=True)
+        with build_lock(args.root):
+            path = build_index(args.pdf, args.root, args.model, args.chunk_store)
+        print(f"index written to {path}")
+
+
+if __name__ == "__main__":
+    main()
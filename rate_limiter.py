@@ -0,0 +1,504 @@
+"""
+Process-wide admission control for model requests.
+
+Every Streamlit session, CLI run and batch evaluation calls the model
+provider through the same shared clients. Without coordination each caller
+retries its own rate-limit errors, so a burst of 429 responses turns into a
+larger burst of retries. The controller of a provider admits requests only
+when all of the following allow it:
+
+- token buckets for requests and tokens per minute (MODEL_RPM, MODEL_TPM;
+  0 disables a bucket, and ANTHROPIC_RPM, OPENAI_TPM, ... override them per
+  provider),
+- an adaptive concurrency limit: it grows by one request per round trip
+  while latency stays near its recent minimum and is cut by half on a rate
+  limit or overload error and by 10% when latency exceeds
+  MODEL_LATENCY_TOLERANCE times that minimum (additive increase,
+  multiplicative decrease),
+- a provider-wide pause honouring the ``retry-after`` of the last 429.
+
+Waiting requests are admitted in priority order. Interactive turns
+(the default) go before batch work, which may only fill MODEL_BATCH_SHARE
+of the concurrency limit so that a user typing in the app is never queued
+behind a full batch. Set the priority of a task with ``priority(BATCH)``.
+Rejected requests are retried with full-jitter exponential backoff, up to
+MODEL_MAX_RETRIES times; the provider SDKs' own retries are disabled.
+
+Admission is applied to the async generate and stream paths of the models
+created by model_registry; MODEL_ADMISSION=false turns it off.
+"""
+
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, ClassVar, Dict, List, Optional, Tuple
+
+import httpx
+
+ADMISSION_ENABLED = os.environ.get("MODEL_ADMISSION", "true").lower() == "true"
+INITIAL_CONCURRENCY = int(os.environ.get("MODEL_CONCURRENCY", "8"))
+MIN_CONCURRENCY = int(os.environ.get("MODEL_MIN_CONCURRENCY", "1"))
+MAX_CONCURRENCY = int(os.environ.get("MODEL_MAX_CONCURRENCY", "32"))
+BATCH_SHARE = float(os.environ.get("MODEL_BATCH_SHARE", "0.75"))
+LATENCY_TOLERANCE = float(os.environ.get("MODEL_LATENCY_TOLERANCE", "2.0"))
+MAX_RETRIES = int(os.environ.get("MODEL_MAX_RETRIES", "4"))
+BACKOFF_BASE = float(os.environ.get("MODEL_BACKOFF_BASE", "1.0"))
+BACKOFF_CAP = float(os.environ.get("MODEL_BACKOFF_CAP", "30"))
+
+INTERACTIVE = 0
+BATCH = 1
+
+# Outcomes that signal an overloaded provider and shrink the concurrency limit
+OVERLOADED = ("rate_limited", "server_error")
+RETRYABLE = OVERLOADED + ("transient_error",)
+
+request_priority: ContextVar[int] = ContextVar("request_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def priority(level: int):
+    """Runs the enclosed model calls of the current task at the given priority."""
+    token = request_priority.set(level)
+    try:
+        yield
+    finally:
+        request_priority.reset(token)
+
+
+def _provider_limit(provider: str, name: str) -> float:
+    value = os.environ.get(f"{provider.upper()}_{name}", os.environ.get(f"MODEL_{name}", "0"))
+    return float(value)
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at ``per_minute`` tokens per minute.
+
+    The level may go negative when a request turns out to use more than was
+    reserved for it; later requests then wait until the debt is repaid.
+    """
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Returns the seconds until ``amount`` can be taken, 0 if it can be now."""
+        if not self.rate:
+            return 0.0
+        self._refill(now)
+        needed = min(amount, self.capacity)
+        return 0.0 if self.level >= needed else (needed - self.level) / self.rate
+
+    def take(self, amount: float, now: float) -> None:
+        if self.rate:
+            self._refill(now)
+            self.level -= amount
+
+
+class Admission:
+    """An admitted request, handed back to ``release`` when it completes."""
+
+    def __init__(self, priority: int, seq: int, tokens: int, queued: float):
+        self.priority = priority
+        self.seq = seq
+        self.tokens = tokens
+        self.queued = queued
+        self.admitted = time.monotonic()
+
+
+class AdmissionController:
+    """
+    Admission control for the requests of one provider.
+
+    The controller is shared by threads running different event loops, so
+    its state is guarded by a threading lock and waiting coroutines are woken
+    with ``call_soon_threadsafe`` on their own loop.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rpm: float = 0,
+        tpm: float = 0,
+        concurrency: int = INITIAL_CONCURRENCY,
+        min_concurrency: int = MIN_CONCURRENCY,
+        max_concurrency: int = MAX_CONCURRENCY,
+        batch_share: float = BATCH_SHARE,
+        latency_tolerance: float = LATENCY_TOLERANCE,
+        max_retries: int = MAX_RETRIES,
+        backoff_base: float = BACKOFF_BASE,
+        backoff_cap: float = BACKOFF_CAP,
+    ):
+        self.name = name
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.limit = float(max(min(concurrency, max_concurrency), min_concurrency))
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.batch_share = batch_share
+        self.latency_tolerance = latency_tolerance
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.latency_floor: Optional[float] = None
+        self.latency_ewma: Optional[float] = None
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+        self._waiters: List[list] = []
+        self._seq = itertools.count()
+        self.stats = defaultdict(float)
+
+    def _capacity(self, priority: int) -> int:
+        limit = max(int(self.limit), 1)
+        if priority >= BATCH:
+            limit = max(int(limit * self.batch_share), 1)
+        return limit
+
+    def _try_admit(self, entry: list, tokens: int, now: float) -> Optional[float]:
+        # Returns 0 once admitted, the seconds to wait for a bucket or pause,
+        # or None to wait until another request completes.
+        if self._waiters[0] is not entry:
+            return None
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.in_flight >= self._capacity(entry[0]):
+            return None
+        delay = max(self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+        if delay > 0:
+            return delay
+        self.requests.take(1, now)
+        self.tokens.take(tokens, now)
+        self.in_flight += 1
+        heapq.heappop(self._waiters)
+        self._wake_head()
+        return 0.0
+
+    def _wake_head(self) -> None:
+        if not self._waiters:
+            return
+        waiter = self._waiters[0][2]
+        if waiter is not None:
+            loop, future = waiter
+            self._waiters[0][2] = None
+
+            def wake():
+                if not future.done():
+                    future.set_result(None)
+
+            try:
+                loop.call_soon_threadsafe(wake)
+            except RuntimeError:
+                pass
+
+    async def acquire(
+        self, tokens: int, priority: Optional[int] = None, seq: Optional[int] = None
+    ) -> Admission:
+        """
+        Waits until a request may be sent.
+
+        Args:
+            tokens: Estimated tokens of the request, charged to the TPM bucket
+            priority: INTERACTIVE or BATCH. Defaults to the task's request_priority
+            seq: Queue position to keep, for a request that is being retried
+
+        Returns:
+            Admission: Ticket to pass to ``release``
+        """
+        priority = request_priority.get() if priority is None else priority
+        seq = next(self._seq) if seq is None else seq
+        loop = asyncio.get_running_loop()
+        entry = [priority, seq, None]
+        queued = time.monotonic()
+        with self._lock:
+            heapq.heappush(self._waiters, entry)
+        try:
+            while True:
+                with self._lock:
+                    delay = self._try_admit(entry, tokens, time.monotonic())
+                    if delay == 0:
+                        break
+                    future = loop.create_future()
+                    entry[2] = (loop, future)
+                try:
+                    await asyncio.wait_for(future, delay)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            with self._lock:
+                if entry in self._waiters:
+                    self._waiters.remove(entry)
+                    heapq.heapify(self._waiters)
+                self._wake_head()
+            raise
+        admission = Admission(priority, seq, tokens, queued)
+        with self._lock:
+            self.stats["admitted"] += 1
+            self.stats["batch_admitted" if priority >= BATCH else "interactive_admitted"] += 1
+            self.stats["queue_seconds_total"] += admission.admitted - queued
+        return admission
+
+    def release(
+        self,
+        admission: Admission,
+        latency: float,
+        outcome: str = "ok",
+        tokens_used: Optional[int] = None,
+        retry_after: Optional[float] = None,
+    ) -> None:
+        """
+        Records the outcome of an admitted request and frees its slot.
+
+        Args:
+            admission: Ticket returned by ``acquire``
+            latency: Seconds until the first response chunk, or the full
+                response for non-streaming calls
+            outcome: "ok", "rate_limited", "server_error", "transient_error",
+                "cancelled" or "error"
+            tokens_used: Actual input and output tokens, to correct the estimate
+            retry_after: Seconds the provider asked to wait before retrying
+        """
+        now = time.monotonic()
+        with self._lock:
+            self.in_flight -= 1
+            self.stats[outcome] += 1
+            if tokens_used is not None:
+                self.tokens.take(tokens_used - admission.tokens, now)
+            if outcome in OVERLOADED:
+                self._decrease(0.5, now)
+                if retry_after:
+                    self.paused_until = max(self.paused_until, now + retry_after)
+            elif outcome == "ok":
+                self._observe(latency, now)
+            self._wake_head()
+
+    def _observe(self, latency: float, now: float) -> None:
+        if self.latency_floor is None:
+            self.latency_floor = self.latency_ewma = latency
+        else:
+            # The floor follows the minimum down at once and up slowly, so it
+            # tracks the provider's current best latency.
+            self.latency_floor = min(latency, self.latency_floor + 0.01 * (latency - self.latency_floor))
+            self.latency_ewma = 0.8 * self.latency_ewma + 0.2 * latency
+        if latency > self.latency_tolerance * self.latency_floor:
+            self._decrease(0.9, now)
+        else:
+            self.limit = min(self.limit + 1.0 / self.limit, float(self.max_concurrency))
+
+    def _decrease(self, factor: float, now: float) -> None:
+        # At most one decrease per round trip: the requests already in flight
+        # were sent before the previous decrease took effect.
+        if now - self._last_decrease < (self.latency_ewma or 1.0):
+            return
+        self._last_decrease = now
+        self.limit = max(self.limit * factor, float(self.min_concurrency))
+        self.stats["decreases"] += 1
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Full-jitter exponential backoff, never shorter than ``retry_after``."""
+        delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2**attempt))
+        return max(delay, retry_after or 0.0)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+            waiting = [entry[0] for entry in self._waiters]
+            admitted = stats.get("admitted", 0)
+            return {
+                "concurrency_limit": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "waiting_interactive": sum(1 for p in waiting if p < BATCH),
+                "waiting_batch": sum(1 for p in waiting if p >= BATCH),
+                "paused_seconds": round(max(self.paused_until - time.monotonic(), 0.0), 2),
+                "latency_floor": round(self.latency_floor or 0.0, 3),
+                "latency_ewma": round(self.latency_ewma or 0.0, 3),
+                "rpm_available": round(self.requests.level, 1) if self.requests.rate else None,
+                "tpm_available": round(self.tokens.level, 1) if self.tokens.rate else None,
+                **{k: int(v) for k, v in stats.items() if k != "queue_seconds_total"},
+                "queue_seconds_avg": round(
+                    stats.get("queue_seconds_total", 0.0) / admitted if admitted else 0.0, 4
+                ),
+            }
+
+
+_lock = threading.Lock()
+_controllers: Dict[str, AdmissionController] = {}
+
+
+def get_controller(provider: str) -> Optional[AdmissionController]:
+    """
+    Returns the admission controller of a provider, or None if admission is off.
+
+    Controllers are created on first use with the limits from the environment.
+    """
+    if not ADMISSION_ENABLED:
+        return None
+    with _lock:
+        controller = _controllers.get(provider)
+        if controller is None:
+            controller = AdmissionController(
+                provider,
+                rpm=_provider_limit(provider, "RPM"),
+                tpm=_provider_limit(provider, "TPM"),
+            )
+            _controllers[provider] = controller
+        return controller
+
+
+def configure(provider: str, **limits: Any) -> AdmissionController:
+    """Replaces the controller of a provider by one with the given limits."""
+    controller = AdmissionController(provider, **limits)
+    with _lock:
+        _controllers[provider] = controller
+    return controller
+
+
+def get_admission_stats() -> Dict[str, Any]:
+    with _lock:
+        controllers = dict(_controllers)
+    return {name: controller.get_stats() for name, controller in controllers.items()}
+
+
+def classify_error(error: BaseException) -> Tuple[str, Optional[float]]:
+    """
+    Classifies a provider error for admission control.
+
+    Returns:
+        tuple: Outcome ("rate_limited", "server_error", "transient_error",
+        "cancelled" or "error") and the ``retry-after`` delay in seconds, if
+        the response gave one. Connection failures, timeouts, 408 and 409
+        are "transient_error", which the SDKs also retry by default.
+    """
+    if isinstance(error, (asyncio.CancelledError, GeneratorExit)):
+        return "cancelled", None
+    if isinstance(error, httpx.TransportError) or any(
+        # APITimeoutError derives from APIConnectionError in both SDKs.
+        cls.__name__ == "APIConnectionError" for cls in type(error).__mro__
+    ):
+        return "transient_error", None
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    retry_after = None
+    headers = getattr(response, "headers", None)
+    if headers is not None:
+        try:
+            retry_after = float(headers.get("retry-after"))
+        except (TypeError, ValueError):
+            pass
+    if status in (429, 529):
+        return "rate_limited", retry_after
+    if status in (500, 502, 503, 504):
+        return "server_error", retry_after
+    if status in (408, 409):
+        return "transient_error", retry_after
+    return "error", None
+
+
+def estimate_tokens(messages: List[Any], kwargs: Dict[str, Any]) -> int:
+    """Approximates the input tokens of a request at four characters per token."""
+    chars = sum(len(str(message.content)) for message in messages)
+    if kwargs.get("tools"):
+        chars += len(json.dumps(kwargs["tools"], default=str))
+    return max(chars // 4, 1)
+
+
+def _usage_tokens(usage: Optional[Dict[str, Any]]) -> int:
+    if not usage:
+        return 0
+    return usage.get("input_tokens", 0) + usage.get("output_tokens", 0)
+
+
+class AdmissionControlled:
+    """
+    Mixin for chat models that sends their async requests through the
+    admission controller of ``admission_provider``.
+
+    Place it before the chat model class in the bases. The wrapped model
+    should have its SDK retries disabled, since retries are done here.
+    """
+
+    admission_provider: ClassVar[str] = "anthropic"
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        controller = get_controller(self.admission_provider)
+        if controller is None:
+            return await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        tokens = estimate_tokens(messages, kwargs)
+        seq = None
+        for attempt in itertools.count():
+            admission = await controller.acquire(tokens, seq=seq)
+            seq = admission.seq
+            started = time.monotonic()
+            try:
+                result = await super()._agenerate(
+                    messages, stop=stop, run_manager=run_manager, **kwargs
+                )
+            except BaseException as e:
+                outcome, retry_after = classify_error(e)
+                controller.release(admission, time.monotonic() - started, outcome, retry_after=retry_after)
+                if outcome not in RETRYABLE or attempt >= controller.max_retries:
+                    raise
+            else:
+                message = result.generations[0].message if result.generations else None
+                usage = getattr(message, "usage_metadata", None)
+                controller.release(
+                    admission,
+                    time.monotonic() - started,
+                    tokens_used=_usage_tokens(usage) if usage else None,
+                )
+                return result
+            await asyncio.sleep(controller.backoff(attempt, retry_after))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs) -> AsyncIterator[Any]:
+        controller = get_controller(self.admission_provider)
+        if controller is None:
+            async for chunk in super()._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                yield chunk
+            return
+        tokens = estimate_tokens(messages, kwargs)
+        seq = None
+        for attempt in itertools.count():
+            admission = await controller.acquire(tokens, seq=seq)
+            seq = admission.seq
+            started = time.monotonic()
+            first_chunk = None
+            used = 0
+            try:
+                async for chunk in super()._astream(
+                    messages, stop=stop, run_manager=run_manager, **kwargs
+                ):
+                    if first_chunk is None:
+                        first_chunk = time.monotonic() - started
+                    used += _usage_tokens(getattr(chunk.message, "usage_metadata", None))
+                    yield chunk
+            except BaseException as e:
+                outcome, retry_after = classify_error(e)
+                controller.release(admission, time.monotonic() - started, outcome, retry_after=retry_after)
+                # A stream that has already produced output cannot be retried.
+                if (
+                    outcome not in RETRYABLE
+                    or first_chunk is not None
+                    or attempt >= controller.max_retries
+                ):
+                    raise
+            else:
+                latency = first_chunk if first_chunk is not None else time.monotonic() - started
+                controller.release(admission, latency, tokens_used=used or None)
+                return
+            await asyncio.sleep(controller.backoff(attempt, retry_after))
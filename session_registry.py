@@ -0,0 +1,292 @@
+"""
+Resource accounting for Streamlit sessions and eviction of idle ones.
+
+Each browser session owns an event loop, MCP server connections (with their
+local subprocesses), a checkpointer and its chat history. Streamlit drops
+a session when its tab is closed but nothing releases these resources, so
+sessions register here and a background reaper evicts the ones that have
+been idle longer than SESSION_IDLE_SECONDS, or that are gone and idle
+longer than SESSION_CLOSED_GRACE_SECONDS.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from contextlib import nullcontext
+from typing import Any, Callable, ContextManager, Dict, List, MutableMapping, Optional
+
+from mcp_connections import process_tree_rss
+from model_registry import release_loop_pools
+
+SESSION_IDLE_SECONDS = float(os.environ.get("SESSION_IDLE_SECONDS", "1800"))
+SESSION_CLOSED_GRACE_SECONDS = float(
+    os.environ.get("SESSION_CLOSED_GRACE_SECONDS", "120")
+)
+SESSION_REAP_INTERVAL = float(os.environ.get("SESSION_REAP_INTERVAL", "60"))
+
+
+def _payload_bytes(value: Any, depth: int = 0) -> int:
+    """Approximates the size of a value by the length of its strings and bytes."""
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, str):
+        return len(value.encode("utf-8", "replace"))
+    if depth > 8:
+        return 0
+    if isinstance(value, dict):
+        return sum(
+            _payload_bytes(k, depth + 1) + _payload_bytes(v, depth + 1)
+            for k, v in list(value.items())
+        )
+    if isinstance(value, (list, tuple, set)):
+        return sum(_payload_bytes(item, depth + 1) for item in list(value))
+    return 0
+
+
+def _checkpoint_usage(checkpointer: Any) -> Dict[str, int]:
+    storage = getattr(checkpointer, "storage", None) or {}
+    total = sum(
+        _payload_bytes(getattr(checkpointer, name, None) or {})
+        for name in ("storage", "writes", "blobs")
+    )
+    return {"threads": len(storage), "bytes": total}
+
+
+def _release_checkpointer(checkpointer: Any) -> None:
+    for name in ("storage", "writes", "blobs", "chain", "values_cache", "heads"):
+        container = getattr(checkpointer, name, None)
+        if container is not None and hasattr(container, "clear"):
+            container.clear()
+
+
+class SessionRecord:
+    """Resources of one session and the time it was last active."""
+
+    def __init__(
+        self,
+        session_id: str,
+        state: MutableMapping[str, Any],
+        on_evict: Optional[Callable[[MutableMapping[str, Any], str], None]] = None,
+    ):
+        self.session_id = session_id
+        self.state = state
+        self.on_evict = on_evict
+        self.created = time.time()
+        self.last_activity = self.created
+        # Held by the script thread while it runs the session's event loop and
+        # by the reaper while it evicts, so that only one of them drives it.
+        self.lock = threading.RLock()
+
+    def resource(self, key: str) -> Any:
+        try:
+            return self.state[key]
+        except (KeyError, AttributeError):
+            return None
+
+    def usage(self) -> Dict[str, Any]:
+        """
+        Returns the approximate resource usage of the session.
+
+        Memory figures count the text held in the chat history and the
+        serialized checkpoints; they are estimates, not allocator totals.
+
+        Returns:
+            dict: Idle time, history and checkpoint sizes, MCP servers and the
+            resident memory of their local processes
+        """
+        history = self.resource("history") or []
+        checkpoints = _checkpoint_usage(self.resource("checkpointer"))
+        client = self.resource("mcp_client")
+        processes = client.processes() if client is not None else {}
+        subprocess_rss = sum(
+            process_tree_rss(pid) for pids in processes.values() for pid in pids
+        )
+        history_bytes = _payload_bytes(history)
+        return {
+            "session_id": self.session_id,
+            "idle_seconds": round(time.time() - self.last_activity, 1),
+            "age_seconds": round(time.time() - self.created, 1),
+            "history_messages": len(history),
+            "history_bytes": history_bytes,
+            "checkpoint_threads": checkpoints["threads"],
+            "checkpoint_bytes": checkpoints["bytes"],
+            "mcp_servers": len(client.clients) if client is not None else 0,
+            "subprocesses": sum(len(pids) for pids in processes.values()),
+            "subprocess_rss_bytes": subprocess_rss,
+            "approx_bytes": history_bytes + checkpoints["bytes"] + subprocess_rss,
+        }
+
+
+class SessionRegistry:
+    """
+    Registry of live sessions with idle eviction.
+
+    ``state`` is the session's state mapping; the registry reads its
+    ``event_loop``, ``mcp_client``, ``checkpointer`` and ``history`` entries
+    and releases them on eviction. ``on_evict`` is then called with the state
+    and the reason, so the application can reset the session if the user
+    comes back.
+
+    The session must run its event loop only under ``loop_lock``; eviction
+    takes the same lock and skips sessions that hold it.
+    """
+
+    def __init__(self):
+        self._sessions: Dict[str, SessionRecord] = {}
+        self._lock = threading.Lock()
+        self._reaper: Optional[threading.Thread] = None
+        self.evictions: List[Dict[str, Any]] = []
+
+    def register(
+        self,
+        session_id: str,
+        state: MutableMapping[str, Any],
+        on_evict: Optional[Callable[[MutableMapping[str, Any], str], None]] = None,
+    ) -> SessionRecord:
+        with self._lock:
+            record = self._sessions.get(session_id)
+            if record is None or record.state is not state:
+                record = SessionRecord(session_id, state, on_evict)
+                self._sessions[session_id] = record
+            return record
+
+    def loop_lock(self, session_id: str) -> ContextManager:
+        """Returns the lock to hold while running the session's event loop."""
+        with self._lock:
+            record = self._sessions.get(session_id)
+        return record.lock if record is not None else nullcontext()
+
+    def touch(self, session_id: str) -> None:
+        with self._lock:
+            record = self._sessions.get(session_id)
+        if record is not None:
+            record.last_activity = time.time()
+
+    def snapshot(self, top: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Returns the resource usage of all sessions, largest first.
+
+        Args:
+            top: Only return this many sessions
+
+        Returns:
+            list: One usage dict per session
+        """
+        with self._lock:
+            records = list(self._sessions.values())
+        usage = sorted(
+            (record.usage() for record in records),
+            key=lambda u: u["approx_bytes"],
+            reverse=True,
+        )
+        return usage[:top] if top else usage
+
+    def evict(self, session_id: str, reason: str = "manual") -> bool:
+        """
+        Releases the resources of a session and removes it from the registry.
+
+        The MCP connections are closed on the session's own event loop, which
+        is then closed. A session that holds its ``loop_lock``, i.e. is
+        running a request, is left alone.
+
+        Args:
+            session_id: Session to evict
+            reason: Reason recorded in the eviction log
+
+        Returns:
+            bool: Whether the session was evicted
+        """
+        with self._lock:
+            record = self._sessions.get(session_id)
+        if record is None or not record.lock.acquire(blocking=False):
+            return False
+        try:
+            loop = record.resource("event_loop")
+            if loop is not None and loop.is_running():
+                return False
+            usage = record.usage()
+            client = record.resource("mcp_client")
+            if loop is not None and not loop.is_closed():
+                try:
+                    loop.run_until_complete(self._release_loop(client, loop))
+                finally:
+                    loop.close()
+            _release_checkpointer(record.resource("checkpointer"))
+            if record.on_evict is not None:
+                record.on_evict(record.state, reason)
+            with self._lock:
+                self._sessions.pop(session_id, None)
+                self.evictions.append({**usage, "reason": reason, "evicted": time.time()})
+                del self.evictions[:-50]
+            return True
+        finally:
+            record.lock.release()
+
+    @staticmethod
+    async def _release_loop(client: Any, loop: asyncio.AbstractEventLoop) -> None:
+        if client is not None:
+            await client.aclose()
+        await release_loop_pools(loop)
+
+    def evict_idle(
+        self,
+        max_idle: float = SESSION_IDLE_SECONDS,
+        is_active: Optional[Callable[[str], bool]] = None,
+        closed_grace: float = SESSION_CLOSED_GRACE_SECONDS,
+    ) -> List[str]:
+        """
+        Evicts sessions that have been idle for too long.
+
+        Args:
+            max_idle: Idle seconds after which any session is evicted
+            is_active: Returns whether a session is still connected. Sessions
+                that are not are evicted after ``closed_grace`` seconds
+            closed_grace: Idle seconds after which a closed session is evicted
+
+        Returns:
+            list: Ids of the evicted sessions
+        """
+        now = time.time()
+        with self._lock:
+            records = list(self._sessions.values())
+        evicted = []
+        for record in records:
+            idle = now - record.last_activity
+            if idle > max_idle:
+                reason = "idle"
+            elif is_active is not None and idle > closed_grace and not is_active(
+                record.session_id
+            ):
+                reason = "closed"
+            else:
+                continue
+            if self.evict(record.session_id, reason):
+                evicted.append(record.session_id)
+        return evicted
+
+    def start_reaper(
+        self,
+        interval: float = SESSION_REAP_INTERVAL,
+        is_active: Optional[Callable[[str], bool]] = None,
+    ) -> None:
+        """Starts the background thread that evicts idle sessions, once."""
+        with self._lock:
+            if self._reaper is not None and self._reaper.is_alive():
+                return
+
+            def reap():
+                while True:
+                    time.sleep(interval)
+                    try:
+                        self.evict_idle(is_active=is_active)
+                    except Exception as e:
+                        print(f"session reaper error: {e}")
+
+            self._reaper = threading.Thread(
+                target=reap, name="session-reaper", daemon=True
+            )
+            self._reaper.start()
+
+
+registry = SessionRegistry()
@@ -0,0 +1,208 @@
+import asyncio
+import json
+import random
+import re
+import uuid
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+import anthropic
+import httpx
+from langchain_anthropic import ChatAnthropic
+from langchain_core.messages import (
+    AIMessage,
+    AIMessageChunk,
+    BaseMessage,
+    HumanMessage,
+    ToolMessage,
+)
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import Field
+
+
+def _approx_tokens(value: Any) -> int:
+    return max(len(str(value)) // 4, 1)
+
+
+class ScriptedChatAnthropic(ChatAnthropic):
+    """
+    Offline model that answers every conversation from a script.
+
+    The script picks a list of steps by matching the latest user message
+    against the ``match`` regular expression of each rule (case-insensitive),
+    falling back to ``default``. The n-th model call after that user message
+    returns the n-th step (the last one repeats). A step is either
+    ``{"tool_calls": [{"name": ..., "args": {...}}]}`` or
+    ``{"content": "..."}``; ``{tool_result}`` in the content is replaced by the
+    latest tool output. Responses carry approximate token usage, arrive after
+    ``latency`` seconds, plus up to ``latency_jitter`` more, and stream word by
+    word, ``token_delay`` seconds apart. A ``slow_rate`` fraction of calls
+    waits ``slow_latency`` seconds longer, to stand in for a provider with a
+    long latency tail.
+
+    Request payloads are built by the real ``_get_request_payload``, so they
+    match what would be sent to Anthropic. The last ``max_payloads`` are kept
+    in ``payloads`` and ``calls`` counts all of them, so a long batch run does
+    not hold every request in memory.
+
+    To stand in for an overloaded provider, ``max_concurrency`` makes calls
+    beyond that many in flight fail with a 429 RateLimitError, with a
+    ``retry-after`` header of ``retry_after`` seconds if set.
+
+    Example script:
+        {"latency": 0.2, "rules": [{"match": "time", "steps": [
+            {"tool_calls": [{"name": "get_current_time", "args": {"timezone": "UTC"}}]},
+            {"content": "{tool_result}"}]}],
+         "default": [{"content": "I cannot help with that."}]}
+    """
+
+    script: Dict[str, Any] = Field(default_factory=dict)
+    payloads: List[dict] = Field(default_factory=list)
+    max_payloads: int = 16
+    calls: int = 0
+    in_flight: int = 0
+    rejected: int = 0
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs: Any) -> "ScriptedChatAnthropic":
+        with open(path, encoding="utf-8") as f:
+            script = json.load(f)
+        kwargs.setdefault("model", "claude-3-5-haiku-latest")
+        kwargs.setdefault("api_key", "scripted")
+        return cls(script=script, **kwargs)
+
+    def _record(self, messages: List[BaseMessage], stop, **kwargs: Any) -> AIMessage:
+        payload = self._get_request_payload(messages, stop=stop, **kwargs)
+        self.calls += 1
+        if self.max_payloads > 0:
+            self.payloads.append(payload)
+            del self.payloads[: -self.max_payloads]
+        return self._respond(messages)
+
+    def _respond(self, messages: List[BaseMessage]) -> AIMessage:
+        last_human = max(
+            (i for i, m in enumerate(messages) if isinstance(m, HumanMessage)), default=-1
+        )
+        query = messages[last_human].content if last_human >= 0 else ""
+        steps = self.script.get("default") or [{"content": "stub response"}]
+        for rule in self.script.get("rules", []):
+            if re.search(rule["match"], str(query), re.IGNORECASE):
+                steps = rule["steps"]
+                break
+        turn = sum(isinstance(m, AIMessage) for m in messages[last_human + 1 :])
+        step = steps[min(turn, len(steps) - 1)]
+
+        tool_result = next(
+            (m.content for m in reversed(messages) if isinstance(m, ToolMessage)), ""
+        )
+        content = str(step.get("content", "")).replace("{tool_result}", str(tool_result))
+        tool_calls = [
+            {"name": call["name"], "args": call.get("args", {}), "id": f"toolu_{uuid.uuid4().hex[:16]}"}
+            for call in step.get("tool_calls", [])
+        ]
+        input_tokens = sum(_approx_tokens(m.content) for m in messages)
+        output_tokens = _approx_tokens(content) + sum(
+            _approx_tokens(json.dumps(call["args"])) for call in tool_calls
+        )
+        return AIMessage(
+            content=content,
+            tool_calls=tool_calls,
+            usage_metadata={
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens,
+            },
+        )
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager=None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        message = self._record(messages, stop, **kwargs)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager=None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        kwargs["stream"] = True
+        message = self._record(messages, stop, **kwargs)
+        yield ChatGenerationChunk(
+            message=AIMessageChunk(
+                content=message.content,
+                tool_call_chunks=[
+                    {
+                        "name": call["name"],
+                        "args": json.dumps(call["args"]),
+                        "id": call["id"],
+                        "index": i,
+                    }
+                    for i, call in enumerate(getattr(message, "tool_calls", []))
+                ],
+                usage_metadata=getattr(message, "usage_metadata", None),
+            )
+        )
+
+    def _admit(self) -> None:
+        limit = self.script.get("max_concurrency")
+        if limit and self.in_flight >= limit:
+            self.rejected += 1
+            headers = {}
+            if self.script.get("retry_after"):
+                headers["retry-after"] = str(self.script["retry_after"])
+            request = httpx.Request("POST", "https://api.anthropic.com/v1/messages")
+            raise anthropic.RateLimitError(
+                "rate_limit_error: scripted provider is at capacity",
+                response=httpx.Response(429, headers=headers, request=request),
+                body=None,
+            )
+        self.in_flight += 1
+
+    async def _wait(self) -> None:
+        delay = self.script.get("latency", 0.0) + random.uniform(
+            0, self.script.get("latency_jitter", 0.0)
+        )
+        if random.random() < self.script.get("slow_rate", 0.0):
+            delay += self.script.get("slow_latency", 0.0)
+        await asyncio.sleep(delay)
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager=None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        self._admit()
+        try:
+            await self._wait()
+            return self._generate(messages, stop=stop, **kwargs)
+        finally:
+            self.in_flight -= 1
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager=None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        self._admit()
+        try:
+            await self._wait()
+            [final] = list(self._stream(messages, stop=stop, **kwargs))
+            words = re.findall(r"\S+\s*|\s+", final.message.content or "")
+            token_delay = self.script.get("token_delay", 0.0)
+            for word in words[:-1]:
+                yield ChatGenerationChunk(message=AIMessageChunk(content=word))
+                if token_delay:
+                    await asyncio.sleep(token_delay)
+            final.message.content = words[-1] if words else ""
+            yield final
+        finally:
+            self.in_flight -= 1
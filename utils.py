@@ -1,31 +1,219 @@
-from typing import Any, Dict, List, Callable, Optional
+from typing import Any, Dict, Iterator, List, Callable, Optional, Sequence, TextIO, Union
 from langchain_core.messages import BaseMessage
 from langchain_core.runnables import RunnableConfig
 from langgraph.graph.state import CompiledStateGraph
+from event_log import RecordingGraph
+import sys
+import threading
+import time
 import uuid
 
 def random_uuid():
     return str(uuid.uuid4())
 
 
+class BufferedConsoleWriter:
+    """
+    Text stream that batches small writes into few writes to the target.
+
+    Streaming prints one token at a time; flushing each of them costs a write
+    system call, which dominates when the output is piped to a file or log.
+    Buffered text is written out when it contains a newline, when it grows
+    past ``max_buffer`` characters, or ``interval`` seconds after the last
+    flush. The last one is done by a background thread, so text written just
+    before the stream pauses, e.g. while a tool runs, does not wait for the
+    next write.
+
+    Args:
+        target: Stream to write to. Defaults to the current sys.stdout
+        interval: Longest time in seconds text may stay buffered
+        max_buffer: Buffer size in characters that forces a flush
+    """
+
+    def __init__(
+        self,
+        target: Optional[TextIO] = None,
+        interval: float = 0.05,
+        max_buffer: int = 8192,
+    ):
+        self._target = target
+        self.interval = interval
+        self.max_buffer = max_buffer
+        self._buffer: List[str] = []
+        self._size = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._pending = threading.Condition(self._lock)
+        self._flusher: Optional[threading.Thread] = None
+        self.writes = 0
+
+    @property
+    def target(self) -> TextIO:
+        return self._target if self._target is not None else sys.stdout
+
+    def write(self, text: str) -> int:
+        with self._lock:
+            self._buffer.append(text)
+            self._size += len(text)
+            if (
+                "\n" in text
+                or self._size >= self.max_buffer
+                or time.monotonic() - self._last_flush >= self.interval
+            ):
+                self._flush_locked()
+            elif self._flusher is None:
+                self._flusher = threading.Thread(
+                    target=self._flush_after_interval, name="console-flush", daemon=True
+                )
+                self._flusher.start()
+            else:
+                self._pending.notify()
+        return len(text)
+
+    def _flush_after_interval(self) -> None:
+        with self._lock:
+            while True:
+                if not self._buffer:
+                    self._pending.wait()
+                    continue
+                delay = self._last_flush + self.interval - time.monotonic()
+                if delay > 0:
+                    self._pending.wait(delay)
+                    continue
+                self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        if self._buffer:
+            self.target.write("".join(self._buffer))
+            self.target.flush()
+            self._buffer.clear()
+            self._size = 0
+            self.writes += 1
+        self._last_flush = time.monotonic()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+
+# Console output of astream_graph and ainvoke_graph.
+console = BufferedConsoleWriter()
+
+
+def demultiplex_chunk(chunk: Any, include_subgraphs: bool = False) -> Iterator[Dict[str, Any]]:
+    """
+    Splits an item of a multi-mode ``graph.astream`` into events.
+
+    With several stream modes, LangGraph yields ``(mode, payload)`` items, or
+    ``(namespace, mode, payload)`` items when subgraphs are streamed too.
+
+    Args:
+        chunk: Item yielded by ``graph.astream``
+        include_subgraphs: Whether the stream was started with subgraphs=True
+
+    Yields:
+        dict: Event with "mode", "node", "content", "namespace" and, for
+        messages, "metadata". An updates payload yields one event per node
+    """
+    if include_subgraphs:
+        namespace, mode, payload = chunk
+    else:
+        namespace = ()
+        mode, payload = chunk
+
+    if mode == "messages":
+        message, metadata = payload
+        yield {
+            "mode": mode,
+            "node": metadata.get("langgraph_node"),
+            "content": message,
+            "metadata": metadata,
+            "namespace": namespace,
+        }
+    elif mode == "updates" and isinstance(payload, dict):
+        for node_name, node_chunk in payload.items():
+            yield {
+                "mode": mode,
+                "node": node_name,
+                "content": node_chunk,
+                "namespace": namespace,
+            }
+    else:
+        yield {"mode": mode, "node": None, "content": payload, "namespace": namespace}
+
+
 async def astream_graph(
     graph: CompiledStateGraph,
     inputs: dict,
     config: Optional[RunnableConfig] = None,
     node_names: List[str] = [],
     callback: Optional[Callable] = None,
-    stream_mode: str = "messages",
+    stream_mode: Union[str, Sequence[str]] = "messages",
     include_subgraphs: bool = False,
+    record_path: Optional[str] = None,
+    handlers: Optional[Dict[str, Callable]] = None,
 ) -> Dict[str, Any]:
     config = config or {}
     final_result = {}
+    if record_path:
+        graph = RecordingGraph(graph, record_path)
 
     def format_namespace(namespace):
         return namespace[-1].split(":")[0] if len(namespace) > 0 else "root graph"
 
     prev_node = ""
 
-    if stream_mode == "messages":
+    if isinstance(stream_mode, (list, tuple)):
+        # One pass over several stream modes; each event goes to the handler
+        # of its mode, falling back to the callback and then to printing.
+        handlers = handlers or {}
+        async for chunk in graph.astream(
+            inputs, config, stream_mode=list(stream_mode), subgraphs=include_subgraphs
+        ):
+            for event in demultiplex_chunk(chunk, include_subgraphs):
+                final_result = event
+                curr_node = event["node"]
+                if node_names and curr_node not in node_names:
+                    continue
+
+                handler = handlers.get(event["mode"], callback)
+                if handler is not None:
+                    result = handler(event)
+                    if hasattr(result, "__await__"):
+                        await result
+                    continue
+
+                if event["mode"] == "messages":
+                    if curr_node != prev_node:
+                        print("\n" + "=" * 50, file=console)
+                        print(f"🔄 Node: \033[1;36m{curr_node}\033[0m 🔄", file=console)
+                        print("- " * 25, file=console)
+                    content = getattr(event["content"], "content", event["content"])
+                    if isinstance(content, list):
+                        for item in content:
+                            if isinstance(item, dict) and "text" in item:
+                                print(item["text"], end="", file=console)
+                    else:
+                        print(content, end="", file=console)
+                    prev_node = curr_node
+                else:
+                    # Messages were already printed token by token, so only
+                    # the updated state keys are listed here.
+                    formatted_namespace = format_namespace(event["namespace"])
+                    updated = (
+                        ", ".join(event["content"])
+                        if isinstance(event["content"], dict)
+                        else type(event["content"]).__name__
+                    )
+                    print(
+                        f"\n[{event['mode']}] \033[1;36m{curr_node or ''}\033[0m"
+                        f" in [\033[1;33m{formatted_namespace}\033[0m]: {updated}",
+                        file=console,
+                    )
+                    # Token output of the next message starts on a new header.
+                    prev_node = ""
+
+    elif stream_mode == "messages":
         async for chunk_msg, metadata in graph.astream(
             inputs, config, stream_mode=stream_mode
         ):
@@ -43,19 +231,19 @@ async def astream_graph(
                         await result
                 else:
                     if curr_node != prev_node:
-                        print("\n" + "=" * 50)
-                        print(f"🔄 Node: \033[1;36m{curr_node}\033[0m 🔄")
-                        print("- " * 25)
+                        print("\n" + "=" * 50, file=console)
+                        print(f"🔄 Node: \033[1;36m{curr_node}\033[0m 🔄", file=console)
+                        print("- " * 25, file=console)
 
                     if hasattr(chunk_msg, "content"):
                         if isinstance(chunk_msg.content, list):
                             for item in chunk_msg.content:
                                 if isinstance(item, dict) and "text" in item:
-                                    print(item["text"], end="", flush=True)
+                                    print(item["text"], end="", file=console)
                         elif isinstance(chunk_msg.content, str):
-                            print(chunk_msg.content, end="", flush=True)
+                            print(chunk_msg.content, end="", file=console)
                     else:
-                        print(chunk_msg, end="", flush=True)
+                        print(chunk_msg, end="", file=console)
 
                 prev_node = curr_node
 
@@ -86,9 +274,9 @@ async def astream_graph(
                             await result
                     else:
                         if node_name != prev_node:
-                            print("\n" + "=" * 50)
-                            print(f"🔄 Node: \033[1;36m{node_name}\033[0m 🔄")
-                            print("- " * 25)
+                            print("\n" + "=" * 50, file=console)
+                            print(f"🔄 Node: \033[1;36m{node_name}\033[0m 🔄", file=console)
+                            print("- " * 25, file=console)
 
                         if isinstance(node_chunk, dict):
                             for k, v in node_chunk.items():
@@ -101,12 +289,12 @@ async def astream_graph(
                                                     and "text" in item
                                                 ):
                                                     print(
-                                                        item["text"], end="", flush=True
+                                                        item["text"], end="", file=console
                                                     )
                                         else:
-                                            print(v.content, end="", flush=True)
+                                            print(v.content, end="", file=console)
                                     else:
-                                        v.pretty_print()
+                                        print(v.pretty_repr(), file=console)
                                 elif isinstance(v, list):
                                     for list_item in v:
                                         if isinstance(list_item, BaseMessage):
@@ -120,52 +308,54 @@ async def astream_graph(
                                                             print(
                                                                 item["text"],
                                                                 end="",
-                                                                flush=True,
+                                                                file=console,
                                                             )
                                                 else:
                                                     print(
                                                         list_item.content,
                                                         end="",
-                                                        flush=True,
+                                                        file=console,
                                                     )
                                             else:
-                                                list_item.pretty_print()
+                                                print(list_item.pretty_repr(), file=console)
                                         elif (
                                             isinstance(list_item, dict)
                                             and "text" in list_item
                                         ):
-                                            print(list_item["text"], end="", flush=True)
+                                            print(list_item["text"], end="", file=console)
                                         else:
-                                            print(list_item, end="", flush=True)
+                                            print(list_item, end="", file=console)
                                 elif isinstance(v, dict) and "text" in v:
-                                    print(v["text"], end="", flush=True)
+                                    print(v["text"], end="", file=console)
                                 else:
-                                    print(v, end="", flush=True)
+                                    print(v, end="", file=console)
                         elif node_chunk is not None:
                             if hasattr(node_chunk, "__iter__") and not isinstance(
                                 node_chunk, str
                             ):
                                 for item in node_chunk:
                                     if isinstance(item, dict) and "text" in item:
-                                        print(item["text"], end="", flush=True)
+                                        print(item["text"], end="", file=console)
                                     else:
-                                        print(item, end="", flush=True)
+                                        print(item, end="", file=console)
                             else:
-                                print(node_chunk, end="", flush=True)
+                                print(node_chunk, end="", file=console)
 
                     prev_node = node_name
             else:
-                print("\n" + "=" * 50)
-                print(f"🔄 Raw output 🔄")
-                print("- " * 25)
-                print(node_chunks, end="", flush=True)
+                print("\n" + "=" * 50, file=console)
+                print(f"🔄 Raw output 🔄", file=console)
+                print("- " * 25, file=console)
+                print(node_chunks, end="", file=console)
                 final_result = {"content": node_chunks}
 
     else:
         raise ValueError(
-            f"Invalid stream_mode: {stream_mode}. Must be 'messages' or 'updates'."
+            f"Invalid stream_mode: {stream_mode}. Must be 'messages', 'updates' "
+            "or a list of stream modes."
         )
 
+    console.flush()
     return final_result
 
 
@@ -176,9 +366,12 @@ async def ainvoke_graph(
     node_names: List[str] = [],
     callback: Optional[Callable] = None,
     include_subgraphs: bool = True,
+    record_path: Optional[str] = None,
 ) -> Dict[str, Any]:
     config = config or {}
     final_result = {}
+    if record_path:
+        graph = RecordingGraph(graph, record_path)
 
     def format_namespace(namespace):
         return namespace[-1].split(":")[0] if len(namespace) > 0 else "root graph"
@@ -208,46 +401,48 @@ async def ainvoke_graph(
                     if hasattr(result, "__await__"):
                         await result
                 else:
-                    print("\n" + "=" * 50)
+                    print("\n" + "=" * 50, file=console)
                     formatted_namespace = format_namespace(namespace)
                     if formatted_namespace == "root graph":
-                        print(f"🔄 Node: \033[1;36m{node_name}\033[0m 🔄")
+                        print(f"🔄 Node: \033[1;36m{node_name}\033[0m 🔄", file=console)
                     else:
                         print(
-                            f"🔄 Node: \033[1;36m{node_name}\033[0m in [\033[1;33m{formatted_namespace}\033[0m] 🔄"
+                            f"🔄 Node: \033[1;36m{node_name}\033[0m in [\033[1;33m{formatted_namespace}\033[0m] 🔄",
+                            file=console,
                         )
-                    print("- " * 25)
+                    print("- " * 25, file=console)
 
                     if isinstance(node_chunk, dict):
                         for k, v in node_chunk.items():
                             if isinstance(v, BaseMessage):
-                                v.pretty_print()
+                                print(v.pretty_repr(), file=console)
                             elif isinstance(v, list):
                                 for list_item in v:
                                     if isinstance(list_item, BaseMessage):
-                                        list_item.pretty_print()
+                                        print(list_item.pretty_repr(), file=console)
                                     else:
-                                        print(list_item)
+                                        print(list_item, file=console)
                             elif isinstance(v, dict):
                                 for node_chunk_key, node_chunk_value in v.items():
-                                    print(f"{node_chunk_key}:\n{node_chunk_value}")
+                                    print(f"{node_chunk_key}:\n{node_chunk_value}", file=console)
                             else:
-                                print(f"\033[1;32m{k}\033[0m:\n{v}")
+                                print(f"\033[1;32m{k}\033[0m:\n{v}", file=console)
                     elif node_chunk is not None:
                         if hasattr(node_chunk, "__iter__") and not isinstance(
                             node_chunk, str
                         ):
                             for item in node_chunk:
-                                print(item)
+                                print(item, file=console)
                         else:
-                            print(node_chunk)
-                    print("=" * 50)
+                            print(node_chunk, file=console)
+                    print("=" * 50, file=console)
         else:
-            print("\n" + "=" * 50)
-            print(f"🔄 Raw output 🔄")
-            print("- " * 25)
-            print(node_chunks)
-            print("=" * 50)
+            print("\n" + "=" * 50, file=console)
+            print(f"🔄 Raw output 🔄", file=console)
+            print("- " * 25, file=console)
+            print(node_chunks, file=console)
+            print("=" * 50, file=console)
             final_result = {"content": node_chunks}
 
+    console.flush()
     return final_result
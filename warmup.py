@@ -0,0 +1,248 @@
+"""
+Warmup at process start and a readiness endpoint.
+
+With APP_WARMUP=true the process prepares, before the first session asks for
+them, everything "Apply Settings" would otherwise do on demand:
+
+- config:       reads config.json
+- mcp_servers:  starts the warm pool's spare processes for its stdio servers
+- tool_schemas: connects every configured server and lists its tools
+- agent:        builds the default agent, so sessions with the default
+                settings find it in the agent cache
+- indexes:      reads the active RAG index into the page cache, if there is one
+
+An HTTP endpoint on APP_READY_PORT reports the status and duration of each
+step. ``/ready`` answers 503 until warmup has finished and 200 afterwards;
+``/warmup`` always answers 200 with the same report. A step that takes
+longer than APP_WARMUP_STEP_TIMEOUT seconds is reported as failed. Sessions that start
+after warmup are initialized without clicking "Apply Settings".
+
+Run the app through this module so that warmup starts with the server:
+    python warmup.py --server.port 8585
+Any arguments are passed on to ``streamlit run app.py``.
+"""
+
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+
+WARMUP_ENABLED = os.environ.get("APP_WARMUP", "false").lower() == "true"
+READY_PORT = int(os.environ.get("APP_READY_PORT", "8586"))
+WARMUP_MODEL = os.environ.get("APP_WARMUP_MODEL", "claude-3-7-sonnet-latest")
+STEP_TIMEOUT = float(os.environ.get("APP_WARMUP_STEP_TIMEOUT", "120"))
+
+COMPONENTS = ("config", "mcp_servers", "tool_schemas", "agent", "indexes")
+
+
+class Warmup:
+    """
+    Runs the warmup steps once per process in a background thread.
+
+    Each component goes from "pending" to "running" and then to "ok",
+    "failed" or "skipped". A failed component does not stop the others, and
+    warmup counts as finished once none is pending or running.
+    """
+
+    def __init__(
+        self,
+        config_path: Optional[str] = None,
+        model_name: str = WARMUP_MODEL,
+        step_timeout: float = STEP_TIMEOUT,
+    ):
+        self.config_path = config_path
+        self.model_name = model_name
+        self.step_timeout = step_timeout
+        self.components: Dict[str, Dict[str, Any]] = {
+            name: {"status": "pending"} for name in COMPONENTS
+        }
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.finished is not None
+
+    def start(self, port: Optional[int] = READY_PORT) -> None:
+        """
+        Starts warmup and the readiness endpoint, once per process.
+
+        Args:
+            port: Port of the readiness endpoint; None to skip it
+        """
+        with self._lock:
+            if self._thread is not None:
+                return
+            self.started = time.time()
+            self._thread = threading.Thread(
+                target=lambda: asyncio.run(self._run()), name="warmup", daemon=True
+            )
+            self._thread.start()
+            if port:
+                self._server = serve_readiness(self, port)
+
+    def _update(self, name: str, **fields: Any) -> None:
+        # The readiness handler threads read the components concurrently.
+        with self._lock:
+            self.components[name].update(fields)
+
+    async def _step(self, name: str, coro) -> Any:
+        self._update(name, status="running")
+        started = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(coro, self.step_timeout)
+        except asyncio.TimeoutError:
+            update = {"status": "failed", "error": f"timed out after {self.step_timeout:g}s"}
+            result = None
+        except Exception as e:
+            update = {"status": "failed", "error": str(e) or repr(e)}
+            traceback.print_exc()
+            result = None
+        else:
+            update = {"status": "skipped"} if result is None else {"status": "ok", "detail": result}
+        self._update(name, **update, seconds=round(time.perf_counter() - started, 3))
+        return result
+
+    async def _run(self) -> None:
+        from agent_setup import CONFIG_FILE_PATH, build_agent, load_mcp_config
+        from mcp_connections import MCPConnectionSet
+        from mcp_warm_pool import warm_pool
+
+        config = None
+        try:
+
+            async def load_config():
+                nonlocal config
+                config = load_mcp_config(self.config_path or CONFIG_FILE_PATH)
+                return {"servers": sorted(config)}
+
+            await self._step("config", load_config())
+
+            async def start_servers():
+                future = warm_pool.prewarm(config) if config else None
+                if future is None:
+                    return None
+                await asyncio.wrap_future(future)
+                return warm_pool.get_stats()["servers"]
+
+            await self._step("mcp_servers", start_servers())
+
+            async with MCPConnectionSet(pool=warm_pool) as client:
+
+                async def load_tools():
+                    if not config:
+                        return None
+                    reports = await client.apply(config)
+                    errors = [r for r in reports if r["error"]]
+                    if errors:
+                        raise RuntimeError(
+                            "; ".join(f"{r['server']}: {r['error']}" for r in errors)
+                        )
+                    return {
+                        r["server"]: {"tools": r["tools"], "seconds": r["seconds"]}
+                        for r in reports
+                    }
+
+                await self._step("tool_schemas", load_tools())
+
+                async def build():
+                    _, tools, _ = await build_agent(client, config or {}, self.model_name)
+                    return {"model": self.model_name, "tools": len(tools)}
+
+                await self._step("agent", build())
+
+            await self._step("indexes", self._prime_indexes())
+        finally:
+            with self._lock:
+                for component in self.components.values():
+                    if component["status"] in ("pending", "running"):
+                        component["status"] = "skipped"
+                self.finished = time.time()
+
+    async def _prime_indexes(self) -> Optional[Dict[str, Any]]:
+        from rag_index import INDEX_ROOT, IndexReader
+
+        reader = IndexReader(INDEX_ROOT)
+        if reader._current_version() is None:
+            return None
+        return {"rag_bytes": await asyncio.to_thread(reader.prime)}
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            components = {name: dict(c) for name, c in self.components.items()}
+            started, finished = self.started, self.finished
+        now = finished or time.time()
+        failed = [n for n, c in components.items() if c["status"] == "failed"]
+        return {
+            "ready": finished is not None,
+            "status": ("degraded" if failed else "ready") if finished else "warming_up",
+            "enabled": started is not None,
+            "seconds": round(now - started, 3) if started else None,
+            "components": components,
+        }
+
+
+def serve_readiness(warmup: Warmup, port: int = READY_PORT) -> Optional[ThreadingHTTPServer]:
+    """
+    Serves the warmup report over HTTP in a daemon thread.
+
+    Returns:
+        ThreadingHTTPServer: The running server, or None if the port is taken,
+        e.g. by another app process on the same host
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") not in ("/ready", "/warmup"):
+                self.send_error(404)
+                return
+            status = warmup.status()
+            code = 200 if warmup.ready or self.path.rstrip("/") == "/warmup" else 503
+            body = json.dumps(status, default=str).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    try:
+        server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+    except OSError as e:
+        print(f"warmup: readiness endpoint not started on port {port}: {e}")
+        return None
+    threading.Thread(target=server.serve_forever, name="readiness", daemon=True).start()
+    return server
+
+
+warmup = Warmup()
+
+
+def main():
+    from dotenv import load_dotenv
+    from streamlit.web import cli as stcli
+
+    # Use the instance of the importable module, which is the one app.py sees,
+    # not the one of this script.
+    from warmup import warmup as shared_warmup
+
+    load_dotenv(override=True)
+    if os.environ.get("APP_WARMUP", "false").lower() == "true":
+        shared_warmup.start()
+    app_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+    sys.argv = ["streamlit", "run", app_path, *sys.argv[1:]]
+    sys.exit(stcli.main())
+
+
+if __name__ == "__main__":
+    main()